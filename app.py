@@ -3,15 +3,71 @@ Aplicação Interativa para Análise de Dados Ambientais
 Desenvolvida com Streamlit para análise comparativa de temperatura, umidade e CO₂
 """
 
+import contextlib
+import json
+import os
+import tempfile
 import streamlit as st
 import pandas as pd
 from datetime import datetime
-from data_processor import process_uploaded_file, validate_inputs
+from data_processor import (
+    validate_inputs,
+    new_raw_sample_store,
+    load_raw_samples,
+    prune_raw_samples,
+    new_sketch_store,
+    prune_quantile_sketches,
+    add_location_ranges,
+    create_master_df,
+    enforce_master_schema,
+    append_collections,
+    rename_location,
+    make_ingest_job,
+    process_uploaded_files,
+    new_ingest_cache,
+    split_duplicate_collections,
+    DATASET_PATH,
+    open_dataset,
+    dataset_append,
+    dataset_load,
+    dataset_delete,
+    dataset_rename_location,
+    dataset_clear,
+    build_location_index,
+    index_append,
+    index_rename,
+    index_locations,
+    index_location_counts,
+    index_location_rows,
+    index_location_stats,
+    memory_usage_report,
+    EXPECTED_COLUMNS,
+    ROBUST_STATS,
+    sketch_percentiles,
+    moment_summary,
+    selection_mask,
+    delete_collections,
+    EXPORT_FORMATS,
+    available_export_formats,
+    export_dataset,
+    export_raw_samples,
+    RESAMPLE_FREQUENCIES,
+    resample_samples,
+    import_dataset,
+    import_raw_samples,
+    record_stages,
+    summarize_stage_records
+)
 from visualizations import (
     create_temperature_chart,
     create_humidity_chart,
     create_co2_chart,
-    create_consolidated_chart
+    create_consolidated_chart,
+    create_raw_samples_chart,
+    create_locations_comparison_chart,
+    prepare_chart_frame,
+    prepare_comparison_frame,
+    COMPARISON_TOP_N
 )
 
 # Configuração da página
@@ -26,12 +82,35 @@ st.set_page_config(
 st.title("🌱 Análise de Dados Ambientais")
 st.markdown("---")
 
-# Inicialização do estado da sessão
+# Persistência opcional em disco (ativada pela variável de ambiente ANALISE_AMBIENTAL_DB)
+if 'dataset' not in st.session_state:
+    st.session_state.dataset = open_dataset() if DATASET_PATH else None
+dataset = st.session_state.dataset
+raw_store_dir = os.path.join(os.path.dirname(os.path.abspath(DATASET_PATH)), 'amostras') if dataset is not None else None
+
+# Sketches de quantis de cada coleta, guardados fora do DataFrame mestre pelo coleta_id
+if 'sketch_store' not in st.session_state:
+    st.session_state.sketch_store = new_sketch_store()
+
+# Inicialização do estado da sessão (coletas já gravadas são carregadas sem reprocessar arquivos)
 if 'master_df' not in st.session_state:
-    st.session_state.master_df = pd.DataFrame(
-        columns=['temperatura', 'umidade', 'co2', 'data', 'local', 'periodo']
+    st.session_state.master_df = (
+        dataset_load(dataset, sketch_store=st.session_state.sketch_store)
+        if dataset is not None else create_master_df()
     )
 
+# Índice de locais mantido incrementalmente (contagens, posições e estatísticas por local)
+if 'location_index' not in st.session_state:
+    st.session_state.location_index = build_location_index(st.session_state.master_df)
+
+# Amostras brutas de cada coleta, referenciadas pelo coleta_id do DataFrame mestre
+if 'raw_store' not in st.session_state:
+    st.session_state.raw_store = new_raw_sample_store(raw_store_dir)
+
+# Cache de ingestão: reenvios do mesmo arquivo não são lidos novamente
+if 'ingest_cache' not in st.session_state:
+    st.session_state.ingest_cache = new_ingest_cache()
+
 # ========== BARRA LATERAL: INSERÇÃO DE DADOS ==========
 st.sidebar.header("📥 Upload de Coletas")
 st.sidebar.markdown("Faça upload de um ou mais arquivos e configure os metadados.")
@@ -80,49 +159,104 @@ if uploaded_files:
                     help="Período do dia"
                 )
             
+            # Planilha (apenas para arquivos Excel)
+            sheet_name = 0
+            if file.name.lower().endswith(('.xlsx', '.xls')):
+                sheet_input = st.text_input(
+                    "Planilha",
+                    value="",
+                    key=f"planilha_{idx}_{file.name}",
+                    help="Nome da planilha (vazio = primeira planilha)"
+                )
+                if sheet_input.strip():
+                    sheet_name = sheet_input.strip()
+            
             # Armazenar metadados no dicionário temporário
             current_metadata[file.name] = {
                 'file': file,
                 'data': data,
-                'periodo': periodo
+                'periodo': periodo,
+                'planilha': sheet_name
             }
     
-    # Botão para processar todos os arquivos
+    # Número de processos usados na leitura dos arquivos
     st.sidebar.markdown("---")
+    max_workers = st.sidebar.number_input(
+        "Processos paralelos",
+        min_value=1,
+        max_value=os.cpu_count() or 1,
+        value=min(4, os.cpu_count() or 1),
+        help="Quantidade de arquivos processados ao mesmo tempo"
+    )
+    debug_stages = st.sidebar.checkbox(
+        "🐞 Medir etapas do processamento",
+        key="debug_stages",
+        help="Registra o tempo de cada etapa (leitura, dialeto, conversão...) por arquivo"
+    )
+    # Sem pasta em disco as amostras ficam na memória da sessão: opcional e desligado por padrão
+    keep_raw_samples = st.sidebar.checkbox(
+        "🔬 Guardar amostras brutas",
+        value=raw_store_dir is not None,
+        key="keep_raw_samples",
+        help="Mantém cada leitura para visualização e exportação; "
+             "sem banco configurado, as amostras ocupam a memória da sessão"
+    )
+    
+    # Botão para processar todos os arquivos
     if st.sidebar.button("➕ Adicionar Todos à Análise", type="primary", use_container_width=True):
         if not local_coleta:
             st.sidebar.error("❌ Por favor, preencha o nome do local!")
         else:
-            success_count = 0
-            error_count = 0
-            errors_list = []
-            
-            # Processar cada arquivo do dicionário temporário
-            for filename, metadata in current_metadata.items():
-                try:
-                    # Processar arquivo
-                    new_row = process_uploaded_file(
-                        metadata['file'],
-                        metadata['data'],
-                        local_coleta,
-                        metadata['periodo']
-                    )
-                    
-                    # Adicionar ao DataFrame mestre
-                    st.session_state.master_df = pd.concat(
-                        [st.session_state.master_df, new_row],
-                        ignore_index=True
-                    )
-                    success_count += 1
-                    
-                except Exception as e:
-                    error_count += 1
-                    errors_list.append(f"{filename}: {str(e)}")
+            # Processar todos os arquivos em paralelo (resultados na ordem de upload)
+            jobs = [
+                make_ingest_job(
+                    metadata['file'],
+                    metadata['data'],
+                    local_coleta,
+                    metadata['periodo'],
+                    sheet_name=metadata['planilha']
+                )
+                for metadata in current_metadata.values()
+            ]
+            with record_stages() if debug_stages else contextlib.nullcontext(None) as stage_records:
+                results = process_uploaded_files(
+                    jobs,
+                    max_workers=max_workers,
+                    raw_store=st.session_state.raw_store if keep_raw_samples else None,
+                    cache=st.session_state.ingest_cache,
+                    sketch_store=st.session_state.sketch_store
+                )
+            st.session_state.last_stage_records = stage_records
+            
+            new_rows = [result['linha'] for result in results if result['erro'] is None]
+            errors_list = [f"{result['arquivo']}: {result['erro']}" for result in results if result['erro'] is not None]
+            
+            # Ignorar coletas cujo arquivo já está na análise
+            new_rows, duplicate_rows = split_duplicate_collections(st.session_state.master_df, new_rows)
+            success_count = len(new_rows)
+            error_count = len(errors_list)
+            st.session_state.last_ingest_timings = [
+                (result['arquivo'], result['tempo']) for result in results
+            ]
+            
+            # Adicionar ao DataFrame mestre em uma única concatenação
+            st.session_state.master_df = append_collections(st.session_state.master_df, new_rows)
+            index_append(st.session_state.location_index, st.session_state.master_df, len(new_rows))
+            if dataset is not None and new_rows:
+                dataset_append(
+                    dataset, st.session_state.master_df.tail(len(new_rows)), st.session_state.sketch_store
+                )
+            if duplicate_rows:
+                prune_raw_samples(st.session_state.raw_store, st.session_state.master_df['coleta_id'])
+                prune_quantile_sketches(st.session_state.sketch_store, st.session_state.master_df['coleta_id'])
             
             # Mensagens de resultado
             if success_count > 0:
                 st.sidebar.success(f"✅ {success_count} arquivo(s) adicionado(s) com sucesso!")
             
+            if duplicate_rows:
+                st.sidebar.warning(f"⚠️ {len(duplicate_rows)} arquivo(s) já estavam na análise e foram ignorados.")
+            
             if error_count > 0:
                 st.sidebar.error(f"❌ {error_count} arquivo(s) com erro:")
                 for error_msg in errors_list:
@@ -132,12 +266,78 @@ if uploaded_files:
             if success_count > 0:
                 st.rerun()
 
+# Tempos de processamento da última leva de arquivos
+if st.session_state.get('last_ingest_timings'):
+    with st.sidebar.expander("⏱️ Tempos do último processamento"):
+        for filename, seconds in st.session_state.last_ingest_timings:
+            st.write(f"- {filename}: {seconds * 1000:.0f} ms")
+
+# Restaurar uma exportação anterior (coletas e, opcionalmente, amostras brutas)
+with st.sidebar.expander("📥 Restaurar Exportação"):
+    restore_file = st.file_uploader(
+        "Arquivo de coletas exportado",
+        type=['parquet', 'gz', 'zst', 'csv', 'xlsx'],
+        key="restore_file"
+    )
+    restore_samples_file = st.file_uploader(
+        "Amostras brutas (opcional)",
+        type=['parquet', 'gz', 'zst', 'csv', 'xlsx'],
+        key="restore_samples_file"
+    )
+    if st.button("📥 Restaurar", use_container_width=True, disabled=restore_file is None):
+        try:
+            restored_rows = import_dataset(restore_file, sketch_store=st.session_state.sketch_store)
+            new_rows, duplicate_rows = split_duplicate_collections(
+                st.session_state.master_df,
+                [restored_rows.iloc[[i]] for i in range(len(restored_rows))]
+            )
+            st.session_state.master_df = append_collections(st.session_state.master_df, new_rows)
+            index_append(st.session_state.location_index, st.session_state.master_df, len(new_rows))
+            if dataset is not None and new_rows:
+                dataset_append(
+                    dataset, st.session_state.master_df.tail(len(new_rows)), st.session_state.sketch_store
+                )
+            prune_quantile_sketches(st.session_state.sketch_store, st.session_state.master_df['coleta_id'])
+            if restore_samples_file is not None:
+                import_raw_samples(restore_samples_file, st.session_state.raw_store)
+                prune_raw_samples(st.session_state.raw_store, st.session_state.master_df['coleta_id'])
+            st.success(f"✅ {len(new_rows)} coleta(s) restaurada(s)!")
+            if duplicate_rows:
+                st.warning(f"⚠️ {len(duplicate_rows)} coleta(s) já estavam na análise e foram ignoradas.")
+            if new_rows:
+                st.rerun()
+        except Exception as e:
+            st.error(f"❌ Erro ao restaurar: {str(e)}")
+
+# Painel de depuração: etapas medidas no último processamento
+if st.session_state.get('debug_stages') and st.session_state.get('last_stage_records'):
+    with st.sidebar.expander("🐞 Etapas do último processamento"):
+        stage_records = st.session_state.last_stage_records
+        stage_summary = summarize_stage_records(stage_records)
+        stage_summary['segundos'] = (stage_summary['segundos'] * 1000).round(1)
+        st.dataframe(
+            stage_summary.rename(columns={'segundos': 'ms'}),
+            use_container_width=True,
+            hide_index=True
+        )
+        st.download_button(
+            label="⬇️ Registros (JSON Lines)",
+            data="\n".join(json.dumps(record, default=str, ensure_ascii=False) for record in stage_records),
+            file_name="etapas.jsonl",
+            mime="application/x-ndjson",
+            use_container_width=True
+        )
+
 # Botão para limpar análise
 st.sidebar.markdown("---")
 if st.sidebar.button("🗑️ Limpar Análise / Reiniciar", use_container_width=True):
-    st.session_state.master_df = pd.DataFrame(
-        columns=['temperatura', 'umidade', 'co2', 'data', 'local', 'periodo']
-    )
+    st.session_state.master_df = create_master_df()
+    st.session_state.location_index = build_location_index(st.session_state.master_df)
+    prune_raw_samples(st.session_state.raw_store, [])
+    st.session_state.raw_store = new_raw_sample_store(raw_store_dir)
+    st.session_state.sketch_store = new_sketch_store()
+    if dataset is not None:
+        dataset_clear(dataset)
     st.sidebar.success("✅ Análise limpa com sucesso!")
     st.rerun()
 
@@ -168,16 +368,9 @@ else:
     col_tools1, col_tools2, col_tools3, col_tools4 = st.columns(4)
     
     with col_tools1:
-        # Botão para exportar dados para CSV
-        if st.button("💾 Exportar CSV", use_container_width=True):
-            csv_data = st.session_state.master_df.to_csv(index=False)
-            st.download_button(
-                label="⬇️ Baixar arquivo CSV",
-                data=csv_data,
-                file_name=f"dados_ambientais_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                mime="text/csv",
-                use_container_width=True
-            )
+        # Botão para exportar dados (Parquet, CSV comprimido ou Excel)
+        if st.button("💾 Exportar Dados", use_container_width=True):
+            st.session_state.show_export_modal = True
     
     with col_tools2:
         # Botão para editar local em massa
@@ -194,10 +387,82 @@ else:
         if st.button("📊 Ver Estatísticas", use_container_width=True):
             st.session_state.show_stats_modal = True
     
+    # Modal de exportação
+    if 'show_export_modal' in st.session_state and st.session_state.show_export_modal:
+        with st.expander("💾 Exportar Dados", expanded=True):
+            col_e1, col_e2 = st.columns(2)
+            
+            with col_e1:
+                export_format = st.selectbox(
+                    "Formato:",
+                    available_export_formats(),
+                    format_func=lambda fmt: EXPORT_FORMATS[fmt]['extensao'],
+                    key="export_format"
+                )
+            
+            with col_e2:
+                include_samples = st.checkbox("Incluir amostras brutas", key="export_samples")
+                samples_freq = st.selectbox(
+                    "Resolução das amostras:",
+                    [None] + list(RESAMPLE_FREQUENCIES),
+                    format_func=lambda freq: "Leituras originais" if freq is None else RESAMPLE_FREQUENCIES[freq],
+                    key="export_samples_freq",
+                    disabled=not include_samples,
+                    help="Médias, mínimos e máximos por intervalo (apenas coletas com data/hora)"
+                )
+            
+            if st.button("⚙️ Gerar Arquivos", key="export_generate"):
+                # Gravar em arquivos temporários, bloco a bloco, em vez de montar o conteúdo em memória;
+                # a pasta temporária é removida assim que os bytes dos botões de download são lidos
+                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+                extension = EXPORT_FORMATS[export_format]['extensao']
+                mime = EXPORT_FORMATS[export_format]['mime']
+                
+                with tempfile.TemporaryDirectory(prefix='exportacao_') as export_dir:
+                    export_path = os.path.join(export_dir, f"coletas{extension}")
+                    export_dataset(
+                        st.session_state.master_df,
+                        export_path,
+                        export_format,
+                        raw_store=st.session_state.raw_store if include_samples and samples_freq is None else None,
+                        sketch_store=st.session_state.sketch_store
+                    )
+                    with open(export_path, 'rb') as export_file:
+                        st.download_button(
+                            label=f"⬇️ Baixar coletas ({extension})",
+                            data=export_file.read(),
+                            file_name=f"dados_ambientais_{timestamp}{extension}",
+                            mime=mime,
+                            use_container_width=True
+                        )
+                    
+                    # Em Excel as leituras originais vão na planilha 'amostras' do mesmo arquivo
+                    if include_samples and (export_format != 'xlsx' or samples_freq is not None):
+                        samples_path = os.path.join(export_dir, f"amostras{extension}")
+                        export_raw_samples(
+                            st.session_state.raw_store,
+                            st.session_state.master_df['coleta_id'],
+                            samples_path,
+                            export_format,
+                            freq=samples_freq
+                        )
+                        with open(samples_path, 'rb') as samples_file:
+                            st.download_button(
+                                label=f"⬇️ Baixar amostras brutas ({extension})",
+                                data=samples_file.read(),
+                                file_name=f"amostras_brutas_{timestamp}{extension}",
+                                mime=mime,
+                                use_container_width=True
+                            )
+            
+            if st.button("✅ Fechar", key="export_close"):
+                st.session_state.show_export_modal = False
+                st.rerun()
+    
     # Modal de renomear local
     if 'show_rename_modal' in st.session_state and st.session_state.show_rename_modal:
         with st.expander("✏️ Renomear Local", expanded=True):
-            unique_locals = sorted(st.session_state.master_df['local'].unique())
+            unique_locals = index_locations(st.session_state.location_index)
             col_r1, col_r2, col_r3 = st.columns([2, 2, 1])
             
             with col_r1:
@@ -209,9 +474,12 @@ else:
                 st.write("")
                 if st.button("✅ Aplicar", key="rename_apply"):
                     if new_name:
-                        st.session_state.master_df.loc[
-                            st.session_state.master_df['local'] == old_name, 'local'
-                        ] = new_name
+                        st.session_state.master_df = rename_location(
+                            st.session_state.master_df, old_name, new_name
+                        )
+                        index_rename(st.session_state.location_index, old_name, new_name)
+                        if dataset is not None:
+                            dataset_rename_location(dataset, old_name, new_name)
                         st.success(f"Local '{old_name}' renomeado para '{new_name}'!")
                         st.session_state.show_rename_modal = False
                         st.rerun()
@@ -242,7 +510,7 @@ else:
             with col_d1:
                 delete_option = st.radio(
                     "Modo de exclusão:",
-                    ["Por IDs específicos", "Por Local", "Por Data"],
+                    ["Por IDs específicos", "Por Critérios"],
                     key="delete_mode"
                 )
             
@@ -253,42 +521,73 @@ else:
                         options=delete_df['ID'].tolist(),
                         key="delete_ids"
                     )
-                elif delete_option == "Por Local":
-                    local_to_delete = st.selectbox(
-                        "Selecione Local:",
-                        options=sorted(st.session_state.master_df['local'].unique()),
-                        key="delete_local"
+                    delete_mask = selection_mask(
+                        st.session_state.master_df, positions=ids_to_delete or None
+                    )
+                else:  # Por Critérios (local, período e intervalo de datas combinados)
+                    locals_to_delete = st.multiselect(
+                        "Locais:",
+                        options=index_locations(st.session_state.location_index),
+                        key="delete_locals"
+                    )
+                    periods_to_delete = st.multiselect(
+                        "Períodos:",
+                        options=["Manhã", "Tarde"],
+                        key="delete_periods"
                     )
-                else:  # Por Data
-                    dates_available = pd.to_datetime(st.session_state.master_df['data']).dt.strftime('%d/%m/%Y').unique()
-                    date_to_delete = st.selectbox(
-                        "Selecione Data:",
-                        options=sorted(dates_available),
-                        key="delete_date"
+                    known_dates = [day for day in st.session_state.location_index['datas'] if pd.notna(day)]
+                    date_start = date_end = None
+                    if known_dates:
+                        first_date, last_date = min(known_dates).date(), max(known_dates).date()
+                        date_range = st.date_input(
+                            "Intervalo de datas:",
+                            value=(first_date, last_date),
+                            format="DD/MM/YYYY",
+                            key="delete_dates"
+                        )
+                        date_start, date_end = (
+                            date_range if len(date_range) == 2 else (date_range[0], date_range[0])
+                        )
+                        # O intervalo completo não é critério: só conta quando o usuário o restringe
+                        date_start = date_start if date_start > first_date else None
+                        date_end = date_end if date_end < last_date else None
+                    # Sem nenhum critério explícito nada é selecionado (selection_mask)
+                    delete_mask = selection_mask(
+                        st.session_state.master_df,
+                        locations=locals_to_delete or None,
+                        periods=periods_to_delete or None,
+                        date_start=date_start,
+                        date_end=date_end
                     )
+                delete_count = int(delete_mask.sum())
+                st.caption(f"{delete_count} registro(s) selecionado(s)")
+                if delete_option == "Por Critérios" and delete_count == 0:
+                    st.caption("Escolha ao menos um local, um período ou restrinja o intervalo de datas.")
             
             with col_d3:
                 st.write("")
                 st.write("")
-                if st.button("🗑️ Confirmar Exclusão", key="delete_confirm", type="primary"):
-                    if delete_option == "Por IDs específicos" and ids_to_delete:
-                        st.session_state.master_df = st.session_state.master_df.drop(ids_to_delete).reset_index(drop=True)
-                        st.success(f"✅ {len(ids_to_delete)} registro(s) excluído(s)!")
-                    elif delete_option == "Por Local":
-                        count = len(st.session_state.master_df[st.session_state.master_df['local'] == local_to_delete])
-                        st.session_state.master_df = st.session_state.master_df[
-                            st.session_state.master_df['local'] != local_to_delete
-                        ].reset_index(drop=True)
-                        st.success(f"✅ {count} registro(s) do local '{local_to_delete}' excluído(s)!")
-                    elif delete_option == "Por Data":
-                        date_obj = datetime.strptime(date_to_delete, '%d/%m/%Y')
-                        count = len(st.session_state.master_df[
-                            pd.to_datetime(st.session_state.master_df['data']).dt.strftime('%d/%m/%Y') == date_to_delete
-                        ])
-                        st.session_state.master_df = st.session_state.master_df[
-                            pd.to_datetime(st.session_state.master_df['data']).dt.strftime('%d/%m/%Y') != date_to_delete
-                        ].reset_index(drop=True)
-                        st.success(f"✅ {count} registro(s) da data '{date_to_delete}' excluído(s)!")
+                if st.button(
+                    "🗑️ Confirmar Exclusão", key="delete_confirm", type="primary", disabled=delete_count == 0
+                ):
+                    st.session_state.master_df, removed = delete_collections(
+                        st.session_state.master_df, mask=delete_mask
+                    )
+                    st.success(f"✅ {len(removed)} registro(s) excluído(s)!")
+                    
+                    # Reconstruir o índice e descartar amostras brutas e sketches das coletas excluídas
+                    if not removed.empty:
+                        st.session_state.location_index = build_location_index(st.session_state.master_df)
+                        prune_raw_samples(
+                            st.session_state.raw_store,
+                            st.session_state.master_df['coleta_id']
+                        )
+                        prune_quantile_sketches(
+                            st.session_state.sketch_store,
+                            st.session_state.master_df['coleta_id']
+                        )
+                        if dataset is not None:
+                            dataset_delete(dataset, removed['coleta_id'])
                     
                     st.session_state.show_delete_modal = False
                     st.rerun()
@@ -303,50 +602,150 @@ else:
             col_s1, col_s2, col_s3 = st.columns(3)
             
             with col_s1:
-                st.metric("Total de Coletas", len(st.session_state.master_df))
-                st.metric("Locais Diferentes", st.session_state.master_df['local'].nunique())
-                st.metric("Datas Diferentes", st.session_state.master_df['data'].nunique())
+                st.metric("Total de Coletas", st.session_state.location_index['n'])
+                st.metric("Locais Diferentes", len(st.session_state.location_index['locais']))
+                st.metric("Datas Diferentes", len(st.session_state.location_index['datas']))
             
             with col_s2:
                 st.write("**Por Período:**")
-                periodo_counts = st.session_state.master_df['periodo'].value_counts()
-                for periodo, count in periodo_counts.items():
+                periodo_counts = st.session_state.location_index['periodos'].most_common()
+                for periodo, count in periodo_counts:
                     st.write(f"- {periodo}: {count}")
                 
             with col_s3:
                 st.write("**Por Local:**")
-                local_counts = st.session_state.master_df['local'].value_counts()
+                local_counts = index_location_counts(st.session_state.location_index)
                 for local, count in local_counts.items():
                     st.write(f"- {local}: {count}")
             
             st.markdown("---")
             
-            # Estatísticas globais
-            st.write("**📈 Estatísticas Globais (todos os locais):**")
-            stats_global = pd.DataFrame({
-                'Variável': ['Temperatura (°C)', 'Umidade (%)', 'CO₂ (ppm)'],
-                'Média': [
-                    st.session_state.master_df['temperatura'].mean(),
-                    st.session_state.master_df['umidade'].mean(),
-                    st.session_state.master_df['co2'].mean()
-                ],
-                'Mínimo': [
-                    st.session_state.master_df['temperatura'].min(),
-                    st.session_state.master_df['umidade'].min(),
-                    st.session_state.master_df['co2'].min()
-                ],
-                'Máximo': [
-                    st.session_state.master_df['temperatura'].max(),
-                    st.session_state.master_df['umidade'].max(),
-                    st.session_state.master_df['co2'].max()
-                ],
-                'Desvio Padrão': [
-                    st.session_state.master_df['temperatura'].std(),
-                    st.session_state.master_df['umidade'].std(),
-                    st.session_state.master_df['co2'].std()
-                ]
+            # Estatísticas das leituras combinando os momentos de cada coleta (sem reprocessar)
+            st.write("**📈 Estatísticas das Leituras:**")
+            col_g1, col_g2 = st.columns(2)
+            with col_g1:
+                group_labels = {None: 'Global (todos os locais)', 'local': 'Local', 'periodo': 'Período', 'data': 'Data'}
+                stats_group = st.selectbox(
+                    "Agrupar por:",
+                    list(group_labels),
+                    format_func=group_labels.get,
+                    key="stats_group"
+                )
+            with col_g2:
+                known_dates = st.session_state.location_index['datas']
+                stats_dates = st.date_input(
+                    "Intervalo de datas:",
+                    value=(min(known_dates).date(), max(known_dates).date()),
+                    format="DD/MM/YYYY",
+                    key="stats_dates"
+                )
+            stats_start, stats_end = (
+                stats_dates if len(stats_dates) == 2 else (stats_dates[0], stats_dates[0])
+            )
+            stats_rows = st.session_state.master_df[selection_mask(
+                st.session_state.master_df, date_start=stats_start, date_end=stats_end
+            )]
+            if stats_rows.empty:
+                st.info("Nenhuma coleta no intervalo de datas selecionado.")
+            else:
+                stats_global = moment_summary(stats_rows, by=stats_group)
+                if stats_group == 'data':
+                    stats_global['data'] = stats_global['data'].dt.strftime('%d/%m/%Y')
+                stats_global['variavel'] = stats_global['variavel'].map(
+                    {'temperatura': 'Temperatura (°C)', 'umidade': 'Umidade (%)', 'co2': 'CO₂ (ppm)'}
+                )
+                stats_global = stats_global.rename(columns={
+                    'grupo': 'Grupo', 'local': 'Local', 'periodo': 'Período', 'data': 'Data',
+                    'variavel': 'Variável', 'coletas': 'Coletas', 'n': 'Leituras', 'media': 'Média',
+                    'desvio_padrao': 'Desvio Padrão', 'minimo': 'Mínimo', 'maximo': 'Máximo'
+                })
+                st.dataframe(stats_global.round(2), use_container_width=True, hide_index=True)
+
+            st.markdown("---")
+
+            # Estatísticas robustas calculadas na ingestão (sem reler os arquivos)
+            st.write("**🔎 Estatísticas Robustas por Coleta:**")
+            col_rb1, col_rb2 = st.columns([1, 3])
+            with col_rb1:
+                robust_var = st.selectbox(
+                    "Variável:",
+                    EXPECTED_COLUMNS,
+                    format_func={'temperatura': 'Temperatura (°C)', 'umidade': 'Umidade (%)', 'co2': 'CO₂ (ppm)'}.get,
+                    key="robust_var"
+                )
+            with col_rb2:
+                robust_stats = st.multiselect(
+                    "Estatísticas:",
+                    list(ROBUST_STATS),
+                    default=['mediana', 'p5', 'p95', 'outliers'],
+                    format_func=ROBUST_STATS.get,
+                    key="robust_stats"
+                )
+            robust_df = st.session_state.master_df[
+                ['data', 'local', 'periodo', robust_var]
+                + [f'{robust_var}_{stat}' for stat in robust_stats]
+                + ['n_amostras']
+            ].copy()
+            if robust_df.empty:
+                st.info("Nenhuma coleta na análise.")
+            else:
+                robust_df['data'] = pd.to_datetime(robust_df['data']).dt.strftime('%d/%m/%Y')
+                robust_df.columns = (
+                    ['Data', 'Local', 'Período', 'Média']
+                    + [ROBUST_STATS[stat] for stat in robust_stats]
+                    + ['Amostras']
+                )
+                st.dataframe(robust_df.round(2), use_container_width=True, hide_index=True)
+                if robust_df['Amostras'].isna().any():
+                    st.caption("Coletas sem valores foram adicionadas antes do cálculo das estatísticas robustas.")
+
+            # Percentis por local e globais combinando os sketches das coletas (sem ler amostras)
+            st.write("**📐 Percentis por Local (todas as leituras):**")
+            percentiles = sketch_percentiles(st.session_state.master_df, st.session_state.sketch_store, by='local')
+            percentiles = percentiles[percentiles['variavel'] == robust_var].drop(columns='variavel')
+            percentiles = percentiles.rename(columns={
+                'local': 'Local', 'coletas': 'Coletas',
+                'p5': 'P5', 'p25': 'P25', 'mediana': 'Mediana', 'p75': 'P75', 'p95': 'P95'
             })
-            st.dataframe(stats_global.round(2), use_container_width=True, hide_index=True)
+            st.dataframe(percentiles.round(2), use_container_width=True, hide_index=True)
+            st.caption(
+                "Percentis aproximados (t-digest) sobre as leituras de todas as coletas do local; "
+                "coletas anteriores aos sketches não entram no cálculo."
+            )
+
+            st.markdown("---")
+            
+            # Uso de memória do DataFrame mestre (esquema tipado vs. colunas 'object')
+            st.write("**💾 Memória do DataFrame mestre:**")
+            memory = memory_usage_report(st.session_state.master_df)
+            col_m1, col_m2 = st.columns(2)
+            with col_m1:
+                st.metric(
+                    "Uso atual",
+                    f"{memory['total_bytes'] / 1024:.1f} KB",
+                    f"{memory['fracao']:.0%} do esquema em 'object'",
+                    delta_color="off"
+                )
+            with col_m2:
+                use_float32 = st.checkbox(
+                    "Medições em float32",
+                    value=str(st.session_state.master_df['temperatura'].dtype) == 'float32',
+                    help="Reduz pela metade a memória das medições (precisão de ~7 dígitos)"
+                )
+                measure_dtype = 'float32' if use_float32 else 'float64'
+                if str(st.session_state.master_df['temperatura'].dtype) != measure_dtype:
+                    st.session_state.master_df = enforce_master_schema(
+                        st.session_state.master_df, measure_dtype
+                    )
+                    st.rerun()
+            st.dataframe(
+                pd.DataFrame([
+                    {'Coluna': col, 'Tipo': info['tipo'], 'KB': round(info['bytes'] / 1024, 1)}
+                    for col, info in memory['colunas'].items()
+                ]),
+                use_container_width=True,
+                hide_index=True
+            )
             
             if st.button("✅ Fechar", key="stats_close"):
                 st.session_state.show_stats_modal = False
@@ -358,15 +757,8 @@ else:
     display_df = st.session_state.master_df.copy()
     display_df['data'] = pd.to_datetime(display_df['data']).dt.strftime('%d/%m/%Y')
     
-    # Calcular min/max por local
-    for idx, row in display_df.iterrows():
-        local_data = st.session_state.master_df[st.session_state.master_df['local'] == row['local']]
-        display_df.at[idx, 'temp_min'] = local_data['temperatura'].min()
-        display_df.at[idx, 'temp_max'] = local_data['temperatura'].max()
-        display_df.at[idx, 'umid_min'] = local_data['umidade'].min()
-        display_df.at[idx, 'umid_max'] = local_data['umidade'].max()
-        display_df.at[idx, 'co2_min'] = local_data['co2'].min()
-        display_df.at[idx, 'co2_max'] = local_data['co2'].max()
+    # Calcular min/max por local (uma agregação agrupada para todas as linhas)
+    display_df = add_location_ranges(display_df)
     
     # Arredondar valores
     display_df['temperatura'] = display_df['temperatura'].round(2)
@@ -403,9 +795,45 @@ else:
     
     st.markdown("---")
     
-    # Filtro por local
-    unique_locals = sorted(st.session_state.master_df['local'].unique())
+    # Locais presentes (mantidos pelo índice)
+    unique_locals = index_locations(st.session_state.location_index)
     
+    # Comparação entre locais (pivô local × período × variável recalculado só quando os dados mudam)
+    if len(unique_locals) > 1:
+        st.subheader("🏘️ Comparação entre Locais")
+        col_c1, col_c2, col_c3 = st.columns(3)
+        with col_c1:
+            comparison_sort = st.selectbox(
+                "Ordenar por:",
+                EXPECTED_COLUMNS,
+                format_func={'temperatura': 'Temperatura', 'umidade': 'Umidade', 'co2': 'CO₂'}.get,
+                key="comparison_sort"
+            )
+        with col_c2:
+            comparison_order = st.radio(
+                "Ordem:",
+                ["Maiores", "Menores"],
+                horizontal=True,
+                key="comparison_order"
+            )
+        with col_c3:
+            comparison_top = st.number_input(
+                "Locais exibidos:",
+                min_value=1,
+                max_value=len(unique_locals),
+                value=min(COMPARISON_TOP_N, len(unique_locals)),
+                key="comparison_top"
+            )
+        comparison_fig = create_locations_comparison_chart(
+            prepare_comparison_frame(st.session_state.master_df),
+            sort_by=comparison_sort,
+            top_n=int(comparison_top),
+            ascending=comparison_order == "Menores"
+        )
+        st.plotly_chart(comparison_fig, use_container_width=True)
+        st.markdown("---")
+    
+    # Filtro por local
     col1, col2, col3 = st.columns([2, 1, 1])
     with col1:
         selected_local = st.selectbox(
@@ -415,17 +843,17 @@ else:
         )
     
     with col2:
-        total_coletas = len(st.session_state.master_df)
+        total_coletas = st.session_state.location_index['n']
         st.metric("Total de Coletas", total_coletas)
     
     with col3:
         total_locais = len(unique_locals)
         st.metric("Locais Diferentes", total_locais)
     
-    # Filtrar dados pelo local selecionado
-    filtered_df = st.session_state.master_df[
-        st.session_state.master_df['local'] == selected_local
-    ].copy()
+    # Filtrar dados pelo local selecionado (posições vindas do índice, sem varrer o DataFrame)
+    filtered_df = index_location_rows(
+        st.session_state.location_index, st.session_state.master_df, selected_local
+    ).copy()
     
     # Converter data para datetime para ordenação
     filtered_df['data'] = pd.to_datetime(filtered_df['data'])
@@ -438,9 +866,12 @@ else:
     if filtered_df.empty:
         st.warning(f"Nenhum dado encontrado para o local: {selected_local}")
     else:
+        # Dados dos gráficos preparados uma única vez para os quatro gráficos
+        chart_frame = prepare_chart_frame(filtered_df)
+        
         # Gráfico consolidado em destaque
         st.markdown("#### 📊 Visão Geral Consolidada")
-        consolidated_fig = create_consolidated_chart(filtered_df, selected_local)
+        consolidated_fig = create_consolidated_chart(chart_frame, selected_local, high_volume=True)
         st.plotly_chart(consolidated_fig, use_container_width=True)
         
         st.markdown("---")
@@ -452,43 +883,84 @@ else:
         
         with col_left:
             st.markdown("##### 🌡️ Temperatura")
-            temp_fig = create_temperature_chart(filtered_df, selected_local)
+            temp_fig = create_temperature_chart(chart_frame, selected_local)
             st.plotly_chart(temp_fig, use_container_width=True)
             
             st.markdown("##### 💧 Umidade")
-            humidity_fig = create_humidity_chart(filtered_df, selected_local)
+            humidity_fig = create_humidity_chart(chart_frame, selected_local)
             st.plotly_chart(humidity_fig, use_container_width=True)
         
         with col_right:
             st.markdown("##### 🌫️ CO₂")
-            co2_fig = create_co2_chart(filtered_df, selected_local)
+            co2_fig = create_co2_chart(chart_frame, selected_local)
             st.plotly_chart(co2_fig, use_container_width=True)
             
-            # Estatísticas resumidas
+            # Estatísticas de todas as leituras do local (momentos mantidos pelo índice de locais)
             st.markdown("##### 📈 Estatísticas")
+            local_stats = index_location_stats(st.session_state.location_index, selected_local)
             stats_df = pd.DataFrame({
                 'Métrica': ['Temperatura (°C)', 'Umidade (%)', 'CO₂ (ppm)'],
-                'Média': [
-                    filtered_df['temperatura'].mean(),
-                    filtered_df['umidade'].mean(),
-                    filtered_df['co2'].mean()
-                ],
-                'Mín': [
-                    filtered_df['temperatura'].min(),
-                    filtered_df['umidade'].min(),
-                    filtered_df['co2'].min()
-                ],
-                'Máx': [
-                    filtered_df['temperatura'].max(),
-                    filtered_df['umidade'].max(),
-                    filtered_df['co2'].max()
-                ]
+                'Média': [local_stats[var]['media'] for var in ['temperatura', 'umidade', 'co2']],
+                'Mín': [local_stats[var]['minimo'] for var in ['temperatura', 'umidade', 'co2']],
+                'Máx': [local_stats[var]['maximo'] for var in ['temperatura', 'umidade', 'co2']],
+                'Desvio Padrão': [local_stats[var]['desvio_padrao'] for var in ['temperatura', 'umidade', 'co2']]
             })
             st.dataframe(
                 stats_df.round(2),
                 use_container_width=True,
                 hide_index=True
             )
+        
+        # Detalhamento das amostras brutas de uma coleta
+        with st.expander("🔬 Amostras Brutas por Coleta"):
+            coletas = filtered_df[filtered_df['coleta_id'].notna()]
+            if coletas.empty:
+                st.info("Nenhuma amostra bruta disponível para este local.")
+            else:
+                coleta_labels = {
+                    row['coleta_id']: f"{row['data'].strftime('%d/%m/%Y')} - {row['periodo']}"
+                    for _, row in coletas.iterrows()
+                }
+                selected_coleta = st.selectbox(
+                    "Coleta:",
+                    options=list(coleta_labels.keys()),
+                    format_func=coleta_labels.get,
+                    key="raw_coleta"
+                )
+                raw_df = load_raw_samples(st.session_state.raw_store, selected_coleta)
+                if raw_df is None:
+                    st.info("Amostras brutas não disponíveis para esta coleta.")
+                else:
+                    # Coletas com data/hora podem ser vistas em intervalos (média e faixa mín–máx)
+                    raw_freq = None
+                    if 'tempo' in raw_df.columns:
+                        raw_freq = st.selectbox(
+                            "Resolução:",
+                            [None] + list(RESAMPLE_FREQUENCIES),
+                            format_func=lambda freq: "Original" if freq is None else RESAMPLE_FREQUENCIES[freq],
+                            key="raw_freq"
+                        )
+                    # Figura guardada pela coleta e resolução, sem percorrer as amostras a cada execução
+                    raw_key = (selected_coleta, raw_freq)
+                    raw_view = st.session_state.get('raw_view')
+                    if raw_view is None or raw_view['chave'] != raw_key:
+                        if raw_freq is not None:
+                            raw_df = resample_samples(raw_df, raw_freq)
+                        raw_view = {
+                            'chave': raw_key,
+                            'figura': create_raw_samples_chart(
+                                raw_df, f"Amostras Brutas - {coleta_labels[selected_coleta]}"
+                            ),
+                            'resumo': raw_df.drop(columns=['tempo', 'n'], errors='ignore').describe().round(2)
+                        }
+                        st.session_state.raw_view = raw_view
+                    raw_fig = raw_view['figura']
+                    st.plotly_chart(raw_fig, use_container_width=True)
+                    st.caption(
+                        f"{raw_fig.layout.meta['pontos_renderizados']} pontos renderizados"
+                        + (" (WebGL)" if raw_fig.layout.meta['webgl'] else "")
+                    )
+                    st.dataframe(raw_view['resumo'], use_container_width=True)
 
 # Footer
 st.markdown("---")
@@ -0,0 +1,325 @@
+"""
+Ingestão em lote pela linha de comando
+Processa diretórios de arquivos de coleta sem abrir o navegador (e sem importar o Streamlit)
+
+Os metadados de cada arquivo (local, data e período) vêm do nome do arquivo,
+por uma expressão regular com grupos nomeados, ou de um manifesto CSV com as
+colunas arquivo, local, data e periodo (e, opcionalmente, planilha).
+
+Uso:
+    python batch_ingest.py "exemplos/coleta*.csv" --data 2025-08-18 --saida coletas.parquet
+    python batch_ingest.py dados/ --padrao "(?P<local>.+)_(?P<data>\\d{8})_(?P<periodo>manha|tarde)" \\
+        --formato-data %Y%m%d --saida coletas.csv.gz
+    python batch_ingest.py dados/ --manifesto manifesto.csv --banco coletas.sqlite
+"""
+
+import argparse
+import glob
+import logging
+import os
+import re
+import sys
+import time
+
+import pandas as pd
+
+from data_processor import (
+    SUPPORTED_EXTENSIONS,
+    create_master_df,
+    make_path_ingest_job,
+    process_uploaded_files,
+    split_duplicate_collections,
+    append_collections,
+    new_raw_sample_store,
+    prune_raw_samples,
+    new_sketch_store,
+    prune_quantile_sketches,
+    new_ingest_cache,
+    export_format_for,
+    export_dataset,
+    import_dataset,
+    open_dataset,
+    dataset_append,
+    dataset_load,
+    add_stage_listener,
+    stage_log_listener
+)
+
+# Padrão dos nomes dos arquivos de exemplo: coleta1_casa_ype_manha.csv, exemplo_casa_ype_tarde.xlsx
+DEFAULT_FILENAME_PATTERN = r'^(?:(?:coleta\d*|exemplo)_)?(?P<local>.+?)_(?P<periodo>manh[aã]|tarde)$'
+DEFAULT_DATE_FORMAT = '%Y-%m-%d'
+
+PERIODS = {'manha': 'Manhã', 'manhã': 'Manhã', 'tarde': 'Tarde'}
+
+
+def find_input_files(inputs):
+    """
+    Expande diretórios e padrões glob na lista de arquivos de coleta
+
+    Args:
+        inputs: Caminhos de arquivos, diretórios ou padrões glob
+
+    Returns:
+        list: Caminhos de arquivos com extensão suportada, sem repetições, em ordem alfabética
+    """
+    files = []
+    for item in inputs:
+        if os.path.isdir(item):
+            candidates = [os.path.join(item, name) for name in os.listdir(item)]
+        else:
+            candidates = glob.glob(item, recursive=True) or [item]
+        files.extend(
+            path for path in candidates
+            if os.path.isfile(path) and os.path.splitext(path)[1].lower() in SUPPORTED_EXTENSIONS
+        )
+    return sorted(set(files))
+
+
+def _normalize_period(value):
+    period = PERIODS.get(str(value).strip().lower())
+    if period is None:
+        raise ValueError(f"Período inválido: {value}. Use manhã ou tarde")
+    return period
+
+
+def _normalize_location(value):
+    return re.sub(r'[_\s]+', ' ', str(value)).strip().title()
+
+
+def metadata_from_filename(path, pattern, date_format=DEFAULT_DATE_FORMAT, default_date=None):
+    """
+    Extrai local, data e período do nome do arquivo
+
+    Args:
+        path: Caminho do arquivo
+        pattern: Expressão regular compilada aplicada ao nome sem extensão, com os
+            grupos nomeados 'local' e 'periodo' e, opcionalmente, 'data'
+        date_format: Formato do grupo 'data'
+        default_date: Data usada quando o padrão não tem o grupo 'data'
+
+    Returns:
+        dict: 'local', 'data' e 'periodo'
+
+    Raises:
+        ValueError: Se o nome não corresponder ao padrão ou faltar a data
+    """
+    stem = os.path.splitext(os.path.basename(path))[0]
+    match = pattern.search(stem)
+    if match is None:
+        raise ValueError("nome do arquivo não corresponde ao padrão")
+
+    groups = match.groupdict()
+    if groups.get('data'):
+        data = pd.to_datetime(groups['data'], format=date_format)
+    elif default_date is not None:
+        data = default_date
+    else:
+        raise ValueError("data ausente no nome do arquivo (use --data)")
+
+    return {
+        'local': _normalize_location(groups['local']),
+        'data': data,
+        'periodo': _normalize_period(groups['periodo'])
+    }
+
+
+def read_manifest(manifest_path, date_format=None):
+    """
+    Lê o manifesto CSV com os metadados de cada arquivo
+
+    Caminhos relativos são resolvidos a partir da pasta do manifesto.
+
+    Args:
+        manifest_path: Caminho do manifesto (colunas arquivo, local, data, periodo e planilha opcional)
+        date_format: Formato da coluna data (None = detecção automática)
+
+    Returns:
+        dict: Caminho absoluto do arquivo -> {'local', 'data', 'periodo', 'planilha'}
+    """
+    manifest = pd.read_csv(manifest_path, dtype=str)
+    manifest.columns = [col.strip().lower() for col in manifest.columns]
+    missing = [col for col in ['arquivo', 'local', 'data', 'periodo'] if col not in manifest.columns]
+    if missing:
+        raise ValueError(f"Manifesto sem as colunas: {', '.join(missing)}")
+
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    dates = pd.to_datetime(manifest['data'], format=date_format)
+    entries = {}
+    for row, data in zip(manifest.itertuples(index=False), dates):
+        path = os.path.abspath(os.path.join(base_dir, row.arquivo))
+        sheet = getattr(row, 'planilha', None)
+        entries[path] = {
+            'local': str(row.local).strip(),
+            'data': data,
+            'periodo': _normalize_period(row.periodo),
+            'planilha': 0 if pd.isna(sheet) or sheet == '' else sheet
+        }
+    return entries
+
+
+def _load_existing_output(path, sketch_store):
+    """
+    Carrega uma saída já existente (e seus sketches) para acrescentar as novas coletas a ela
+    """
+    if path and os.path.exists(path):
+        return import_dataset(path, sketch_store=sketch_store)
+    return create_master_df()
+
+
+def run_batch(files, metadata, output=None, database=None, samples_dir=None,
+              max_workers=None, cache_dir=None):
+    """
+    Processa os arquivos em paralelo e grava o conjunto consolidado
+
+    Coletas cujo arquivo já está na saída (ou no banco) são ignoradas, então
+    o mesmo comando pode ser repetido a cada noite sobre a mesma pasta.
+    Arquivos sem metadados (nome fora do padrão, ausentes do manifesto) são
+    apenas ignorados e listados à parte dos erros de processamento.
+
+    Args:
+        files: Caminhos dos arquivos
+        metadata: Função caminho -> {'local', 'data', 'periodo'[, 'planilha']}
+        output: Arquivo de saída (formato pela extensão, como em export_dataset)
+        database: Banco SQLite onde acrescentar as coletas (opcional)
+        samples_dir: Pasta onde guardar as amostras brutas (opcional)
+        max_workers: Número de processos (None = número de CPUs)
+        cache_dir: Pasta do cache de ingestão em disco (opcional)
+
+    Returns:
+        dict: 'novas', 'duplicadas', 'ignorados' e 'erros' (listas de (arquivo, mensagem)),
+              'total' (coletas na saída) e 'tempo' (segundos)
+    """
+    start = time.perf_counter()
+    skipped = []
+    errors = []
+    jobs = []
+    for path in files:
+        try:
+            info = metadata(path)
+        except ValueError as e:
+            skipped.append((os.path.basename(path), str(e)))
+            continue
+        jobs.append(make_path_ingest_job(
+            path, info['data'], info['local'], info['periodo'],
+            sheet_name=info.get('planilha', 0)
+        ))
+
+    raw_store = new_raw_sample_store(samples_dir) if samples_dir else None
+    sketch_store = new_sketch_store()
+    cache = new_ingest_cache(directory=cache_dir) if cache_dir else None
+    results = process_uploaded_files(
+        jobs, max_workers=max_workers, raw_store=raw_store, cache=cache, sketch_store=sketch_store
+    )
+    errors.extend((result['arquivo'], result['erro']) for result in results if result['erro'] is not None)
+    rows = [result['linha'] for result in results if result['erro'] is None]
+
+    conn = open_dataset(database) if database else None
+    master_df = (
+        dataset_load(conn, sketch_store=sketch_store) if conn is not None
+        else _load_existing_output(output, sketch_store)
+    )
+    new_rows, duplicate_rows = split_duplicate_collections(master_df, rows)
+    master_df = append_collections(master_df, new_rows)
+    if duplicate_rows:
+        prune_quantile_sketches(sketch_store, master_df['coleta_id'])
+        if raw_store is not None:
+            prune_raw_samples(raw_store, master_df['coleta_id'])
+
+    if conn is not None:
+        if new_rows:
+            dataset_append(conn, master_df.tail(len(new_rows)), sketch_store)
+        conn.close()
+    if output:
+        export_dataset(master_df, output, export_format_for(output), sketch_store=sketch_store)
+
+    return {
+        'novas': len(new_rows),
+        'duplicadas': len(duplicate_rows),
+        'ignorados': skipped,
+        'erros': errors,
+        'total': len(master_df),
+        'tempo': time.perf_counter() - start
+    }
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Ingestão em lote de arquivos de coleta (temperatura, umidade e CO₂)"
+    )
+    parser.add_argument('entradas', nargs='+', help="Arquivos, pastas ou padrões glob (ex.: 'exemplos/coleta*.csv')")
+    parser.add_argument('--manifesto', help="CSV com as colunas arquivo, local, data, periodo[, planilha]")
+    parser.add_argument('--padrao', default=DEFAULT_FILENAME_PATTERN,
+                        help="Expressão regular aplicada ao nome do arquivo, com os grupos local, periodo e data")
+    parser.add_argument('--formato-data', default=None,
+                        help="Formato das datas no nome do arquivo ou no manifesto "
+                             f"(padrão {DEFAULT_DATE_FORMAT.replace('%', '%%')})")
+    parser.add_argument('--data', help="Data usada quando o nome do arquivo não a contém (AAAA-MM-DD)")
+    parser.add_argument('--saida', help="Arquivo consolidado (.parquet, .csv.gz, .csv.zst, .csv ou .xlsx)")
+    parser.add_argument('--banco', help="Banco SQLite onde acrescentar as coletas")
+    parser.add_argument('--amostras', help="Pasta onde guardar as amostras brutas de cada coleta")
+    parser.add_argument('--cache', help="Pasta do cache de ingestão em disco")
+    parser.add_argument('--processos', type=int, default=None, help="Número de processos (padrão: CPUs)")
+    parser.add_argument('--log-etapas', action='store_true',
+                        help="Grava no stderr um registro JSON por etapa de cada arquivo")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if not args.saida and not args.banco:
+        print("Informe --saida e/ou --banco", file=sys.stderr)
+        return 2
+    if args.saida and export_format_for(args.saida) is None:
+        print(f"Formato de saída não reconhecido: {args.saida}", file=sys.stderr)
+        return 2
+
+    if args.log_etapas:
+        logging.basicConfig(level=logging.INFO, format='%(message)s', stream=sys.stderr)
+        add_stage_listener(stage_log_listener())
+
+    files = find_input_files(args.entradas)
+    if not files:
+        print("Nenhum arquivo de coleta encontrado", file=sys.stderr)
+        return 1
+
+    if args.manifesto:
+        entries = read_manifest(args.manifesto, args.formato_data)
+        files = [path for path in files if os.path.abspath(path) != os.path.abspath(args.manifesto)]
+
+        def metadata(path):
+            info = entries.get(os.path.abspath(path))
+            if info is None:
+                raise ValueError("arquivo ausente no manifesto")
+            return info
+    else:
+        pattern = re.compile(args.padrao, re.IGNORECASE)
+        default_date = pd.to_datetime(args.data) if args.data else None
+        date_format = args.formato_data or DEFAULT_DATE_FORMAT
+
+        def metadata(path):
+            return metadata_from_filename(path, pattern, date_format, default_date)
+
+    summary = run_batch(
+        files, metadata,
+        output=args.saida,
+        database=args.banco,
+        samples_dir=args.amostras,
+        max_workers=args.processos,
+        cache_dir=args.cache
+    )
+
+    print(
+        f"{summary['novas']} coleta(s) adicionada(s), {summary['duplicadas']} duplicada(s), "
+        f"{len(summary['ignorados'])} ignorado(s), {len(summary['erros'])} erro(s) em {summary['tempo']:.2f} s "
+        f"({summary['total']} coleta(s) no total)"
+    )
+    for filename, message in summary['ignorados']:
+        print(f"  ⚠️ {filename}: {message}", file=sys.stderr)
+    for filename, message in summary['erros']:
+        print(f"  ❌ {filename}: {message}", file=sys.stderr)
+    # Arquivos ignorados pelo nome não são falha: só erros de processamento mudam o status
+    return 1 if summary['erros'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
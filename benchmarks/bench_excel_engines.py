@@ -0,0 +1,75 @@
+"""
+Benchmark dos motores de leitura Excel
+
+Amplia as planilhas de exemplos/ para milhares de linhas (com colunas extras
+que não são de medição) e compara os motores instalados, com e sem a restrição
+de colunas usada por read_excel_measurements.
+
+Uso:
+    python benchmarks/bench_excel_engines.py
+"""
+
+import glob
+import os
+import sys
+import time
+from io import BytesIO
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from data_processor import available_excel_engines, read_excel_measurements
+
+
+def scaled_workbook(n_rows):
+    """
+    Gera uma planilha .xlsx em memória repetindo as linhas dos exemplos
+
+    Args:
+        n_rows: Número de linhas desejado
+
+    Returns:
+        bytes: Conteúdo do arquivo .xlsx
+    """
+    base = pd.concat(
+        [pd.read_excel(path) for path in sorted(glob.glob(os.path.join(ROOT, 'exemplos', '*.xlsx')))],
+        ignore_index=True
+    )
+    df = pd.concat([base] * (n_rows // len(base) + 1), ignore_index=True).iloc[:n_rows]
+    df['observacao'] = 'leitura automática do logger'
+    df['bateria'] = 3.7
+
+    buffer = BytesIO()
+    df.to_excel(buffer, index=False, engine='openpyxl')
+    return buffer.getvalue()
+
+
+def best_time(func, repeat=3):
+    """
+    Menor tempo (s) entre várias execuções
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    engines = available_excel_engines('.xlsx')
+    print(f"Motores disponíveis: {', '.join(engines)}\n")
+    print(f"{'linhas':>8} {'motor':>10} {'completo (ms)':>14} {'3 colunas (ms)':>15}")
+
+    for n_rows in [1_000, 10_000, 100_000]:
+        content = scaled_workbook(n_rows)
+        for engine in engines:
+            full = best_time(lambda: pd.read_excel(BytesIO(content), engine=engine))
+            restricted = best_time(lambda: read_excel_measurements(content, engine=engine))
+            print(f'{n_rows:>8} {engine:>10} {full * 1000:14.1f} {restricted * 1000:15.1f}')
+
+
+if __name__ == '__main__':
+    main()
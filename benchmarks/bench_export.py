@@ -0,0 +1,100 @@
+"""
+Benchmark da exportação Parquet em blocos do DataFrame mestre
+
+Mede export_dataset e a leitura de volta (import_dataset) e verifica que a
+exportação funciona quando o primeiro bloco só tem valores ausentes em uma
+coluna de texto (coletas sem sketch de quantis, sem hash_arquivo ou sem
+coleta_id), caso de dados restaurados de exportações antigas.
+
+Uso:
+    python benchmarks/bench_export.py
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_location_stats import make_master_df
+from data_processor import (
+    enforce_master_schema,
+    new_quantile_sketches,
+    update_quantile_sketches,
+    encode_quantile_sketches,
+    new_sketch_store,
+    store_quantile_sketches,
+    export_dataset,
+    import_dataset
+)
+
+
+def make_sketch_store(master_df, first_without, seed=0):
+    """
+    Gera sketches para as coletas, exceto as first_without primeiras
+
+    Args:
+        master_df: DataFrame mestre
+        first_without: Número de coletas iniciais sem sketch
+        seed: Semente do gerador aleatório
+
+    Returns:
+        dict: Armazenamento de new_sketch_store
+    """
+    rng = np.random.default_rng(seed)
+    store = new_sketch_store()
+    for coleta_id in master_df['coleta_id'].iloc[first_without:]:
+        values = pd.DataFrame(rng.normal(30, 3, (50, 3)), columns=['temperatura', 'umidade', 'co2'])
+        sketches = update_quantile_sketches(new_quantile_sketches(), values)
+        store_quantile_sketches(store, coleta_id, encode_quantile_sketches(sketches))
+    return store
+
+
+def check_null_first_chunk(directory, chunk_rows=100):
+    """
+    Exporta com o primeiro bloco só com ausentes em cada coluna de texto e confere a leitura de volta
+    """
+    master_df = enforce_master_schema(make_master_df(3 * chunk_rows, n_locals=5))
+    master_df.loc[:chunk_rows - 1, ['hash_arquivo', 'coleta_id']] = None
+    store = make_sketch_store(master_df, first_without=chunk_rows)
+
+    path = os.path.join(directory, 'primeiro_bloco_vazio.parquet')
+    export_dataset(master_df, path, 'parquet', chunk_rows=chunk_rows, sketch_store=store)
+    restored_store = new_sketch_store()
+    restored = import_dataset(path, sketch_store=restored_store)
+
+    assert len(restored) == len(master_df)
+    assert restored['hash_arquivo'].isna().sum() == chunk_rows
+    assert restored['coleta_id'].isna().sum() == chunk_rows
+    assert restored_store['sketches'] == store['sketches']
+
+
+def main():
+    with tempfile.TemporaryDirectory(prefix='bench_export_') as directory:
+        check_null_first_chunk(directory)
+        print('✅ Primeiro bloco só com ausentes exportado e restaurado')
+
+        print(f"\n{'coletas':>10} {'exportação (ms)':>16} {'leitura (ms)':>13} {'bytes':>12}")
+        for n_rows in [1_000, 10_000, 100_000]:
+            master_df = enforce_master_schema(make_master_df(n_rows))
+            store = make_sketch_store(master_df, first_without=n_rows // 2)
+            path = os.path.join(directory, f'coletas_{n_rows}.parquet')
+
+            start = time.perf_counter()
+            export_dataset(master_df, path, 'parquet', sketch_store=store)
+            exported = time.perf_counter() - start
+
+            start = time.perf_counter()
+            restored = import_dataset(path, sketch_store=new_sketch_store())
+            imported = time.perf_counter() - start
+            assert len(restored) == n_rows
+
+            print(f'{n_rows:>10} {exported * 1000:16.1f} {imported * 1000:13.1f} {os.path.getsize(path):>12}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Benchmark do cálculo de mínimo/máximo por local da tabela consolidada
+
+Compara a agregação agrupada (add_location_ranges) com o laço iterrows
+original e verifica que o tempo cresce linearmente com o número de coletas.
+
+Uso:
+    python benchmarks/bench_location_stats.py
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_processor import MASTER_COLUMNS, add_location_ranges
+
+
+def make_master_df(n_rows, n_locals=50, seed=0):
+    """
+    Gera um DataFrame mestre sintético
+
+    Args:
+        n_rows: Número de coletas
+        n_locals: Número de locais distintos
+        seed: Semente do gerador aleatório
+
+    Returns:
+        pd.DataFrame: DataFrame com as colunas de MASTER_COLUMNS
+    """
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'temperatura': rng.normal(30, 3, n_rows),
+        'umidade': rng.normal(65, 8, n_rows),
+        'co2': rng.normal(420, 30, n_rows),
+        'data': pd.Timestamp('2025-01-01') + pd.to_timedelta(rng.integers(0, 365, n_rows), unit='D'),
+        'local': [f'Local {i}' for i in rng.integers(0, n_locals, n_rows)],
+        'periodo': rng.choice(['Manhã', 'Tarde'], n_rows),
+        'coleta_id': [f'{i:032x}' for i in range(n_rows)],
+        'hash_arquivo': [f'{i:032x}' for i in range(n_rows)]
+    })
+    return df[MASTER_COLUMNS]
+
+
+def iterrows_ranges(master_df):
+    """
+    Implementação original (O(n²)) usada como referência
+    """
+    display_df = master_df.copy()
+    for idx, row in display_df.iterrows():
+        local_data = master_df[master_df['local'] == row['local']]
+        display_df.at[idx, 'temp_min'] = local_data['temperatura'].min()
+        display_df.at[idx, 'temp_max'] = local_data['temperatura'].max()
+        display_df.at[idx, 'umid_min'] = local_data['umidade'].min()
+        display_df.at[idx, 'umid_max'] = local_data['umidade'].max()
+        display_df.at[idx, 'co2_min'] = local_data['co2'].min()
+        display_df.at[idx, 'co2_max'] = local_data['co2'].max()
+    return display_df
+
+
+def best_time(func, *args, repeat=5):
+    """
+    Menor tempo (s) entre várias execuções
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    print(f"{'coletas':>10} {'agrupado (ms)':>15} {'µs/coleta':>10} {'iterrows (ms)':>15}")
+
+    sizes = [1_000, 10_000, 100_000, 1_000_000]
+    per_row = []
+    for n_rows in sizes:
+        df = make_master_df(n_rows)
+        grouped = best_time(add_location_ranges, df)
+        per_row.append(grouped / n_rows)
+
+        reference = ''
+        if n_rows <= 1_000:
+            expected = iterrows_ranges(df)
+            result = add_location_ranges(df)
+            for col in ['temp_min', 'temp_max', 'umid_min', 'umid_max', 'co2_min', 'co2_max']:
+                assert np.allclose(expected[col].astype(float), result[col]), col
+            reference = f'{best_time(iterrows_ranges, df, repeat=1) * 1000:15.1f}'
+
+        print(f'{n_rows:>10} {grouped * 1000:15.2f} {grouped / n_rows * 1e6:10.3f} {reference:>15}')
+
+    # Crescimento linear: o custo por coleta não deve aumentar com o tamanho
+    growth = per_row[-1] / per_row[1]
+    print(f'\nRazão custo/coleta ({sizes[-1]} vs {sizes[1]}): {growth:.2f}')
+    if growth > 3:
+        raise SystemExit('❌ Custo por coleta cresce com o tamanho: comportamento não linear')
+    print('✅ Crescimento linear')
+
+
+if __name__ == '__main__':
+    main()
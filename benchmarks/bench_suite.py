@@ -0,0 +1,335 @@
+"""
+Suíte de benchmarks da ingestão, agregação e gráficos
+
+Gera arquivos de coleta sintéticos no formato de exemplos/ (CSV com e sem
+cabeçalho, CSV com ';' e vírgula decimal, CSV latin-1 e .xlsx) e DataFrames
+mestre com muitas coletas, e mede:
+
+- ingestão (process_uploaded_file) por formato e tamanho de arquivo;
+- agregação: tabela consolidada (como em app.py), índice de locais e estatísticas;
+- construção das figuras e tamanho do JSON de cada uma, incluindo o pivô e o
+  gráfico da comparação entre locais.
+
+Os resultados são gravados em JSON para comparação entre versões.
+
+Uso:
+    python benchmarks/bench_suite.py                       # perfil rápido
+    python benchmarks/bench_suite.py --perfil completo     # até 10M linhas e 100K coletas
+    python benchmarks/bench_suite.py --comparar anterior.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_location_stats import make_master_df, best_time
+from data_processor import (
+    enforce_master_schema,
+    process_uploaded_file,
+    new_raw_sample_store,
+    add_location_ranges,
+    build_location_index,
+    get_statistics_summary
+)
+from visualizations import (
+    prepare_chart_frame,
+    clear_figure_cache,
+    create_temperature_chart,
+    create_humidity_chart,
+    create_co2_chart,
+    create_consolidated_chart,
+    create_raw_samples_chart,
+    prepare_comparison_frame,
+    create_locations_comparison_chart
+)
+
+# Tamanhos por perfil: linhas por arquivo e coletas no DataFrame mestre
+PROFILES = {
+    'rapido': {'linhas': [1_000, 100_000], 'coletas': [10, 1_000, 10_000]},
+    'completo': {'linhas': [1_000, 100_000, 1_000_000, 10_000_000], 'coletas': [10, 1_000, 10_000, 100_000]}
+}
+
+# Planilhas acima deste tamanho levam minutos só para serem geradas
+XLSX_MAX_ROWS = 100_000
+
+FILE_FORMATS = ['cabecalho', 'sem_cabecalho', 'ponto_e_virgula', 'latin1', 'xlsx']
+
+
+def make_measurements(n_rows, seed=0):
+    """
+    Gera medições sintéticas com a mesma ordem de grandeza dos exemplos
+    """
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'temperatura': rng.normal(32, 2, n_rows).round(1),
+        'umidade': rng.normal(68, 5, n_rows).round(1),
+        'co2': rng.normal(410, 25, n_rows).round(0)
+    })
+
+
+def write_collection_file(directory, file_format, n_rows):
+    """
+    Grava um arquivo de coleta sintético no formato pedido
+
+    Args:
+        directory: Pasta de destino
+        file_format: Um de FILE_FORMATS
+        n_rows: Número de linhas de medição
+
+    Returns:
+        str: Caminho do arquivo gerado
+    """
+    df = make_measurements(n_rows)
+    if file_format == 'xlsx':
+        path = os.path.join(directory, f'coleta_{n_rows}.xlsx')
+        df.to_excel(path, index=False)
+    elif file_format == 'sem_cabecalho':
+        path = os.path.join(directory, f'coleta_{n_rows}_sem_cabecalho.csv')
+        df.to_csv(path, index=False, header=False)
+    elif file_format == 'ponto_e_virgula':
+        path = os.path.join(directory, f'coleta_{n_rows}_pv.csv')
+        df.to_csv(path, index=False, sep=';', decimal=',')
+    elif file_format == 'latin1':
+        # Coluna extra com acentos para forçar a detecção de latin-1
+        path = os.path.join(directory, f'coleta_{n_rows}_latin1.csv')
+        df['observação'] = 'medição'
+        df.to_csv(path, index=False, sep=';', decimal=',', encoding='latin-1')
+    else:
+        path = os.path.join(directory, f'coleta_{n_rows}.csv')
+        df.to_csv(path, index=False)
+    return path
+
+
+def bench_ingestion(sizes, repeat):
+    """
+    Tempo de process_uploaded_file por formato e tamanho (com e sem amostras brutas)
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for n_rows in sizes:
+            for file_format in FILE_FORMATS:
+                if file_format == 'xlsx' and n_rows > XLSX_MAX_ROWS:
+                    continue
+                path = write_collection_file(directory, file_format, n_rows)
+                size = os.path.getsize(path)
+
+                def ingest(raw_store=None):
+                    with open(path, 'rb') as file_obj:
+                        return process_uploaded_file(
+                            file_obj, datetime(2025, 8, 18), 'Local', 'Manhã', raw_store=raw_store
+                        )
+
+                runs = 1 if n_rows >= 1_000_000 else repeat
+                seconds = best_time(ingest, repeat=runs)
+                with_samples = best_time(lambda: ingest(new_raw_sample_store()), repeat=runs)
+                results.append({
+                    'formato': file_format,
+                    'linhas': n_rows,
+                    'bytes': size,
+                    'segundos': seconds,
+                    'segundos_com_amostras': with_samples,
+                    'linhas_por_segundo': n_rows / seconds
+                })
+                print(f"  ingestão {file_format:>16} {n_rows:>10} linhas: {seconds * 1000:10.1f} ms")
+                os.remove(path)
+    return results
+
+
+def consolidated_table(master_df):
+    """
+    Mesma sequência da tabela 'Dados Consolidados' de app.py
+    """
+    display_df = master_df.copy()
+    display_df['data'] = pd.to_datetime(display_df['data']).dt.strftime('%d/%m/%Y')
+    display_df = add_location_ranges(display_df)
+    for col in ['temperatura', 'umidade', 'co2']:
+        display_df[col] = display_df[col].round(2)
+    return display_df
+
+
+def bench_aggregation(collection_counts, repeat):
+    """
+    Tempo da tabela consolidada, do índice de locais e do resumo estatístico
+    """
+    results = []
+    for n_collections in collection_counts:
+        master_df = enforce_master_schema(make_master_df(n_collections))
+        entry = {'coletas': n_collections}
+        for name, func in [
+            ('tabela_consolidada', consolidated_table),
+            ('indice_locais', build_location_index),
+            ('resumo_estatistico', get_statistics_summary)
+        ]:
+            entry[name] = best_time(func, master_df, repeat=repeat)
+        results.append(entry)
+        print(
+            f"  agregação {n_collections:>8} coletas: tabela {entry['tabela_consolidada'] * 1000:8.1f} ms, "
+            f"índice {entry['indice_locais'] * 1000:8.1f} ms"
+        )
+    return results
+
+
+def _timed_figure(builder, *args, **kwargs):
+    """
+    Constrói a figura sem acertos de cache e mede tempo e tamanho do JSON
+    """
+    clear_figure_cache()
+    start = time.perf_counter()
+    fig = builder(*args, **kwargs)
+    seconds = time.perf_counter() - start
+    return {'segundos': seconds, 'bytes_json': len(fig.to_json())}
+
+
+def bench_figures(collection_counts, sample_sizes):
+    """
+    Tempo de construção e tamanho do JSON de cada gráfico
+    """
+    results = []
+    for n_collections in collection_counts:
+        # Um único local, como no filtro da aplicação
+        master_df = enforce_master_schema(make_master_df(n_collections, n_locals=1))
+        clear_figure_cache()
+        start = time.perf_counter()
+        chart = prepare_chart_frame(master_df)
+        entry = {'coletas': n_collections, 'preparo': {'segundos': time.perf_counter() - start}}
+        for name, builder, kwargs in [
+            ('temperatura', create_temperature_chart, {}),
+            ('umidade', create_humidity_chart, {}),
+            ('co2', create_co2_chart, {}),
+            ('consolidado', create_consolidated_chart, {'high_volume': True})
+        ]:
+            # O preparo é compartilhado entre os gráficos, então cada um recebe o quadro pronto
+            entry[name] = _timed_figure(builder, chart, 'Local 0', **kwargs)
+        results.append(entry)
+        print(
+            f"  gráficos  {n_collections:>8} coletas: consolidado "
+            f"{entry['consolidado']['segundos'] * 1000:8.1f} ms, {entry['consolidado']['bytes_json']:>9} bytes"
+        )
+
+    for n_collections in collection_counts:
+        # Todos os locais, como na comparação entre locais da aplicação
+        master_df = enforce_master_schema(make_master_df(n_collections, n_locals=300))
+        clear_figure_cache()
+        start = time.perf_counter()
+        pivot = prepare_comparison_frame(master_df)
+        entry = {'coletas': n_collections, 'pivo_comparacao': {'segundos': time.perf_counter() - start}}
+        entry['comparacao_locais'] = _timed_figure(create_locations_comparison_chart, pivot, 'temperatura', 20)
+        results.append(entry)
+        print(
+            f"  comparação {n_collections:>7} coletas: pivô {entry['pivo_comparacao']['segundos'] * 1000:8.1f} ms, "
+            f"gráfico {entry['comparacao_locais']['segundos'] * 1000:8.1f} ms"
+        )
+
+    for n_rows in sample_sizes:
+        samples = make_measurements(n_rows)
+        entry = {'amostras': n_rows, 'amostras_brutas': _timed_figure(create_raw_samples_chart, samples, 'Coleta')}
+        results.append(entry)
+        print(
+            f"  gráficos  {n_rows:>8} amostras: {entry['amostras_brutas']['segundos'] * 1000:8.1f} ms, "
+            f"{entry['amostras_brutas']['bytes_json']:>9} bytes"
+        )
+    return results
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _flatten(results, prefix=''):
+    """
+    Achata os resultados em {chave: segundos} para comparação entre execuções
+    """
+    flat = {}
+    for section, entries in results.items():
+        for entry in entries:
+            label = '/'.join(
+                f'{key}={entry[key]}' for key in ['formato', 'linhas', 'coletas', 'amostras'] if key in entry
+            )
+            for key, value in entry.items():
+                if isinstance(value, dict) and 'segundos' in value:
+                    flat[f'{section}/{label}/{key}'] = value['segundos']
+                elif key.startswith('segundos') or key in ['tabela_consolidada', 'indice_locais', 'resumo_estatistico']:
+                    flat[f'{section}/{label}/{key}'] = value
+    return flat
+
+
+def compare(previous_path, results, tolerance=1.2):
+    """
+    Compara com uma execução anterior e lista as medições mais lentas que a tolerância
+
+    Returns:
+        int: Número de regressões encontradas
+    """
+    with open(previous_path, encoding='utf-8') as handle:
+        previous = json.load(handle)
+    before = _flatten(previous['resultados'])
+    after = _flatten(results)
+
+    regressions = 0
+    print(f"\nComparação com {previous_path} ({previous.get('revisao')}):")
+    for key in sorted(set(before) & set(after)):
+        ratio = after[key] / before[key] if before[key] else float('inf')
+        marker = '❌' if ratio > tolerance else '  '
+        regressions += ratio > tolerance
+        print(f"  {marker} {key:<70} {before[key] * 1000:10.2f} → {after[key] * 1000:10.2f} ms ({ratio:.2f}x)")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks de ingestão, agregação e gráficos")
+    parser.add_argument('--perfil', choices=sorted(PROFILES), default='rapido')
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--saida', help="Arquivo JSON de resultados (padrão: benchmarks/resultados/<revisão>_<data>.json)")
+    parser.add_argument('--comparar', help="JSON de uma execução anterior para comparação")
+    args = parser.parse_args(argv)
+
+    profile = PROFILES[args.perfil]
+    revision = _git_revision()
+
+    print(f"Perfil {args.perfil} (revisão {revision})")
+    results = {
+        'ingestao': bench_ingestion(profile['linhas'], args.repeticoes),
+        'agregacao': bench_aggregation(profile['coletas'], args.repeticoes),
+        'graficos': bench_figures(profile['coletas'], profile['linhas'][:2])
+    }
+
+    output = args.saida or os.path.join(
+        ROOT, 'benchmarks', 'resultados',
+        f"{revision or 'local'}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as handle:
+        json.dump({
+            'revisao': revision,
+            'data': datetime.now().isoformat(timespec='seconds'),
+            'perfil': args.perfil,
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'resultados': results
+        }, handle, indent=2, ensure_ascii=False)
+    print(f"\nResultados gravados em {output}")
+
+    if args.comparar and compare(args.comparar, results):
+        raise SystemExit('❌ Regressões de desempenho encontradas')
+
+
+if __name__ == '__main__':
+    main()
@@ -3,9 +3,298 @@ Módulo de processamento de dados
 Funções para validação, leitura e transformação de dados CSV e Excel
 """
 
+import numpy as np
 import pandas as pd
-from io import StringIO, BytesIO
+from io import BytesIO
+from collections import Counter, OrderedDict
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import base64
+import codecs
+import contextlib
+import contextvars
+import gzip
+import hashlib
+import importlib.util
+import io
+import json
+import logging
 import os
+import sqlite3
+import time
+import uuid
+
+
+# Colunas de medição esperadas nos arquivos de coleta
+EXPECTED_COLUMNS = ['temperatura', 'umidade', 'co2']
+
+# Colunas do DataFrame mestre (uma linha por coleta)
+MASTER_COLUMNS = [
+    'temperatura', 'umidade', 'co2', 'data', 'local', 'periodo', 'coleta_id', 'hash_arquivo'
+]
+
+# Estatísticas robustas de cada variável guardadas na linha resumo (coluna <variável>_<estatística>)
+ROBUST_STATS = {
+    'mediana': 'Mediana',
+    'p5': 'P5',
+    'p95': 'P95',
+    'media_aparada': 'Média aparada (10%)',
+    'outliers': 'Outliers (IQR)'
+}
+ROBUST_STAT_COLUMNS = [f'{var}_{stat}' for var in EXPECTED_COLUMNS for stat in ROBUST_STATS]
+
+# Momentos combináveis de cada variável guardados na linha resumo (com n_amostras):
+# soma, soma dos quadrados dos desvios em relação à média da coleta (m2), mínimo e máximo
+MOMENT_STATS = ['soma', 'm2', 'minimo', 'maximo']
+MOMENT_COLUMNS = [f'{var}_{stat}' for var in EXPECTED_COLUMNS for stat in MOMENT_STATS]
+
+# Colunas de estatísticas calculadas na ingestão (cache de ingestão e esquema do DataFrame mestre)
+SUMMARY_STAT_COLUMNS = ROBUST_STAT_COLUMNS + MOMENT_COLUMNS + ['n_amostras']
+
+# Colunas de contagem da linha resumo (inteiras, com valor ausente em coletas antigas)
+COUNT_COLUMNS = [f'{var}_outliers' for var in EXPECTED_COLUMNS] + ['n_amostras']
+
+# Fração descartada em cada extremo na média aparada e fator do critério de outliers (Tukey)
+TRIM_FRACTION = 0.1
+IQR_FACTOR = 1.5
+
+# Sketches de quantis (t-digest) de cada coleta: ficam fora do DataFrame mestre, em um
+# armazenamento por coleta_id (new_sketch_store) e, no banco, em uma tabela própria;
+# a coluna SKETCH_COLUMN (texto base64) existe apenas nos arquivos exportados
+SKETCH_COLUMN = 'quantis'
+SKETCH_TABLE = 'quantis'
+
+# Compressão do t-digest: cerca de SKETCH_COMPRESSION / 2 centróides por variável
+SKETCH_COMPRESSION = 100
+
+# Percentis exibidos a partir dos sketches
+SKETCH_QUANTILES = {'p5': 0.05, 'p25': 0.25, 'mediana': 0.5, 'p75': 0.75, 'p95': 0.95}
+
+# Extensões de arquivo aceitas na ingestão
+SUPPORTED_EXTENSIONS = ['.csv', '.xlsx', '.xls']
+
+# Colunas de mínimo/máximo por local exibidas na tabela consolidada
+LOCATION_RANGE_COLUMNS = {
+    'temperatura': ('temp_min', 'temp_max'),
+    'umidade': ('umid_min', 'umid_max'),
+    'co2': ('co2_min', 'co2_max')
+}
+
+# Delimitadores testados na detecção de dialeto CSV (em ordem de preferência)
+CSV_DELIMITERS = [',', ';', '\t', '|']
+
+# Coluna de data/hora das leituras: nomes reconhecidos e formatos fixos testados (em ordem)
+TIMESTAMP_COLUMNS = ['timestamp', 'data_hora', 'datahora', 'data hora', 'horario', 'horário', 'datetime', 'tempo', 'time']
+TIMESTAMP_FORMATS = [
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%dT%H:%M:%S',
+    '%Y-%m-%d %H:%M:%S.%f',
+    '%Y-%m-%dT%H:%M:%S.%f',
+    '%Y-%m-%d %H:%M',
+    '%d/%m/%Y %H:%M:%S',
+    '%d/%m/%Y %H:%M',
+    '%Y/%m/%d %H:%M:%S'
+]
+TIME_SNIFF_ROWS = 20
+
+# Resoluções de reamostragem das leituras: frequência -> rótulo
+RESAMPLE_FREQUENCIES = {'1min': '1 minuto', '5min': '5 minutos', '1h': '1 hora'}
+
+# Quantidade de bytes/linhas inspecionados na detecção de dialeto
+SNIFF_SAMPLE_BYTES = 64 * 1024
+SNIFF_MAX_LINES = 200
+
+# Motores de leitura Excel em ordem de preferência: (motor do pandas, módulo necessário, extensões)
+EXCEL_ENGINES = [
+    ('calamine', 'python_calamine', ['.xlsx', '.xls']),
+    ('openpyxl', 'openpyxl', ['.xlsx']),
+    ('xlrd', 'xlrd', ['.xls'])
+]
+
+# Leitura em blocos: tamanho do bloco (linhas) e tamanho de arquivo a partir do qual é ativada
+DEFAULT_CHUNKSIZE = 200_000
+STREAMING_THRESHOLD_BYTES = 50 * 1024 * 1024
+
+# Cache de ingestão: entradas em memória e tamanho do bloco lido ao calcular o hash
+INGEST_CACHE_MAX_ENTRIES = 128
+HASH_BLOCK_BYTES = 1024 * 1024
+
+# Banco SQLite para persistir o DataFrame mestre entre sessões (desativado se vazio)
+DATASET_PATH = os.environ.get('ANALISE_AMBIENTAL_DB', '')
+DATASET_TABLE = 'coletas'
+
+# Formatos de exportação: extensão, tipo MIME e módulo opcional necessário
+EXPORT_FORMATS = {
+    'parquet': {'extensao': '.parquet', 'mime': 'application/vnd.apache.parquet', 'modulo': 'pyarrow'},
+    'csv.gz': {'extensao': '.csv.gz', 'mime': 'application/gzip', 'modulo': None},
+    'csv.zst': {'extensao': '.csv.zst', 'mime': 'application/zstd', 'modulo': 'zstandard'},
+    'csv': {'extensao': '.csv', 'mime': 'text/csv', 'modulo': None},
+    'xlsx': {
+        'extensao': '.xlsx',
+        'mime': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        'modulo': 'openpyxl'
+    }
+}
+
+# Linhas gravadas por bloco na exportação e limite de linhas de dados por planilha Excel
+EXPORT_CHUNK_ROWS = 50_000
+
+# Colunas de texto da exportação Parquet: tipadas explicitamente, pois um bloco só com
+# valores ausentes seria inferido como tipo nulo e os blocos seguintes não poderiam ser gravados
+PARQUET_TEXT_COLUMNS = ['coleta_id', 'hash_arquivo', 'local', 'periodo', SKETCH_COLUMN]
+EXCEL_MAX_ROWS = 1_048_575
+
+# Tipo das medições no DataFrame mestre ('float32' reduz pela metade a memória das medições)
+MEASURE_DTYPES = ('float64', 'float32')
+MEASURE_DTYPE = os.environ.get('ANALISE_AMBIENTAL_MEASURE_DTYPE', 'float64')
+
+NO_VALID_DATA_MESSAGE = (
+    "Nenhum dado numérico válido encontrado. "
+    "Verifique se o arquivo contém valores de temperatura, umidade e CO₂."
+)
+
+# Logger dos registros de etapas (stage_log_listener)
+STAGE_LOGGER_NAME = 'analise_ambiental.etapas'
+
+# Funções que recebem cada registro de etapa concluída e pilha das etapas em andamento.
+# Ambas valem apenas para o contexto atual (thread/tarefa): cada sessão do Streamlit
+# roda em sua própria thread e não recebe os registros das outras
+_stage_listeners = contextvars.ContextVar('stage_listeners', default=())
+_stage_stack = contextvars.ContextVar('stage_stack', default=())
+
+
+def add_stage_listener(callback):
+    """
+    Registra uma função chamada com o registro (dict) de cada etapa concluída
+
+    O registro vale para o contexto atual (a thread que chamou), não para o
+    processo inteiro.
+
+    Args:
+        callback: Função que recebe o registro da etapa
+    """
+    _stage_listeners.set(_stage_listeners.get() + (callback,))
+
+
+def remove_stage_listener(callback):
+    """
+    Remove uma função registrada por add_stage_listener
+
+    Args:
+        callback: Função registrada anteriormente
+    """
+    _stage_listeners.set(tuple(listener for listener in _stage_listeners.get() if listener is not callback))
+
+
+def _emit_stage(record):
+    for callback in _stage_listeners.get():
+        callback(record)
+
+
+@contextlib.contextmanager
+def stage(name, **info):
+    """
+    Mede uma etapa do processamento e publica o registro aos ouvintes
+
+    O registro é um dict com 'etapa', 'segundos', o 'arquivo' da etapa
+    externa (se houver) e os campos informados; a etapa pode completá-lo
+    (bytes, linhas, tentativas...) pelo dict retornado. Sem ouvintes
+    registrados, o custo é apenas o de medir o tempo.
+
+    Args:
+        name: Nome da etapa
+        **info: Campos iniciais do registro
+
+    Yields:
+        dict: Registro da etapa
+    """
+    record = {'etapa': name, **info}
+    stack = _stage_stack.get()
+    if stack and 'arquivo' not in record:
+        record['arquivo'] = stack[-1].get('arquivo')
+    token = _stage_stack.set(stack + (record,))
+    start = time.perf_counter()
+    try:
+        yield record
+    except Exception as e:
+        record['erro'] = str(e)
+        raise
+    finally:
+        record['segundos'] = time.perf_counter() - start
+        _stage_stack.reset(token)
+        _emit_stage(record)
+
+
+@contextlib.contextmanager
+def record_stages(callback=None):
+    """
+    Coleta os registros das etapas executadas dentro do bloco
+
+    Args:
+        callback: Função opcional chamada também com cada registro
+
+    Yields:
+        list: Registros na ordem em que as etapas terminaram
+    """
+    records = []
+
+    def listener(record):
+        records.append(record)
+        if callback is not None:
+            callback(record)
+
+    add_stage_listener(listener)
+    try:
+        yield records
+    finally:
+        remove_stage_listener(listener)
+
+
+def stage_log_listener(logger=None, level=logging.INFO):
+    """
+    Cria um ouvinte que grava cada registro de etapa como uma linha JSON no log
+
+    Args:
+        logger: Logger de destino (padrão: STAGE_LOGGER_NAME)
+        level: Nível das mensagens
+
+    Returns:
+        function: Ouvinte para add_stage_listener ou record_stages
+    """
+    logger = logger or logging.getLogger(STAGE_LOGGER_NAME)
+
+    def listener(record):
+        logger.log(level, json.dumps(record, default=str, ensure_ascii=False), extra={'etapa': record})
+
+    return listener
+
+
+def summarize_stage_records(records):
+    """
+    Resume os registros de etapas por nome de etapa
+
+    Args:
+        records: Registros coletados por record_stages
+
+    Returns:
+        pd.DataFrame: Por etapa, 'execucoes', 'segundos' (soma), 'bytes', 'linhas'
+        e 'tentativas' (somas), ordenado pelo tempo total
+    """
+    columns = ['etapa', 'execucoes', 'segundos', 'bytes', 'linhas', 'tentativas']
+    if not records:
+        return pd.DataFrame(columns=columns)
+    df = pd.DataFrame(records)
+    for col in ['bytes', 'linhas', 'tentativas']:
+        if col not in df.columns:
+            df[col] = np.nan
+    grouped = df.groupby('etapa', sort=False)
+    summary = grouped.agg(execucoes=('segundos', 'size'), segundos=('segundos', 'sum'))
+    for col in ['bytes', 'linhas', 'tentativas']:
+        # Etapas que não informam a coluna ficam vazias em vez de zero
+        summary[col] = grouped[col].sum(min_count=1)
+    summary = summary.reset_index()
+    return summary.sort_values('segundos', ascending=False)[columns]
 
 
 def validate_inputs(uploaded_file, local_coleta):
@@ -28,173 +317,3204 @@ def validate_inputs(uploaded_file, local_coleta):
     return None
 
 
-def process_uploaded_file(uploaded_file, data_coleta, local_coleta, periodo_coleta):
+def _read_upload_bytes(uploaded_file):
     """
-    Processa o arquivo CSV ou Excel enviado e retorna um DataFrame com uma linha contendo
-    as médias e os metadados
-    
+    Obtém o conteúdo bruto (bytes) do arquivo enviado
+
     Args:
-        uploaded_file: Arquivo CSV/Excel enviado
-        data_coleta: Data da coleta (datetime)
-        local_coleta: Nome do local da coleta
-        periodo_coleta: Período da coleta (Manhã/Tarde)
-        
+        uploaded_file: Arquivo enviado (UploadedFile do Streamlit ou objeto com getvalue/read)
+
     Returns:
-        pd.DataFrame: DataFrame com uma linha contendo as médias e metadados
-        
-    Raises:
-        Exception: Se houver erro ao processar o arquivo
+        bytes: Conteúdo do arquivo
+    """
+    if hasattr(uploaded_file, 'getvalue'):
+        return uploaded_file.getvalue()
+    return uploaded_file.read()
+
+
+def _detect_encoding(sample):
+    """
+    Detecta a codificação de texto a partir de uma amostra de bytes
+
+    Args:
+        sample: Primeiros bytes do arquivo
+
+    Returns:
+        str: Nome da codificação ('utf-8-sig', 'utf-8' ou 'latin-1')
     """
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+
     try:
-        # Detectar tipo de arquivo pela extensão
-        file_extension = os.path.splitext(uploaded_file.name)[1].lower()
-        
-        # Processar Excel
-        if file_extension in ['.xlsx', '.xls']:
-            try:
-                file_bytes = uploaded_file.getvalue()
-                df_temp = pd.read_excel(BytesIO(file_bytes), engine='openpyxl')
-            except Exception as e:
-                raise ValueError(f"Erro ao ler arquivo Excel: {str(e)}")
-        
-        # Processar CSV
-        elif file_extension == '.csv':
-            try:
-                content = uploaded_file.getvalue().decode('utf-8')
-            except UnicodeDecodeError:
-                # Tentar outra codificação
-                try:
-                    content = uploaded_file.getvalue().decode('latin-1')
-                except:
-                    content = uploaded_file.getvalue().decode('cp1252')
-            
-            # Tentar diferentes delimitadores
-            delimiters = [',', ';', '\t', '|']
-            df_temp = None
-            
-            for delimiter in delimiters:
-                try:
-                    # Tentar com cabeçalho
-                    df_test = pd.read_csv(StringIO(content), delimiter=delimiter)
-                    
-                    # Verificar se conseguiu ler dados válidos
-                    if not df_test.empty and len(df_test.columns) >= 3:
-                        df_temp = df_test
-                        break
-                except:
-                    continue
-            
-            if df_temp is None:
-                # Última tentativa: sem cabeçalho
-                try:
-                    df_temp = pd.read_csv(
-                        StringIO(content),
-                        delimiter=',',
-                        header=None,
-                        names=['temperatura', 'umidade', 'co2']
-                    )
-                except:
-                    raise ValueError("Não foi possível ler o arquivo CSV com nenhum delimitador.")
-        else:
-            raise ValueError(f"Formato de arquivo não suportado: {file_extension}. Use .xlsx, .xls ou .csv")
-        
-        # Normalizar nomes das colunas (lowercase e sem espaços)
-        df_temp.columns = df_temp.columns.str.lower().str.strip()
-        
-        # Verificar colunas esperadas
-        expected_cols = ['temperatura', 'umidade', 'co2']
-        
-        # Se não tiver as colunas, tentar mapear por posição
-        if not all(col in df_temp.columns for col in expected_cols):
-            if len(df_temp.columns) >= 3:
-                # Renomear primeiras 3 colunas
-                df_temp.columns = ['temperatura', 'umidade', 'co2'] + list(df_temp.columns[3:])
-            else:
-                available_cols = list(df_temp.columns)
-                raise ValueError(f"Arquivo deve ter 3 colunas: temperatura, umidade, co2. Encontradas: {available_cols}")
-        
-        # Validar que o DataFrame tem dados
-        if df_temp.empty:
-            raise ValueError("O arquivo está vazio.")
-        
-        # Selecionar apenas as colunas necessárias
-        df_temp = df_temp[['temperatura', 'umidade', 'co2']]
-        
-        # Converter para numérico, tratando possíveis erros
-        for col in ['temperatura', 'umidade', 'co2']:
-            df_temp[col] = pd.to_numeric(df_temp[col], errors='coerce')
-        
-        # Remover linhas com valores inválidos
-        df_temp = df_temp.dropna()
-        
-        if df_temp.empty:
-            raise ValueError("Nenhum dado numérico válido encontrado. Verifique se o arquivo contém valores de temperatura, umidade e CO₂.")
-        
-        # Calcular médias
-        temp_media = df_temp['temperatura'].mean()
-        umidade_media = df_temp['umidade'].mean()
-        co2_media = df_temp['co2'].mean()
-        
-        # Criar DataFrame de uma linha com as médias e metadados
-        new_row = pd.DataFrame({
-            'temperatura': [temp_media],
-            'umidade': [umidade_media],
-            'co2': [co2_media],
-            'data': [pd.to_datetime(data_coleta)],
-            'local': [local_coleta.strip()],
-            'periodo': [periodo_coleta]
-        })
-        
-        return new_row
-        
-    except Exception as e:
-        raise Exception(f"Erro ao processar arquivo: {str(e)}")
+        # Decodificador incremental tolera um caractere multibyte cortado no fim da amostra
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return 'latin-1'
 
 
-def format_dataframe_for_display(df):
+def _is_number(token, decimal='.'):
     """
-    Formata o DataFrame para exibição na UI
-    
+    Verifica se um campo de texto representa um número
+
     Args:
-        df: DataFrame a ser formatado
-        
+        token: Campo de texto
+        decimal: Separador decimal ('.' ou ',')
+
     Returns:
-        pd.DataFrame: DataFrame formatado
+        bool: True se o campo for numérico
     """
-    display_df = df.copy()
-    
-    # Formatar data
-    if 'data' in display_df.columns:
-        display_df['data'] = pd.to_datetime(display_df['data']).dt.strftime('%d/%m/%Y')
-    
-    # Arredondar valores numéricos
-    numeric_cols = ['temperatura', 'umidade', 'co2']
-    for col in numeric_cols:
-        if col in display_df.columns:
-            display_df[col] = display_df[col].round(2)
-    
-    return display_df
+    token = token.strip().strip('"\'')
+    if decimal == ',':
+        token = token.replace(',', '.')
+    try:
+        float(token)
+        return True
+    except ValueError:
+        return False
 
 
-def get_statistics_summary(df):
+def _numeric_ratio(rows, decimal):
     """
-    Calcula estatísticas resumidas para um DataFrame
-    
+    Calcula a fração de campos numéricos nas três primeiras colunas das linhas
+
     Args:
-        df: DataFrame com dados ambientais
-        
+        rows: Lista de linhas já separadas em campos
+        decimal: Separador decimal a considerar
+
     Returns:
-        dict: Dicionário com estatísticas por variável
+        float: Fração de campos numéricos (0 a 1)
     """
-    stats = {}
-    
-    for var in ['temperatura', 'umidade', 'co2']:
-        if var in df.columns:
-            stats[var] = {
-                'media': df[var].mean(),
-                'minimo': df[var].min(),
-                'maximo': df[var].max(),
-                'desvio_padrao': df[var].std()
-            }
-    
-    return stats
+    fields = [field for row in rows for field in row[:len(EXPECTED_COLUMNS)]]
+    if not fields:
+        return 0.0
+    return sum(_is_number(field, decimal) for field in fields) / len(fields)
+
+
+def sniff_csv_dialect(raw_bytes, sample_size=SNIFF_SAMPLE_BYTES):
+    """
+    Detecta o dialeto de um arquivo CSV inspecionando apenas os primeiros bytes
+
+    Identifica codificação, delimitador, separador decimal e presença de cabeçalho
+    sem ler o arquivo inteiro, permitindo uma única leitura completa em seguida.
+
+    Args:
+        raw_bytes: Conteúdo bruto do arquivo
+        sample_size: Quantidade máxima de bytes inspecionados
+
+    Returns:
+        dict: Dialeto detectado com as chaves 'formato', 'codificacao', 'delimitador',
+            'decimal', 'cabecalho' e 'n_colunas'
+
+    Raises:
+        ValueError: Se a amostra não contiver nenhuma linha
+    """
+    sample = raw_bytes[:sample_size]
+    if len(raw_bytes) > sample_size:
+        # Descartar a última linha, possivelmente incompleta
+        cut = sample.rfind(b'\n')
+        if cut > 0:
+            sample = sample[:cut]
+
+    with stage('decodificacao', bytes=len(sample)) as record:
+        encoding = _detect_encoding(sample)
+        text = codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+        lines = [line for line in text.splitlines() if line.strip()][:SNIFF_MAX_LINES]
+        record['codificacao'] = encoding
+        record['linhas'] = len(lines)
+
+    if not lines:
+        raise ValueError("O arquivo está vazio.")
+
+    with stage('delimitador', linhas=len(lines)) as record:
+        probed = _probe_delimiters(lines)
+        record['tentativas'] = probed.pop('tentativas')
+        record['delimitador'] = probed['delimitador']
+
+    with stage('coluna_tempo', linhas=len(lines)) as record:
+        time_column = _detect_time_column(lines, probed['delimitador'])
+        if time_column is not None:
+            # Cabeçalho presente se a primeira linha não tiver uma data/hora nessa coluna
+            first = lines[0].split(probed['delimitador'])
+            probed['cabecalho'] = (
+                len(first) <= time_column['coluna']
+                or detect_timestamp_format([first[time_column['coluna']]]) != time_column['formato']
+            )
+            probed['tempo'] = time_column
+            record['formato_tempo'] = time_column['formato']
+
+    return {'formato': probed.pop('formato'), 'codificacao': encoding, **probed}
+
+
+def detect_timestamp_format(values):
+    """
+    Encontra o primeiro formato de TIMESTAMP_FORMATS válido para todos os valores
+
+    Args:
+        values: Amostra de valores de texto (vazios são ignorados)
+
+    Returns:
+        str: Formato strftime, ou None se nenhum servir
+    """
+    values = [str(value).strip().strip('"\'') for value in values]
+    values = [value for value in values if value]
+    if not values:
+        return None
+    for fmt in TIMESTAMP_FORMATS:
+        try:
+            for value in values:
+                datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        return fmt
+    return None
+
+
+def _detect_time_column(lines, delimiter):
+    """
+    Procura, nas linhas da amostra, uma coluna cujos valores sejam datas/horas
+
+    Args:
+        lines: Linhas não vazias da amostra
+        delimiter: Delimitador detectado
+
+    Returns:
+        dict: 'coluna' (posição) e 'formato' (strftime), ou None se não houver
+    """
+    rows = [line.split(delimiter) for line in lines[1:TIME_SNIFF_ROWS + 1] or lines[:1]]
+    n_cols = max((len(row) for row in rows), default=0)
+    for position in range(n_cols):
+        values = [row[position] for row in rows if len(row) > position]
+        if all(_is_number(value) for value in values):
+            continue
+        fmt = detect_timestamp_format(values)
+        if fmt is not None:
+            return {'coluna': position, 'formato': fmt}
+    return None
+
+
+def _probe_delimiters(lines):
+    """
+    Testa os delimitadores de CSV_DELIMITERS nas linhas da amostra
+
+    Args:
+        lines: Linhas não vazias da amostra já decodificada
+
+    Returns:
+        dict: Dialeto sem a codificação, com o número de delimitadores avaliados
+        em 'tentativas'
+    """
+    best = None
+    attempts = 0
+    for order, delimiter in enumerate(CSV_DELIMITERS):
+        attempts += 1
+        rows = [line.split(delimiter) for line in lines]
+        data_rows = rows[1:] if len(rows) > 1 else rows
+
+        # Número de colunas mais frequente e fração de linhas consistentes com ele
+        counts = [len(row) for row in data_rows]
+        n_cols = max(set(counts), key=counts.count)
+        if n_cols < len(EXPECTED_COLUMNS):
+            continue
+        consistency = counts.count(n_cols) / len(counts)
+
+        decimal = '.'
+        score = _numeric_ratio(data_rows, '.')
+        if delimiter != ',':
+            comma_score = _numeric_ratio(data_rows, ',')
+            if comma_score > score:
+                decimal, score = ',', comma_score
+
+        candidate = (consistency, score, -order)
+        if best is None or candidate > best[0]:
+            best = (candidate, delimiter, decimal, n_cols, rows)
+
+    if best is None:
+        # Nenhum delimitador produziu 3 colunas: manter vírgula e deixar a validação de colunas reportar
+        delimiter, decimal = ',', '.'
+        rows = [line.split(delimiter) for line in lines]
+        n_cols = len(rows[0])
+    else:
+        _, delimiter, decimal, n_cols, rows = best
+
+    # Cabeçalho presente se a primeira linha não for numérica
+    header = _numeric_ratio(rows[:1], decimal) < 1.0
+
+    return {
+        'formato': 'csv',
+        'delimitador': delimiter,
+        'decimal': decimal,
+        'cabecalho': header,
+        'n_colunas': n_cols,
+        'tentativas': attempts
+    }
+
+
+def _csv_read_kwargs(dialect):
+    """
+    Monta os argumentos de pd.read_csv correspondentes a um dialeto
+
+    Args:
+        dialect: Dialeto retornado por sniff_csv_dialect
+
+    Returns:
+        dict: Argumentos nomeados para pd.read_csv
+    """
+    read_kwargs = {
+        'sep': dialect['delimitador'],
+        'decimal': dialect['decimal'],
+        'encoding': dialect['codificacao']
+    }
+    if dialect['cabecalho']:
+        read_kwargs['header'] = 0
+    else:
+        read_kwargs['header'] = None
+        time_column = (dialect.get('tempo') or {}).get('coluna')
+        read_kwargs['names'] = _positional_column_names(dialect['n_colunas'], time_column)
+    return read_kwargs
+
+
+def _read_csv_with_dialect(raw_bytes, dialect):
+    """
+    Lê o arquivo CSV completo em uma única passada usando o dialeto detectado
+
+    Args:
+        raw_bytes: Conteúdo bruto do arquivo
+        dialect: Dialeto retornado por sniff_csv_dialect
+
+    Returns:
+        tuple: (DataFrame lido, dialeto utilizado). O dialeto recebido não é
+        alterado; se a codificação precisar ser trocada, é devolvida uma cópia
+    """
+    with stage('parse_csv', bytes=len(raw_bytes), tentativas=1) as record:
+        try:
+            df = pd.read_csv(BytesIO(raw_bytes), **_csv_read_kwargs(dialect))
+        except UnicodeDecodeError:
+            # A amostra era UTF-8 válido, mas o restante do arquivo não
+            record['tentativas'] += 1
+            dialect = dict(dialect, codificacao='latin-1')
+            df = pd.read_csv(BytesIO(raw_bytes), **_csv_read_kwargs(dialect))
+        record['linhas'] = len(df)
+    return df, dialect
+
+
+def _positional_column_names(n_cols, time_column=None):
+    """
+    Gera nomes de colunas para arquivos sem cabeçalho
+
+    Args:
+        n_cols: Número de colunas do arquivo
+        time_column: Posição da coluna de data/hora (None = sem data/hora)
+
+    Returns:
+        list: Nomes das colunas esperadas seguidos de nomes genéricos, com
+        'tempo' na posição da coluna de data/hora
+    """
+    n_measures = n_cols - (time_column is not None)
+    extra = [f'coluna_{i}' for i in range(len(EXPECTED_COLUMNS), n_measures)]
+    names = EXPECTED_COLUMNS[:n_measures] + extra
+    if time_column is not None:
+        names.insert(time_column, 'tempo')
+    return names
+
+
+def available_excel_engines(file_extension='.xlsx'):
+    """
+    Lista os motores de leitura Excel instalados que suportam a extensão
+
+    Args:
+        file_extension: Extensão do arquivo ('.xlsx' ou '.xls')
+
+    Returns:
+        list: Nomes dos motores do pandas, em ordem de preferência
+    """
+    return [
+        engine for engine, module, extensions in EXCEL_ENGINES
+        if file_extension in extensions and importlib.util.find_spec(module) is not None
+    ]
+
+
+def _is_measure_column(column):
+    """
+    Filtro de usecols: mantém apenas as colunas de medição (e a de data/hora) pelo nome
+    """
+    name = str(column).lower().strip()
+    return name in EXPECTED_COLUMNS or name in TIMESTAMP_COLUMNS
+
+
+def read_excel_measurements(file_bytes, file_extension='.xlsx', sheet_name=0, engine=None):
+    """
+    Lê as colunas de medição de uma planilha Excel com o motor mais rápido disponível
+
+    Tenta python-calamine quando instalado e recorre ao openpyxl (modo somente
+    leitura, usado pelo pandas) ou xlrd. Apenas as colunas temperatura, umidade e
+    co2 são lidas; se a planilha não as nomear, é relida por inteiro para o
+    mapeamento por posição.
+
+    Args:
+        file_bytes: Conteúdo bruto do arquivo
+        file_extension: Extensão do arquivo ('.xlsx' ou '.xls')
+        sheet_name: Nome ou índice da planilha
+        engine: Motor preferido (None = automático)
+
+    Returns:
+        tuple: (DataFrame lido, nome do motor utilizado)
+
+    Raises:
+        ValueError: Se nenhum motor conseguir ler o arquivo
+    """
+    engines = available_excel_engines(file_extension)
+    if engine is not None:
+        engines = [engine] + [name for name in engines if name != engine]
+    if not engines:
+        raise ValueError(f"Nenhum motor de leitura Excel instalado para arquivos {file_extension}")
+
+    last_error = None
+    with stage('parse_excel', bytes=len(file_bytes), tentativas=0) as record:
+        for name in engines:
+            record['tentativas'] += 1
+            try:
+                df = pd.read_excel(
+                    BytesIO(file_bytes), sheet_name=sheet_name, engine=name, usecols=_is_measure_column
+                )
+                if sum(str(col).lower().strip() in EXPECTED_COLUMNS for col in df.columns) < len(EXPECTED_COLUMNS):
+                    # Colunas sem os nomes esperados: ler tudo e mapear por posição
+                    record['tentativas'] += 1
+                    df = pd.read_excel(BytesIO(file_bytes), sheet_name=sheet_name, engine=name)
+                record['motor'] = name
+                record['linhas'] = len(df)
+                return df, name
+            except (ImportError, ValueError, OSError, KeyError) as e:
+                last_error = e
+
+        raise ValueError(str(last_error))
+
+
+def _clean_measurements(df_temp, allow_empty=False, dialect=None):
+    """
+    Normaliza colunas, converte para numérico e remove linhas inválidas
+
+    Se houver uma coluna de data/hora (detectada no dialeto ou reconhecida
+    pelo nome), ela é mantida como 'tempo' em datetime64, convertida com um
+    formato fixo em vez de inferência linha a linha.
+
+    Args:
+        df_temp: DataFrame lido do arquivo (ou um bloco dele)
+        allow_empty: Se True, retorna um DataFrame vazio em vez de falhar
+            quando não houver dados válidos (usado na leitura em blocos)
+        dialect: Dialeto CSV (com a chave opcional 'tempo') ou None
+
+    Returns:
+        pd.DataFrame: DataFrame com as colunas temperatura, umidade e co2 numéricas
+        (e 'tempo', quando o arquivo tiver data/hora)
+
+    Raises:
+        ValueError: Se o arquivo não tiver colunas suficientes ou dados válidos
+    """
+    # Normalizar nomes das colunas (lowercase e sem espaços)
+    df_temp.columns = df_temp.columns.astype(str).str.lower().str.strip()
+    
+    # Identificar a coluna de data/hora pela posição detectada ou pelo nome
+    time_info = (dialect or {}).get('tempo')
+    if time_info is not None and 'tempo' not in df_temp.columns and time_info['coluna'] < len(df_temp.columns):
+        df_temp = df_temp.rename(columns={df_temp.columns[time_info['coluna']]: 'tempo'})
+    elif 'tempo' not in df_temp.columns:
+        named = [col for col in df_temp.columns if col in TIMESTAMP_COLUMNS]
+        if named:
+            df_temp = df_temp.rename(columns={named[0]: 'tempo'})
+    has_time = 'tempo' in df_temp.columns
+    
+    # Se não tiver as colunas, tentar mapear por posição
+    if not all(col in df_temp.columns for col in EXPECTED_COLUMNS):
+        other_cols = [col for col in df_temp.columns if col != 'tempo']
+        if len(other_cols) >= 3:
+            # Renomear as 3 primeiras colunas que não são de data/hora
+            df_temp = df_temp.rename(columns=dict(zip(other_cols[:3], EXPECTED_COLUMNS)))
+        else:
+            available_cols = list(df_temp.columns)
+            raise ValueError(f"Arquivo deve ter 3 colunas: temperatura, umidade, co2. Encontradas: {available_cols}")
+    
+    # Validar que o DataFrame tem dados
+    if df_temp.empty and not allow_empty:
+        raise ValueError("O arquivo está vazio.")
+    
+    # Selecionar apenas as colunas necessárias
+    df_temp = df_temp[EXPECTED_COLUMNS + (['tempo'] if has_time else [])].copy()
+    
+    # Converter para numérico, tratando possíveis erros
+    with stage('conversao_numerica', linhas=len(df_temp)):
+        for col in EXPECTED_COLUMNS:
+            df_temp[col] = pd.to_numeric(df_temp[col], errors='coerce')
+    
+    if has_time:
+        with stage('conversao_tempo', linhas=len(df_temp)) as record:
+            time_format = time_info['formato'] if time_info is not None else None
+            df_temp['tempo'] = parse_timestamps(df_temp['tempo'], time_format)
+            record['formato'] = time_format
+    
+    # Remover linhas com valores inválidos
+    with stage('dropna', linhas_entrada=len(df_temp)) as record:
+        df_temp = df_temp.dropna()
+        record['linhas'] = len(df_temp)
+        record['descartadas'] = record['linhas_entrada'] - len(df_temp)
+    
+    if df_temp.empty and not allow_empty:
+        raise ValueError(NO_VALID_DATA_MESSAGE)
+    
+    return df_temp
+
+
+def parse_timestamps(values, time_format=None):
+    """
+    Converte uma coluna de datas/horas usando um formato fixo
+
+    O formato é detectado em uma pequena amostra quando não informado; se
+    nenhum de TIMESTAMP_FORMATS servir, usa o analisador ISO 8601 do pandas.
+    Valores inválidos viram NaT.
+
+    Args:
+        values: Série com as datas/horas (texto ou já datetime)
+        time_format: Formato strftime conhecido (None = detectar)
+
+    Returns:
+        pd.Series: Série datetime64[ns]
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.astype('datetime64[ns]')
+    if time_format is None:
+        time_format = detect_timestamp_format(values.dropna().head(TIME_SNIFF_ROWS).astype(str))
+    text = values.astype(str).str.strip()
+    return pd.to_datetime(text, format=time_format or 'ISO8601', errors='coerce').astype('datetime64[ns]')
+
+
+def _timestamps_to_ns(values):
+    """
+    Converte uma série datetime64 em um array int64 de nanossegundos
+    """
+    return values.to_numpy(dtype='datetime64[ns]').view(np.int64)
+
+
+def new_running_stats():
+    """
+    Cria um acumulador vazio de estatísticas incrementais por variável
+
+    Returns:
+        dict: Estado por variável com n, soma, media, m2 (Welford), minimo e maximo
+    """
+    return {
+        var: {
+            'n': 0,
+            'soma': 0.0,
+            'media': 0.0,
+            'm2': 0.0,
+            'minimo': np.inf,
+            'maximo': -np.inf
+        }
+        for var in EXPECTED_COLUMNS
+    }
+
+
+def _merge_moments(a, b):
+    """
+    Combina dois estados de uma variável (fórmula de Chan para a variância)
+
+    Args:
+        a: Estado acumulado
+        b: Estado a incorporar
+
+    Returns:
+        dict: Estado combinado
+    """
+    if b['n'] == 0:
+        return dict(a)
+    if a['n'] == 0:
+        return dict(b)
+
+    n = a['n'] + b['n']
+    delta = b['media'] - a['media']
+    return {
+        'n': n,
+        'soma': a['soma'] + b['soma'],
+        'media': a['media'] + delta * b['n'] / n,
+        'm2': a['m2'] + b['m2'] + delta * delta * a['n'] * b['n'] / n,
+        'minimo': min(a['minimo'], b['minimo']),
+        'maximo': max(a['maximo'], b['maximo'])
+    }
+
+
+def merge_running_stats(stats, other):
+    """
+    Combina dois acumuladores criados por new_running_stats
+
+    Args:
+        stats: Acumulador base
+        other: Acumulador a incorporar
+
+    Returns:
+        dict: Novo acumulador com as duas partes combinadas
+    """
+    return {var: _merge_moments(stats[var], other[var]) for var in EXPECTED_COLUMNS}
+
+
+def update_running_stats(stats, df):
+    """
+    Incorpora um bloco de medições já limpo ao acumulador
+
+    Args:
+        stats: Acumulador criado por new_running_stats (atualizado no lugar)
+        df: DataFrame com as colunas temperatura, umidade e co2 numéricas
+
+    Returns:
+        dict: O próprio acumulador atualizado
+    """
+    for var in EXPECTED_COLUMNS:
+        values = df[var].to_numpy(dtype='float64')
+        if values.size == 0:
+            continue
+        mean = values.mean()
+        chunk = {
+            'n': values.size,
+            'soma': values.sum(),
+            'media': mean,
+            'm2': ((values - mean) ** 2).sum(),
+            'minimo': values.min(),
+            'maximo': values.max()
+        }
+        stats[var] = _merge_moments(stats[var], chunk)
+    return stats
+
+
+def finalize_running_stats(stats):
+    """
+    Converte o acumulador em estatísticas finais por variável
+
+    Args:
+        stats: Acumulador criado por new_running_stats
+
+    Returns:
+        dict: Por variável, 'media', 'minimo', 'maximo', 'desvio_padrao' e 'n'
+    """
+    summary = {}
+    for var in EXPECTED_COLUMNS:
+        state = stats[var]
+        n = state['n']
+        summary[var] = {
+            'media': state['soma'] / n if n else np.nan,
+            'minimo': state['minimo'] if n else np.nan,
+            'maximo': state['maximo'] if n else np.nan,
+            'desvio_padrao': np.sqrt(state['m2'] / (n - 1)) if n > 1 else np.nan,
+            'n': n
+        }
+    return summary
+
+
+def collection_moments(stats):
+    """
+    Converte o acumulador de uma coleta nas colunas de momentos da linha resumo
+
+    Args:
+        stats: Acumulador de new_running_stats com todas as leituras da coleta
+
+    Returns:
+        dict: Valores de MOMENT_COLUMNS e 'n_amostras'
+    """
+    moments = {'n_amostras': stats[EXPECTED_COLUMNS[0]]['n']}
+    for var in EXPECTED_COLUMNS:
+        state = stats[var]
+        empty = state['n'] == 0
+        moments[f'{var}_soma'] = state['soma'] if not empty else np.nan
+        moments[f'{var}_m2'] = state['m2'] if not empty else np.nan
+        moments[f'{var}_minimo'] = state['minimo'] if not empty else np.nan
+        moments[f'{var}_maximo'] = state['maximo'] if not empty else np.nan
+    return moments
+
+
+def _row_moment_arrays(df, var):
+    """
+    Momentos de uma variável por linha do DataFrame mestre
+
+    Coletas sem momentos (anteriores a eles) entram como uma única leitura
+    igual à sua média.
+
+    Returns:
+        tuple: Arrays float64 (n, soma, m2, mínimo, máximo)
+    """
+    mean = df[var].to_numpy(dtype='float64')
+    if f'{var}_soma' not in df.columns:
+        valid = ~np.isnan(mean)
+        return (valid.astype('float64'), np.where(valid, mean, 0.0), np.zeros(len(df)), mean, mean)
+
+    n = df['n_amostras'].astype('float64').to_numpy(dtype='float64', na_value=np.nan)
+    total = df[f'{var}_soma'].to_numpy(dtype='float64')
+    m2 = df[f'{var}_m2'].to_numpy(dtype='float64')
+    minimum = df[f'{var}_minimo'].to_numpy(dtype='float64')
+    maximum = df[f'{var}_maximo'].to_numpy(dtype='float64')
+
+    legacy = np.isnan(n) | np.isnan(total)
+    if legacy.any():
+        valid = ~np.isnan(mean)
+        n = np.where(legacy, valid.astype('float64'), n)
+        total = np.where(legacy, np.where(valid, mean, 0.0), total)
+        m2 = np.where(legacy, 0.0, m2)
+        minimum = np.where(legacy, mean, minimum)
+        maximum = np.where(legacy, mean, maximum)
+    return n, total, m2, minimum, maximum
+
+
+def _group_moments(df, keys):
+    """
+    Combina os momentos das linhas por grupo (fórmula de Chan, vetorizada)
+
+    A variância combinada soma os m2 de cada coleta com a dispersão das
+    médias das coletas em torno da média do grupo, ponderada pelo número
+    de leituras: é o desvio padrão de todas as leituras, não das médias.
+
+    Args:
+        df: DataFrame mestre
+        keys: Rótulos de grupo, um por linha (Series alinhada a df ou array)
+
+    Returns:
+        tuple: (grupos em ordem, {variável: {'coletas', 'n', 'soma', 'media',
+        'm2', 'minimo', 'maximo'}} com um array por estatística)
+    """
+    codes, groups = pd.factorize(keys, sort=True)
+    n_groups = len(groups)
+    order = np.argsort(codes, kind='stable')
+    starts = np.flatnonzero(np.r_[True, np.diff(codes[order]) != 0])
+
+    result = {}
+    for var in EXPECTED_COLUMNS:
+        n, total, m2, minimum, maximum = _row_moment_arrays(df, var)
+        count = np.bincount(codes, weights=n, minlength=n_groups)
+        group_total = np.bincount(codes, weights=total, minlength=n_groups)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            group_mean = group_total / count
+            row_mean = np.where(n > 0, total / np.where(n > 0, n, 1), group_mean[codes])
+        spread = m2 + n * (row_mean - group_mean[codes]) ** 2
+        result[var] = {
+            'coletas': np.bincount(codes, weights=n > 0, minlength=n_groups).astype(np.int64),
+            'n': count,
+            'soma': group_total,
+            'media': np.where(count > 0, group_mean, np.nan),
+            'm2': np.bincount(codes, weights=np.nan_to_num(spread), minlength=n_groups),
+            'minimo': np.fmin.reduceat(minimum[order], starts) if n_groups else np.empty(0),
+            'maximo': np.fmax.reduceat(maximum[order], starts) if n_groups else np.empty(0)
+        }
+    return groups, result
+
+
+def moments_state(df):
+    """
+    Acumulador (formato de new_running_stats) com todas as leituras das coletas de df
+
+    Args:
+        df: DataFrame mestre (ou um recorte dele)
+
+    Returns:
+        dict: Estado por variável com n, soma, media, m2, minimo e maximo
+    """
+    stats = new_running_stats()
+    if df.empty:
+        return stats
+    _, grouped = _group_moments(df, np.zeros(len(df), dtype=np.int8))
+    for var in EXPECTED_COLUMNS:
+        stats[var] = _moment_state(grouped[var], 0, stats[var])
+    return stats
+
+
+def _moment_state(moments, position, default):
+    """
+    Estado (formato de new_running_stats) de um grupo de _group_moments
+    """
+    if moments['n'][position] <= 0:
+        return default
+    state = {key: float(moments[key][position]) for key in ['soma', 'media', 'm2', 'minimo', 'maximo']}
+    state['n'] = int(moments['n'][position])
+    return state
+
+
+def moment_summary(df, by=None):
+    """
+    Estatísticas de todas as leituras por grupo, combinando os momentos das coletas
+
+    Nenhum arquivo ou amostra é relido: cada coleta contribui com seus
+    momentos (n, soma, m2, mínimo, máximo). Para um intervalo de datas,
+    filtre df antes (selection_mask).
+
+    Args:
+        df: DataFrame mestre (ou um recorte dele)
+        by: Coluna de agrupamento ('local', 'periodo', 'data') ou None para o total
+
+    Returns:
+        pd.DataFrame: Uma linha por grupo e variável com o grupo (ou 'grupo' =
+        'Todos'), 'variavel', 'coletas', 'n', 'media', 'desvio_padrao',
+        'minimo' e 'maximo'
+    """
+    label = by or 'grupo'
+    columns = [label, 'variavel', 'coletas', 'n', 'media', 'desvio_padrao', 'minimo', 'maximo']
+    if df.empty:
+        # Sem coletas: colunas vazias com os mesmos tipos do resultado normal
+        dtypes = dict.fromkeys(columns, 'float64')
+        dtypes.update({label: df[by].dtype if by is not None else 'object', 'variavel': 'object',
+                       'coletas': 'int64', 'n': 'int64'})
+        return pd.DataFrame({col: pd.Series(dtype=dtype) for col, dtype in dtypes.items()})
+
+    keys = df[by] if by is not None else np.zeros(len(df), dtype=np.int8)
+    groups, grouped = _group_moments(df, keys)
+    if by is None:
+        groups = pd.Index(['Todos'])
+
+    def stacked(key):
+        return np.concatenate([grouped[var][key] for var in EXPECTED_COLUMNS])
+
+    n = stacked('n')
+    with np.errstate(invalid='ignore', divide='ignore'):
+        std = np.where(n > 1, np.sqrt(stacked('m2') / (n - 1)), np.nan)
+    return pd.DataFrame({
+        label: np.tile(np.asarray(groups), len(EXPECTED_COLUMNS)),
+        'variavel': np.repeat(EXPECTED_COLUMNS, len(groups)),
+        'coletas': stacked('coletas'),
+        'n': n.astype(np.int64),
+        'media': stacked('media'),
+        'desvio_padrao': std,
+        'minimo': stacked('minimo'),
+        'maximo': stacked('maximo')
+    })
+
+
+def robust_statistics(samples):
+    """
+    Calcula mediana, percentis 5/95, média aparada e outliers (IQR) das três variáveis
+
+    Cada coluna é ordenada uma única vez; percentis, média aparada e contagem
+    de outliers saem do mesmo array ordenado, sem novas passadas pelos dados.
+
+    Args:
+        samples: Array (n, 3) ou DataFrame com temperatura, umidade e co2 já limpos
+
+    Returns:
+        dict: Valores das colunas de ROBUST_STAT_COLUMNS e 'n_amostras'
+    """
+    if isinstance(samples, pd.DataFrame):
+        samples = samples[EXPECTED_COLUMNS]
+    values = np.sort(np.asarray(samples, dtype=np.float64), axis=0)
+    n = values.shape[0]
+    result = {col: np.nan for col in ROBUST_STAT_COLUMNS}
+    result['n_amostras'] = n
+    if n == 0:
+        return result
+
+    # Percentis por interpolação linear sobre o array ordenado (mesmo método de np.quantile)
+    positions = np.array([0.05, 0.25, 0.5, 0.75, 0.95]) * (n - 1)
+    lower = np.floor(positions).astype(np.int64)
+    upper = np.minimum(lower + 1, n - 1)
+    weight = (positions - lower)[:, None]
+    p5, q1, median, q3, p95 = values[lower] + weight * (values[upper] - values[lower])
+
+    cut = int(TRIM_FRACTION * n)
+    trimmed = values[cut:n - cut].mean(axis=0)
+
+    iqr = q3 - q1
+    low = q1 - IQR_FACTOR * iqr
+    high = q3 + IQR_FACTOR * iqr
+
+    for j, var in enumerate(EXPECTED_COLUMNS):
+        column = values[:, j]
+        result[f'{var}_mediana'] = median[j]
+        result[f'{var}_p5'] = p5[j]
+        result[f'{var}_p95'] = p95[j]
+        result[f'{var}_media_aparada'] = trimmed[j]
+        result[f'{var}_outliers'] = int(
+            np.searchsorted(column, low[j], 'left') + n - np.searchsorted(column, high[j], 'right')
+        )
+    return result
+
+
+def new_quantile_sketches():
+    """
+    Cria sketches de quantis (t-digest) vazios, um por variável
+
+    Returns:
+        dict: Por variável, 'centroides' e 'pesos' (arrays float64), 'minimo' e 'maximo'
+    """
+    return {
+        var: {
+            'centroides': np.empty(0),
+            'pesos': np.empty(0),
+            'minimo': np.inf,
+            'maximo': -np.inf
+        }
+        for var in EXPECTED_COLUMNS
+    }
+
+
+def _compress_digest(means, weights, compression=SKETCH_COMPRESSION):
+    """
+    Agrupa centróides ordenados pela função de escala k1 do t-digest
+
+    Centróides cuja posição acumulada cai no mesmo intervalo unitário de
+    k(q) = δ/2π·asin(2q − 1) são fundidos por média ponderada (np.add.reduceat),
+    o que mantém grupos unitários nas caudas e grupos grandes perto da mediana.
+
+    Returns:
+        tuple: (centróides, pesos) ordenados
+    """
+    if means.size == 0:
+        return means, weights
+    order = np.argsort(means, kind='stable')
+    means = means[order]
+    weights = weights[order]
+    cumulative = np.cumsum(weights)
+    q = (cumulative - weights / 2) / cumulative[-1]
+    k = np.floor(compression / (2 * np.pi) * np.arcsin(2 * q - 1))
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(k)) + 1])
+    merged_weights = np.add.reduceat(weights, starts)
+    merged_means = np.add.reduceat(means * weights, starts) / merged_weights
+    return merged_means, merged_weights
+
+
+def _merge_digest(a, b, compression=SKETCH_COMPRESSION):
+    """
+    Combina o sketch de uma variável com outro (ou com um bloco de valores de peso 1)
+    """
+    means, weights = _compress_digest(
+        np.concatenate([a['centroides'], b['centroides']]),
+        np.concatenate([a['pesos'], b['pesos']]),
+        compression
+    )
+    return {
+        'centroides': means,
+        'pesos': weights,
+        'minimo': min(a['minimo'], b['minimo']),
+        'maximo': max(a['maximo'], b['maximo'])
+    }
+
+
+def update_quantile_sketches(sketches, df, compression=SKETCH_COMPRESSION):
+    """
+    Incorpora um bloco de medições já limpo aos sketches
+
+    Args:
+        sketches: Sketches criados por new_quantile_sketches (atualizados no lugar)
+        df: DataFrame com as colunas temperatura, umidade e co2 numéricas
+        compression: Compressão do t-digest
+
+    Returns:
+        dict: Os próprios sketches atualizados
+    """
+    for var in EXPECTED_COLUMNS:
+        values = df[var].to_numpy(dtype='float64')
+        if values.size == 0:
+            continue
+        chunk = {
+            'centroides': values,
+            'pesos': np.ones(values.size),
+            'minimo': values.min(),
+            'maximo': values.max()
+        }
+        sketches[var] = _merge_digest(sketches[var], chunk, compression)
+    return sketches
+
+
+def merge_quantile_sketches(sketches_list, compression=SKETCH_COMPRESSION):
+    """
+    Combina vários sketches (de coletas, locais...) em um só
+
+    Todos os centróides são concatenados e comprimidos de uma vez.
+
+    Args:
+        sketches_list: Sketches de new_quantile_sketches ou decode_quantile_sketches
+        compression: Compressão do t-digest
+
+    Returns:
+        dict: Sketches combinados
+    """
+    sketches_list = [sketches for sketches in sketches_list if sketches is not None]
+    merged = new_quantile_sketches()
+    for var in EXPECTED_COLUMNS:
+        parts = [sketches[var] for sketches in sketches_list if sketches[var]['pesos'].size]
+        if not parts:
+            continue
+        means, weights = _compress_digest(
+            np.concatenate([part['centroides'] for part in parts]),
+            np.concatenate([part['pesos'] for part in parts]),
+            compression
+        )
+        merged[var] = {
+            'centroides': means,
+            'pesos': weights,
+            'minimo': min(part['minimo'] for part in parts),
+            'maximo': max(part['maximo'] for part in parts)
+        }
+    return merged
+
+
+def sketch_quantiles(sketches, quantiles=tuple(SKETCH_QUANTILES.values())):
+    """
+    Estima quantis a partir dos sketches
+
+    Interpola linearmente entre os centros dos centróides, com o mínimo e o
+    máximo exatos nas extremidades.
+
+    Args:
+        sketches: Sketches de quantis
+        quantiles: Quantis desejados, entre 0 e 1
+
+    Returns:
+        dict: Por variável, array com os quantis estimados (NaN sem dados)
+    """
+    quantiles = np.asarray(quantiles, dtype=np.float64)
+    estimates = {}
+    for var in EXPECTED_COLUMNS:
+        digest = sketches[var]
+        weights = digest['pesos']
+        if weights.size == 0:
+            estimates[var] = np.full(quantiles.shape, np.nan)
+            continue
+        cumulative = np.cumsum(weights)
+        total = cumulative[-1]
+        centers = cumulative - weights / 2
+        positions = np.concatenate([[0.0], centers, [total]])
+        values = np.concatenate([[digest['minimo']], digest['centroides'], [digest['maximo']]])
+        estimates[var] = np.interp(quantiles * total, positions, values)
+    return estimates
+
+
+def encode_quantile_sketches(sketches):
+    """
+    Serializa os sketches em binário compacto para o armazenamento de sketches
+
+    Args:
+        sketches: Sketches de quantis
+
+    Returns:
+        bytes: Por variável, mínimo, máximo, número de centróides, centróides e
+        pesos em float64
+    """
+    parts = []
+    for var in EXPECTED_COLUMNS:
+        digest = sketches[var]
+        parts.append(np.array([digest['minimo'], digest['maximo'], digest['pesos'].size], dtype=np.float64))
+        parts.append(digest['centroides'].astype(np.float64))
+        parts.append(digest['pesos'].astype(np.float64))
+    return np.concatenate(parts).tobytes()
+
+
+def decode_quantile_sketches(data):
+    """
+    Reconstrói os sketches serializados por encode_quantile_sketches
+
+    Args:
+        data: Bytes de encode_quantile_sketches, ou o mesmo conteúdo em texto
+            base64 (coluna SKETCH_COLUMN das exportações); None/NaN = sem sketch
+
+    Returns:
+        dict: Sketches de quantis, ou None se não houver sketch
+    """
+    if isinstance(data, str):
+        data = base64.b64decode(data)
+    if not isinstance(data, (bytes, bytearray, memoryview)) or not len(data):
+        return None
+    data = np.frombuffer(data, dtype=np.float64)
+    sketches = {}
+    offset = 0
+    for var in EXPECTED_COLUMNS:
+        minimum, maximum, size = data[offset:offset + 3]
+        size = int(size)
+        offset += 3
+        sketches[var] = {
+            'centroides': data[offset:offset + size],
+            'pesos': data[offset + size:offset + 2 * size],
+            'minimo': minimum,
+            'maximo': maximum
+        }
+        offset += 2 * size
+    return sketches
+
+
+def new_sketch_store():
+    """
+    Cria um armazenamento de sketches de quantis por coleta
+
+    Os sketches ficam fora do DataFrame mestre, em binário compacto
+    (encode_quantile_sketches) indexado pelo coleta_id, e só são decodificados
+    quando usados.
+
+    Returns:
+        dict: Armazenamento com a chave 'sketches' (coleta_id -> bytes)
+    """
+    return {'sketches': {}}
+
+
+def store_quantile_sketches(store, coleta_id, data):
+    """
+    Guarda os sketches serializados de uma coleta
+
+    Args:
+        store: Armazenamento criado por new_sketch_store
+        coleta_id: Identificador da coleta
+        data: Bytes de encode_quantile_sketches (ou texto base64); vazios são ignorados
+    """
+    if isinstance(data, str):
+        data = base64.b64decode(data)
+    if isinstance(data, (bytes, bytearray, memoryview)) and len(data):
+        store['sketches'][coleta_id] = bytes(data)
+
+
+def load_quantile_sketches(store, coleta_id):
+    """
+    Recupera (decodificados) os sketches de uma coleta
+
+    Args:
+        store: Armazenamento criado por new_sketch_store
+        coleta_id: Identificador da coleta
+
+    Returns:
+        dict: Sketches de quantis, ou None se a coleta não tiver sketch
+    """
+    return decode_quantile_sketches(store['sketches'].get(coleta_id))
+
+
+def prune_quantile_sketches(store, valid_ids):
+    """
+    Remove do armazenamento as coletas que não estão mais no DataFrame mestre
+
+    Args:
+        store: Armazenamento criado por new_sketch_store
+        valid_ids: Identificadores de coleta que devem ser mantidos
+
+    Returns:
+        int: Número de coletas removidas
+    """
+    valid_ids = set(valid_ids)
+    removed = [coleta_id for coleta_id in store['sketches'] if coleta_id not in valid_ids]
+    for coleta_id in removed:
+        del store['sketches'][coleta_id]
+    return len(removed)
+
+
+def _take_sketch_column(df, store):
+    """
+    Move a coluna SKETCH_COLUMN (exportações e bancos antigos) para o armazenamento
+
+    Returns:
+        pd.DataFrame: df sem a coluna SKETCH_COLUMN
+    """
+    if SKETCH_COLUMN not in df.columns:
+        return df
+    if store is not None:
+        for coleta_id, data in zip(df['coleta_id'], df[SKETCH_COLUMN]):
+            if isinstance(coleta_id, str):
+                store_quantile_sketches(store, coleta_id, data)
+    return df.drop(columns=SKETCH_COLUMN)
+
+
+def sketch_percentiles(df, sketch_store, by='local', quantiles=SKETCH_QUANTILES):
+    """
+    Percentis por grupo (e no total) combinando os sketches das coletas
+
+    Nenhuma amostra bruta é lida: apenas os sketches das coletas de df
+    (buscados pelo coleta_id no armazenamento) são decodificados e combinados.
+
+    Args:
+        df: DataFrame mestre (ou um recorte dele)
+        sketch_store: Armazenamento de new_sketch_store
+        by: Coluna de agrupamento (None = apenas o total)
+        quantiles: {rótulo: quantil} dos percentis calculados
+
+    Returns:
+        pd.DataFrame: Uma linha por grupo e variável, com o grupo (ou 'Todos'),
+        'variavel', 'coletas' (com sketch) e uma coluna por percentil
+    """
+    decoded = pd.Series(
+        [load_quantile_sketches(sketch_store, coleta_id) for coleta_id in df['coleta_id']],
+        index=df.index, dtype='object'
+    )
+    available = decoded.notna()
+    groups = []
+    if by is not None:
+        for key, members in decoded[available].groupby(df.loc[available, by], observed=True, sort=True):
+            groups.append((key, list(members)))
+    groups.append(('Todos', list(decoded[available])))
+
+    records = []
+    for key, members in groups:
+        estimates = sketch_quantiles(merge_quantile_sketches(members), list(quantiles.values()))
+        for var in EXPECTED_COLUMNS:
+            record = {by or 'grupo': key, 'variavel': var, 'coletas': len(members)}
+            record.update(zip(quantiles, estimates[var]))
+            records.append(record)
+    return pd.DataFrame(records)
+
+
+def _read_sample(file_obj, size):
+    """
+    Lê os primeiros bytes de um arquivo sem consumir o restante
+
+    Args:
+        file_obj: Objeto de arquivo binário com suporte a seek
+        size: Quantidade de bytes a ler
+
+    Returns:
+        bytes: Amostra inicial do arquivo
+    """
+    file_obj.seek(0)
+    sample = file_obj.read(size)
+    file_obj.seek(0)
+    return sample
+
+
+def _upload_size(uploaded_file):
+    """
+    Obtém o tamanho em bytes do arquivo enviado sem copiar seu conteúdo
+
+    Args:
+        uploaded_file: Arquivo enviado
+
+    Returns:
+        int: Tamanho em bytes
+    """
+    size = getattr(uploaded_file, 'size', None)
+    if size is not None:
+        return size
+    position = uploaded_file.tell()
+    size = uploaded_file.seek(0, os.SEEK_END)
+    uploaded_file.seek(position)
+    return size
+
+
+def _fold_csv_chunks(file_obj, dialect, chunksize, keep_samples=False, sketches=None):
+    """
+    Percorre o CSV em blocos acumulando as estatísticas de cada variável
+
+    Args:
+        file_obj: Objeto de arquivo binário
+        dialect: Dialeto do arquivo
+        chunksize: Número de linhas por bloco
+        keep_samples: Se True, guarda também as amostras limpas em float32
+        sketches: Sketches de quantis atualizados a cada bloco (ou None)
+
+    Returns:
+        tuple: (acumulador de estatísticas, array float32 (n, 3) ou None,
+        array int64 de datas/horas em ns ou None)
+    """
+    stats = new_running_stats()
+    blocks = []
+    time_blocks = []
+    file_obj.seek(0)
+    with pd.read_csv(file_obj, chunksize=chunksize, **_csv_read_kwargs(dialect)) as reader:
+        for chunk in reader:
+            chunk = _clean_measurements(chunk, allow_empty=True, dialect=dialect)
+            update_running_stats(stats, chunk)
+            if sketches is not None:
+                update_quantile_sketches(sketches, chunk)
+            if keep_samples:
+                blocks.append(chunk[EXPECTED_COLUMNS].to_numpy(dtype=np.float32))
+                if 'tempo' in chunk.columns:
+                    time_blocks.append(_timestamps_to_ns(chunk['tempo']))
+
+    samples = times = None
+    if keep_samples:
+        samples = np.concatenate(blocks) if blocks else np.empty((0, 3), dtype=np.float32)
+        if time_blocks:
+            times = np.concatenate(time_blocks)
+    return stats, samples, times
+
+
+def summarize_csv_stream(file_obj, dialect=None, chunksize=DEFAULT_CHUNKSIZE, keep_samples=False,
+                         sketches=None):
+    """
+    Resume um arquivo CSV lendo-o em blocos de tamanho fixo, com memória limitada
+
+    O arquivo nunca é materializado inteiro: cada bloco é limpo e incorporado a
+    somas, contagens, mínimos, máximos e variância de Welford por variável e,
+    opcionalmente, a sketches de quantis de tamanho fixo.
+
+    Args:
+        file_obj: Objeto de arquivo binário com suporte a seek
+        dialect: Dialeto CSV já conhecido; se None, é detectado pela amostra inicial
+        chunksize: Número de linhas por bloco
+        keep_samples: Se True, retorna também as amostras em float32 (12 bytes por linha)
+            e, se o arquivo tiver data/hora, os instantes de cada leitura
+        sketches: Sketches de new_quantile_sketches, atualizados no lugar
+
+    Returns:
+        tuple: (acumulador de estatísticas, dialeto utilizado) ou, com keep_samples,
+        (acumulador, dialeto, array float32 (n, 3), array int64 de ns ou None)
+
+    Raises:
+        ValueError: Se nenhuma linha válida for encontrada
+    """
+    if dialect is None:
+        dialect = sniff_csv_dialect(_read_sample(file_obj, SNIFF_SAMPLE_BYTES + 1))
+
+    with stage('streaming_csv', bytes=_upload_size(file_obj), tentativas=1) as record:
+        try:
+            stats, samples, times = _fold_csv_chunks(file_obj, dialect, chunksize, keep_samples, sketches)
+        except UnicodeDecodeError:
+            # A amostra era UTF-8 válido, mas o restante do arquivo não
+            record['tentativas'] += 1
+            dialect = dict(dialect, codificacao='latin-1')
+            if sketches is not None:
+                sketches.update(new_quantile_sketches())
+            stats, samples, times = _fold_csv_chunks(file_obj, dialect, chunksize, keep_samples, sketches)
+        record['linhas'] = stats[EXPECTED_COLUMNS[0]]['n']
+
+    if stats[EXPECTED_COLUMNS[0]]['n'] == 0:
+        raise ValueError(NO_VALID_DATA_MESSAGE)
+
+    if keep_samples:
+        return stats, dialect, samples, times
+    return stats, dialect
+
+
+def new_raw_sample_store(directory=None):
+    """
+    Cria um armazenamento de amostras brutas por coleta
+
+    Cada coleta é guardada como um bloco contíguo float32 de forma (n, 3), com as
+    colunas temperatura, umidade e co2, indexado pelo coleta_id da linha resumo.
+    Coletas com data/hora guardam também os instantes das leituras (int64, ns).
+    Se um diretório for informado, os blocos são gravados como arquivos .npy e
+    mantidos apenas como memory-map.
+
+    Args:
+        directory: Diretório para persistir os blocos (None = somente memória)
+
+    Returns:
+        dict: Armazenamento com as chaves 'diretorio', 'blocos' e 'tempos'
+    """
+    if directory is not None:
+        os.makedirs(directory, exist_ok=True)
+    return {'diretorio': directory, 'blocos': {}, 'tempos': {}}
+
+
+def _raw_sample_path(store, coleta_id, suffix=''):
+    """
+    Caminho do arquivo .npy de uma coleta no armazenamento
+
+    Args:
+        store: Armazenamento criado por new_raw_sample_store
+        coleta_id: Identificador da coleta
+        suffix: '' para as medições ou '.tempo' para os instantes das leituras
+
+    Returns:
+        str: Caminho do arquivo
+    """
+    return os.path.join(store['diretorio'], f'{coleta_id}{suffix}.npy')
+
+
+def store_raw_samples(store, coleta_id, samples, times=None):
+    """
+    Guarda as amostras brutas de uma coleta
+
+    Args:
+        store: Armazenamento criado por new_raw_sample_store
+        coleta_id: Identificador da coleta
+        samples: DataFrame com temperatura, umidade e co2 (e 'tempo' opcional) ou array (n, 3)
+        times: Instantes das leituras (int64 em ns ou datetime64); se None, usa a
+            coluna 'tempo' de samples quando houver
+    """
+    if isinstance(samples, pd.DataFrame):
+        if times is None and 'tempo' in samples.columns:
+            times = samples['tempo']
+        samples = samples[EXPECTED_COLUMNS].to_numpy()
+    block = np.ascontiguousarray(samples, dtype=np.float32)
+    if times is not None:
+        times = np.ascontiguousarray(np.asarray(times, dtype='datetime64[ns]').view(np.int64))
+
+    if store['diretorio'] is not None:
+        path = _raw_sample_path(store, coleta_id)
+        np.save(path, block)
+        block = np.load(path, mmap_mode='r')
+        if times is not None:
+            time_path = _raw_sample_path(store, coleta_id, '.tempo')
+            np.save(time_path, times)
+            times = np.load(time_path, mmap_mode='r')
+
+    store['blocos'][coleta_id] = block
+    if times is not None:
+        store.setdefault('tempos', {})[coleta_id] = times
+
+
+def load_raw_samples(store, coleta_id):
+    """
+    Recupera as amostras brutas de uma coleta
+
+    Args:
+        store: Armazenamento criado por new_raw_sample_store
+        coleta_id: Identificador da coleta
+
+    Returns:
+        pd.DataFrame: Amostras com as colunas temperatura, umidade e co2 (e
+        'tempo', se a coleta tiver data/hora), ou None se a coleta não tiver
+        amostras guardadas
+    """
+    time_blocks = store.setdefault('tempos', {})
+    block = store['blocos'].get(coleta_id)
+    if block is None and store['diretorio'] is not None:
+        path = _raw_sample_path(store, coleta_id)
+        if os.path.exists(path):
+            block = np.load(path, mmap_mode='r')
+            store['blocos'][coleta_id] = block
+            time_path = _raw_sample_path(store, coleta_id, '.tempo')
+            if os.path.exists(time_path):
+                time_blocks[coleta_id] = np.load(time_path, mmap_mode='r')
+    if block is None:
+        return None
+
+    samples = pd.DataFrame(np.asarray(block), columns=EXPECTED_COLUMNS)
+    times = time_blocks.get(coleta_id)
+    if times is not None:
+        samples.insert(0, 'tempo', np.asarray(times).view('datetime64[ns]'))
+    return samples
+
+
+def prune_raw_samples(store, valid_ids):
+    """
+    Remove do armazenamento as coletas que não estão mais no DataFrame mestre
+
+    Args:
+        store: Armazenamento criado por new_raw_sample_store
+        valid_ids: Identificadores de coleta que devem ser mantidos
+
+    Returns:
+        int: Número de coletas removidas
+    """
+    valid_ids = set(valid_ids)
+    stored_ids = set(store['blocos'])
+    if store['diretorio'] is not None:
+        # Incluir blocos gravados em disco que ainda não foram carregados
+        stored_ids.update(
+            name.split('.', 1)[0] for name in os.listdir(store['diretorio'])
+            if name.endswith('.npy')
+        )
+
+    removed = [coleta_id for coleta_id in stored_ids if coleta_id not in valid_ids]
+    for coleta_id in removed:
+        store['blocos'].pop(coleta_id, None)
+        store.setdefault('tempos', {}).pop(coleta_id, None)
+        if store['diretorio'] is not None:
+            for suffix in ['', '.tempo']:
+                path = _raw_sample_path(store, coleta_id, suffix)
+                if os.path.exists(path):
+                    os.remove(path)
+    return len(removed)
+
+
+def resample_samples(samples, freq='5min'):
+    """
+    Agrega as leituras de uma coleta em intervalos fixos de tempo
+
+    A agregação é vetorizada: os instantes são divididos pelo tamanho do
+    intervalo, ordenados uma vez e reduzidos com reduceat, sem groupby.
+
+    Args:
+        samples: DataFrame de load_raw_samples com a coluna 'tempo'
+        freq: Tamanho do intervalo (chave de RESAMPLE_FREQUENCIES ou qualquer
+            duração aceita por pd.Timedelta)
+
+    Returns:
+        pd.DataFrame: Uma linha por intervalo com 'tempo' (início), 'n' e,
+        para cada variável, '<var>_media', '<var>_min' e '<var>_max'
+
+    Raises:
+        ValueError: Se as amostras não tiverem data/hora
+    """
+    if 'tempo' not in samples.columns:
+        raise ValueError("As amostras desta coleta não têm data/hora")
+
+    step = pd.Timedelta(freq).value
+    buckets = _timestamps_to_ns(samples['tempo']) // step
+    order = np.argsort(buckets, kind='stable')
+    buckets = buckets[order]
+
+    if len(buckets):
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    else:
+        starts = np.empty(0, dtype=np.int64)
+    counts = np.diff(np.r_[starts, len(buckets)])
+
+    result = {
+        'tempo': pd.to_datetime(buckets[starts] * step),
+        'n': counts
+    }
+    for var in EXPECTED_COLUMNS:
+        values = samples[var].to_numpy(dtype=np.float64)[order]
+        if len(values):
+            result[f'{var}_media'] = np.add.reduceat(values, starts) / counts
+            result[f'{var}_min'] = np.minimum.reduceat(values, starts)
+            result[f'{var}_max'] = np.maximum.reduceat(values, starts)
+        else:
+            for stat in ['media', 'min', 'max']:
+                result[f'{var}_{stat}'] = np.empty(0, dtype=np.float64)
+    return pd.DataFrame(result)
+
+
+def new_ingest_cache(max_entries=INGEST_CACHE_MAX_ENTRIES, directory=None):
+    """
+    Cria um cache de ingestão indexado pelo hash do conteúdo dos arquivos
+
+    Guarda o resultado da leitura (médias, dialeto e, quando disponíveis, as
+    amostras) para que reenvios do mesmo arquivo custem apenas o cálculo do hash.
+    O nível em memória é LRU com tamanho limitado; o nível em disco (opcional)
+    grava cada entrada como um arquivo .npz.
+
+    Args:
+        max_entries: Número máximo de entradas em memória
+        directory: Diretório do nível em disco (None = somente memória)
+
+    Returns:
+        dict: Cache com as entradas, a configuração e os contadores de acertos/falhas
+    """
+    if directory is not None:
+        os.makedirs(directory, exist_ok=True)
+    return {
+        'max_entradas': max_entries,
+        'diretorio': directory,
+        'entradas': OrderedDict(),
+        'acertos': 0,
+        'falhas': 0
+    }
+
+
+def hash_upload(uploaded_file):
+    """
+    Calcula o hash (BLAKE2b) do conteúdo de um arquivo lendo-o em blocos
+
+    Args:
+        uploaded_file: Arquivo enviado (objeto binário com seek/read)
+
+    Returns:
+        str: Hash hexadecimal do conteúdo
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    uploaded_file.seek(0)
+    for block in iter(lambda: uploaded_file.read(HASH_BLOCK_BYTES), b''):
+        digest.update(block)
+    uploaded_file.seek(0)
+    return digest.hexdigest()
+
+
+def ingest_cache_key(content_hash, file_extension, dialect=None, sheet_name=0):
+    """
+    Monta a chave do cache a partir do hash do conteúdo e das opções de leitura
+
+    Args:
+        content_hash: Hash do conteúdo (hash_upload)
+        file_extension: Extensão do arquivo
+        dialect: Dialeto CSV informado explicitamente (ou None)
+        sheet_name: Planilha lida em arquivos Excel
+
+    Returns:
+        str: Chave hexadecimal
+    """
+    options = json.dumps([file_extension, dialect, sheet_name], sort_keys=True, default=str)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(content_hash.encode())
+    digest.update(options.encode())
+    return digest.hexdigest()
+
+
+def _ingest_cache_path(cache, key):
+    """
+    Caminho do arquivo .npz de uma entrada no nível em disco
+    """
+    return os.path.join(cache['diretorio'], f'{key}.npz')
+
+
+def ingest_cache_get(cache, key):
+    """
+    Busca uma entrada no cache (memória e, em seguida, disco)
+
+    Args:
+        cache: Cache criado por new_ingest_cache
+        key: Chave de ingest_cache_key
+
+    Returns:
+        dict: Entrada com 'medias', 'estatisticas', 'quantis', 'amostras', 'tempos' e
+        'dialeto', ou None se ausente
+    """
+    entries = cache['entradas']
+    entry = entries.get(key)
+    if entry is not None:
+        entries.move_to_end(key)
+    elif cache['diretorio'] is not None and os.path.exists(_ingest_cache_path(cache, key)):
+        with np.load(_ingest_cache_path(cache, key), allow_pickle=False) as data:
+            samples = data['amostras']
+            times = data['tempos'] if 'tempos' in data.files else np.empty(0, dtype=np.int64)
+            statistics = None
+            if 'estatisticas' in data.files:
+                names = (
+                    data['colunas_estatisticas'].tolist() if 'colunas_estatisticas' in data.files
+                    else ROBUST_STAT_COLUMNS + ['n_amostras']
+                )
+                statistics = dict(zip(names, data['estatisticas'].tolist()))
+                for col in COUNT_COLUMNS:
+                    if col in statistics:
+                        statistics[col] = None if np.isnan(statistics[col]) else int(statistics[col])
+            entry = {
+                'medias': dict(zip(EXPECTED_COLUMNS, data['medias'].tolist())),
+                'estatisticas': statistics,
+                'quantis': _cached_sketch_bytes(data),
+                'amostras': samples if samples.size else None,
+                'tempos': times if times.size else None,
+                'dialeto': json.loads(str(data['dialeto']))
+            }
+        _ingest_cache_store(cache, key, entry)
+
+    if entry is None:
+        cache['falhas'] += 1
+        return None
+    cache['acertos'] += 1
+    return entry
+
+
+def _cached_sketch_bytes(data):
+    """
+    Sketches serializados de uma entrada .npz do cache (bytes ou None)
+
+    Entradas antigas guardavam o texto base64 em vez dos bytes.
+    """
+    if 'quantis' not in data.files or not data['quantis'].size:
+        return None
+    sketches = data['quantis']
+    if sketches.dtype.kind == 'U':
+        return base64.b64decode(str(sketches))
+    return sketches.tobytes()
+
+
+def ingest_cache_contains(cache, key, with_samples=False):
+    """
+    Verifica se uma chave está no cache (memória ou disco) sem contar acerto/falha
+
+    Args:
+        cache: Cache criado por new_ingest_cache
+        key: Chave de ingest_cache_key
+        with_samples: Se True, só considera entradas que guardaram as amostras brutas
+
+    Returns:
+        bool: True se a entrada existir
+    """
+    entry = cache['entradas'].get(key)
+    if entry is not None:
+        return not with_samples or entry['amostras'] is not None
+    path = _ingest_cache_path(cache, key) if cache['diretorio'] is not None else None
+    if path is None or not os.path.exists(path):
+        return False
+    if not with_samples:
+        return True
+    # Lê apenas o cabeçalho do array de amostras, sem carregá-lo
+    with np.load(path, allow_pickle=False) as data, data.zip.open('amostras.npy') as member:
+        version = np.lib.format.read_magic(member)
+        read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+        shape = read_header(member)[0]
+    return shape[0] > 0
+
+
+def _ingest_cache_store(cache, key, entry):
+    """
+    Insere uma entrada no nível em memória, descartando as menos usadas
+    """
+    entries = cache['entradas']
+    entries[key] = entry
+    entries.move_to_end(key)
+    while len(entries) > cache['max_entradas']:
+        entries.popitem(last=False)
+
+
+def ingest_cache_put(cache, key, entry):
+    """
+    Guarda o resultado de uma leitura no cache
+
+    Args:
+        cache: Cache criado por new_ingest_cache
+        key: Chave de ingest_cache_key
+        entry: Dicionário com 'medias', 'estatisticas', 'quantis', 'amostras' (array float32 ou None),
+            'tempos' (array int64 ou None) e 'dialeto'
+    """
+    _ingest_cache_store(cache, key, entry)
+
+    if cache['diretorio'] is not None:
+        samples = entry['amostras']
+        times = entry.get('tempos')
+        statistics = entry.get('estatisticas') or {}
+        np.savez(
+            _ingest_cache_path(cache, key),
+            medias=np.array([entry['medias'][var] for var in EXPECTED_COLUMNS], dtype=np.float64),
+            estatisticas=np.array(
+                [np.nan if statistics.get(col) is None else statistics[col] for col in SUMMARY_STAT_COLUMNS],
+                dtype=np.float64
+            ),
+            colunas_estatisticas=np.array(SUMMARY_STAT_COLUMNS),
+            amostras=samples if samples is not None else np.empty((0, 3), dtype=np.float32),
+            tempos=times if times is not None else np.empty(0, dtype=np.int64),
+            quantis=np.frombuffer(entry.get('quantis') or b'', dtype=np.uint8),
+            dialeto=np.array(json.dumps(entry['dialeto'], default=str))
+        )
+
+
+def _parse_measurements(uploaded_file, file_extension, dialect, chunksize, keep_samples,
+                        sheet_name, excel_engine):
+    """
+    Lê o arquivo e calcula as médias das medições
+
+    Args:
+        uploaded_file: Arquivo CSV/Excel enviado
+        file_extension: Extensão do arquivo
+        dialect: Dialeto CSV já conhecido (ou None)
+        chunksize: Linhas por bloco (None = automático pelo tamanho do arquivo)
+        keep_samples: Se True, retorna também as amostras limpas em float32
+        sheet_name: Planilha a ler em arquivos Excel
+        excel_engine: Motor Excel preferido
+
+    Returns:
+        dict: 'medias' por variável, 'estatisticas' (robust_statistics),
+        'quantis' (bytes de encode_quantile_sketches), 'amostras' (array float32 (n, 3) ou
+        None), 'tempos' (instantes das leituras em ns, int64, ou None) e 'dialeto'
+    """
+    samples = times = None
+    
+    # Processar Excel
+    if file_extension in ['.xlsx', '.xls']:
+        try:
+            with stage('leitura') as record:
+                file_bytes = _read_upload_bytes(uploaded_file)
+                record['bytes'] = len(file_bytes)
+            df_temp, engine_used = read_excel_measurements(
+                file_bytes, file_extension, sheet_name, excel_engine
+            )
+            dialect = {'formato': 'excel', 'motor': engine_used, 'planilha': sheet_name}
+        except Exception as e:
+            raise ValueError(f"Erro ao ler arquivo Excel: {str(e)}")
+    
+    # Processar CSV
+    else:
+        if dialect is not None and dialect.get('formato') != 'csv':
+            dialect = None
+        
+        if chunksize is None and _upload_size(uploaded_file) > STREAMING_THRESHOLD_BYTES:
+            chunksize = DEFAULT_CHUNKSIZE
+        
+        if chunksize is not None:
+            # Leitura em blocos com memória limitada
+            sketches = new_quantile_sketches()
+            if keep_samples:
+                stats, dialect, samples, times = summarize_csv_stream(
+                    uploaded_file, dialect, chunksize, keep_samples=True, sketches=sketches
+                )
+            else:
+                stats, dialect = summarize_csv_stream(uploaded_file, dialect, chunksize, sketches=sketches)
+            summary = finalize_running_stats(stats)
+            means = {var: summary[var]['media'] for var in EXPECTED_COLUMNS}
+            with stage('estatisticas_robustas', linhas=summary[EXPECTED_COLUMNS[0]]['n']):
+                if samples is not None:
+                    statistics = robust_statistics(samples)
+                    statistics.update(collection_moments(stats))
+                else:
+                    # Sem as amostras em memória: percentis estimados pelos sketches
+                    statistics = robust_statistics(np.empty((0, 3)))
+                    statistics.update(collection_moments(stats))
+                    estimates = sketch_quantiles(sketches, [0.05, 0.5, 0.95])
+                    for var in EXPECTED_COLUMNS:
+                        for stat, value in zip(['p5', 'mediana', 'p95'], estimates[var]):
+                            statistics[f'{var}_{stat}'] = value
+            return {
+                'medias': means, 'estatisticas': statistics, 'quantis': encode_quantile_sketches(sketches),
+                'amostras': samples, 'tempos': times, 'dialeto': dialect
+            }
+        
+        with stage('leitura') as record:
+            file_bytes = _read_upload_bytes(uploaded_file)
+            record['bytes'] = len(file_bytes)
+        
+        if dialect is None:
+            dialect = sniff_csv_dialect(file_bytes)
+        
+        try:
+            df_temp, dialect = _read_csv_with_dialect(file_bytes, dialect)
+        except Exception as e:
+            raise ValueError(f"Não foi possível ler o arquivo CSV: {str(e)}")
+    
+    df_temp = _clean_measurements(df_temp, dialect=dialect)
+    
+    # Calcular médias
+    with stage('medias', linhas=len(df_temp)):
+        means = {var: df_temp[var].mean() for var in EXPECTED_COLUMNS}
+        if keep_samples:
+            samples = df_temp[EXPECTED_COLUMNS].to_numpy(dtype=np.float32)
+            if 'tempo' in df_temp.columns:
+                times = _timestamps_to_ns(df_temp['tempo'])
+    
+    with stage('estatisticas_robustas', linhas=len(df_temp)):
+        statistics = robust_statistics(df_temp)
+        statistics.update(collection_moments(update_running_stats(new_running_stats(), df_temp)))
+        sketches = update_quantile_sketches(new_quantile_sketches(), df_temp)
+    
+    return {
+        'medias': means, 'estatisticas': statistics, 'quantis': encode_quantile_sketches(sketches),
+        'amostras': samples, 'tempos': times, 'dialeto': dialect
+    }
+
+
+def _build_summary_row(means, data_coleta, local_coleta, periodo_coleta, coleta_id, content_hash,
+                       statistics=None):
+    """
+    Cria o DataFrame de uma linha com as médias e os metadados da coleta
+
+    Args:
+        means: Dicionário {variável: média}
+        data_coleta: Data da coleta
+        local_coleta: Nome do local da coleta
+        periodo_coleta: Período da coleta
+        coleta_id: Identificador único da coleta
+        content_hash: Hash do conteúdo do arquivo de origem
+        statistics: Estatísticas robustas (robust_statistics), acrescentadas como colunas
+
+    Returns:
+        pd.DataFrame: DataFrame de uma linha
+    """
+    row = pd.DataFrame({
+        'temperatura': [means['temperatura']],
+        'umidade': [means['umidade']],
+        'co2': [means['co2']],
+        'data': [pd.to_datetime(data_coleta)],
+        'local': [local_coleta.strip()],
+        'periodo': [periodo_coleta],
+        'coleta_id': [coleta_id],
+        'hash_arquivo': [content_hash]
+    })
+    for col, value in (statistics or {}).items():
+        row[col] = [value]
+    return row
+
+
+def process_uploaded_file(uploaded_file, data_coleta, local_coleta, periodo_coleta,
+                          dialect=None, return_dialect=False, chunksize=None,
+                          raw_store=None, sheet_name=0, excel_engine=None, cache=None,
+                          sketch_store=None):
+    """
+    Processa o arquivo CSV ou Excel enviado e retorna um DataFrame com uma linha contendo
+    as médias e os metadados
+    
+    Arquivos CSV passam por uma detecção de dialeto sobre os primeiros bytes
+    (sniff_csv_dialect) e são lidos por completo uma única vez. CSVs maiores que
+    STREAMING_THRESHOLD_BYTES (ou quando chunksize é informado) são resumidos em
+    blocos por summarize_csv_stream, sem carregar o arquivo inteiro na memória.
+    
+    Args:
+        uploaded_file: Arquivo CSV/Excel enviado
+        data_coleta: Data da coleta (datetime)
+        local_coleta: Nome do local da coleta
+        periodo_coleta: Período da coleta (Manhã/Tarde)
+        dialect: Dialeto CSV já conhecido (ex: de um arquivo anterior do mesmo logger);
+            se None, é detectado automaticamente
+        return_dialect: Se True, retorna também o dialeto utilizado
+        chunksize: Linhas por bloco na leitura em streaming de CSV; se None, o
+            streaming é ativado automaticamente para arquivos grandes
+        raw_store: Armazenamento de amostras brutas (new_raw_sample_store); se
+            informado, as amostras limpas são guardadas sob o coleta_id da linha
+        sheet_name: Planilha a ler em arquivos Excel (nome ou índice)
+        excel_engine: Motor Excel preferido ('calamine', 'openpyxl', 'xlrd');
+            None escolhe o mais rápido instalado, com fallback automático
+        cache: Cache de ingestão (new_ingest_cache); arquivos com o mesmo conteúdo
+            e opções de leitura não são lidos novamente
+        sketch_store: Armazenamento de sketches (new_sketch_store); se informado,
+            os sketches de quantis da coleta são guardados sob o coleta_id da linha
+        
+    Returns:
+        pd.DataFrame: DataFrame com uma linha contendo as médias e metadados
+        (ou tupla (DataFrame, dict) se return_dialect=True)
+        
+    Raises:
+        Exception: Se houver erro ao processar o arquivo
+    """
+    try:
+        with stage('total', arquivo=os.path.basename(str(getattr(uploaded_file, 'name', '')))):
+            # Detectar tipo de arquivo pela extensão
+            file_extension = os.path.splitext(uploaded_file.name)[1].lower()
+            if file_extension not in SUPPORTED_EXTENSIONS:
+                raise ValueError(f"Formato de arquivo não suportado: {file_extension}. Use .xlsx, .xls ou .csv")
+        
+            with stage('hash', bytes=_upload_size(uploaded_file)):
+                content_hash = hash_upload(uploaded_file)
+            keep_samples = raw_store is not None
+        
+            # Reaproveitar leitura anterior do mesmo conteúdo
+            parsed = None
+            if cache is not None:
+                with stage('cache') as record:
+                    cache_key = ingest_cache_key(content_hash, file_extension, dialect, sheet_name)
+                    parsed = ingest_cache_get(cache, cache_key)
+                    if parsed is not None and keep_samples and parsed['amostras'] is None:
+                        parsed = None
+                    record['acerto'] = parsed is not None
+        
+            if parsed is None:
+                parsed = _parse_measurements(
+                    uploaded_file, file_extension, dialect, chunksize, keep_samples,
+                    sheet_name, excel_engine
+                )
+                if cache is not None:
+                    ingest_cache_put(cache, cache_key, parsed)
+        
+            # Criar DataFrame de uma linha com as médias e metadados
+            coleta_id = uuid.uuid4().hex
+            new_row = _build_summary_row(
+                parsed['medias'], data_coleta, local_coleta, periodo_coleta, coleta_id, content_hash,
+                parsed.get('estatisticas')
+            )
+            if sketch_store is not None:
+                store_quantile_sketches(sketch_store, coleta_id, parsed.get('quantis'))
+        
+            if raw_store is not None:
+                with stage('amostras', linhas=len(parsed['amostras'])):
+                    store_raw_samples(raw_store, coleta_id, parsed['amostras'], parsed.get('tempos'))
+        
+            if return_dialect:
+                return new_row, dict(parsed['dialeto'])
+            return new_row
+        
+    except Exception as e:
+        raise Exception(f"Erro ao processar arquivo: {str(e)}")
+
+
+def make_ingest_job(uploaded_file, data_coleta, local_coleta, periodo_coleta, sheet_name=0):
+    """
+    Prepara um arquivo enviado para ingestão em outro processo
+
+    Args:
+        uploaded_file: Arquivo CSV/Excel enviado
+        data_coleta: Data da coleta
+        local_coleta: Nome do local da coleta
+        periodo_coleta: Período da coleta
+        sheet_name: Planilha a ler em arquivos Excel
+
+    Returns:
+        dict: Tarefa com o nome do arquivo, seus bytes e os metadados
+    """
+    return {
+        'arquivo': uploaded_file.name,
+        'conteudo': _read_upload_bytes(uploaded_file),
+        'data': data_coleta,
+        'local': local_coleta,
+        'periodo': periodo_coleta,
+        'planilha': sheet_name
+    }
+
+
+def make_path_ingest_job(path, data_coleta, local_coleta, periodo_coleta, sheet_name=0):
+    """
+    Prepara um arquivo em disco para ingestão em outro processo
+
+    Ao contrário de make_ingest_job, apenas o caminho é enviado ao worker, que
+    lê o arquivo diretamente (e em blocos, se for grande); lotes com milhares
+    de arquivos não precisam ficar inteiros na memória do processo principal.
+
+    Args:
+        path: Caminho do arquivo CSV/Excel
+        data_coleta: Data da coleta
+        local_coleta: Nome do local da coleta
+        periodo_coleta: Período da coleta
+        sheet_name: Planilha a ler em arquivos Excel
+
+    Returns:
+        dict: Tarefa com o nome e o caminho do arquivo e os metadados
+    """
+    return {
+        'arquivo': os.path.basename(path),
+        'caminho': os.fspath(path),
+        'data': data_coleta,
+        'local': local_coleta,
+        'periodo': periodo_coleta,
+        'planilha': sheet_name
+    }
+
+
+@contextlib.contextmanager
+def _open_job_file(job):
+    """
+    Abre o conteúdo de uma tarefa de ingestão como arquivo binário com nome
+    """
+    if 'conteudo' in job:
+        file_obj = BytesIO(job['conteudo'])
+        file_obj.name = job['arquivo']
+        yield file_obj
+    else:
+        with open(job['caminho'], 'rb') as file_obj:
+            yield file_obj
+
+
+def _job_cache_key(job):
+    """
+    Chave do cache de ingestão para uma tarefa de make_ingest_job ou make_path_ingest_job
+    """
+    if 'conteudo' in job:
+        digest = hashlib.blake2b(job['conteudo'], digest_size=16).hexdigest()
+    else:
+        with _open_job_file(job) as file_obj:
+            digest = hash_upload(file_obj)
+    file_extension = os.path.splitext(job['arquivo'])[1].lower()
+    return ingest_cache_key(digest, file_extension, None, job.get('planilha', 0))
+
+
+def _run_ingest_job(job, cache=None):
+    """
+    Processa uma tarefa de ingestão isolando erros (executado nos workers)
+
+    Args:
+        job: Tarefa de make_ingest_job ou make_path_ingest_job, com as chaves extras
+            'guardar_amostras', 'guardar_quantis' e 'usar_cache'
+        cache: Cache de ingestão compartilhado (apenas no processo principal);
+            nos workers, um cache local de uma entrada é devolvido no resultado
+
+    Returns:
+        dict: Resultado com 'arquivo', 'linha', 'amostras', 'tempos', 'quantis', 'cache',
+        'contadores_cache' ((acertos, falhas) do cache local, ou None), 'erro',
+        'tempo' e 'etapas' (registros de etapas coletados no worker, ou None)
+    """
+    start = time.perf_counter()
+    result = {
+        'arquivo': job['arquivo'], 'linha': None, 'amostras': None, 'tempos': None,
+        'quantis': None, 'cache': None, 'contadores_cache': None, 'erro': None, 'etapas': None
+    }
+
+    # Em outro processo os ouvintes do processo principal não existem (ou são
+    # cópias herdadas do fork): coletar os registros e devolvê-los no resultado
+    listeners_token = None
+    if job.get('registrar_etapas') and os.getpid() != job.get('pid_origem'):
+        result['etapas'] = []
+        listeners_token = _stage_listeners.set((result['etapas'].append,))
+    job_cache = cache
+    try:
+        store = new_raw_sample_store() if job['guardar_amostras'] else None
+        sketch_store = new_sketch_store() if job.get('guardar_quantis') else None
+        if job_cache is None and job['usar_cache']:
+            job_cache = new_ingest_cache(max_entries=1)
+
+        with _open_job_file(job) as file_obj:
+            new_row = process_uploaded_file(
+                file_obj, job['data'], job['local'], job['periodo'],
+                raw_store=store, sheet_name=job.get('planilha', 0), cache=job_cache,
+                sketch_store=sketch_store
+            )
+        result['linha'] = new_row
+        if sketch_store is not None:
+            result['quantis'] = sketch_store['sketches'].get(new_row['coleta_id'].iloc[0])
+        if store is not None:
+            result['amostras'] = store['blocos'][new_row['coleta_id'].iloc[0]]
+            result['tempos'] = store['tempos'].get(new_row['coleta_id'].iloc[0])
+    except Exception as e:
+        result['erro'] = str(e)
+    finally:
+        if cache is None and job_cache is not None:
+            result['cache'] = next(iter(job_cache['entradas'].items()), None)
+            result['contadores_cache'] = (job_cache['acertos'], job_cache['falhas'])
+        if listeners_token is not None:
+            _stage_listeners.reset(listeners_token)
+
+    result['tempo'] = time.perf_counter() - start
+    return result
+
+
+def process_uploaded_files(jobs, max_workers=None, raw_store=None, cache=None, sketch_store=None):
+    """
+    Processa vários arquivos em paralelo com um pool de processos
+
+    Os bytes de cada arquivo são enviados aos workers; erros são isolados por
+    arquivo e os resultados voltam na ordem de envio. Arquivos já presentes no
+    cache de ingestão são resolvidos no processo principal, sem novo parse.
+
+    Args:
+        jobs: Lista de tarefas criadas por make_ingest_job ou make_path_ingest_job
+        max_workers: Número de processos (None = número de CPUs; 1 = sequencial)
+        raw_store: Armazenamento de amostras brutas onde guardar as amostras de cada coleta
+        cache: Cache de ingestão (new_ingest_cache) consultado e atualizado
+        sketch_store: Armazenamento onde guardar os sketches de quantis de cada coleta
+
+    Returns:
+        list: Um dicionário por arquivo, na ordem de jobs, com 'arquivo', 'linha'
+        (DataFrame ou None), 'erro' (mensagem ou None) e 'tempo' (segundos)
+    """
+    payloads = [
+        dict(
+            job,
+            guardar_amostras=raw_store is not None,
+            guardar_quantis=sketch_store is not None,
+            usar_cache=cache is not None,
+            registrar_etapas=bool(_stage_listeners.get()),
+            pid_origem=os.getpid()
+        )
+        for job in jobs
+    ]
+    results = [None] * len(payloads)
+
+    # Acertos de cache custam apenas o hash: resolver aqui mesmo. Entradas sem as
+    # amostras pedidas precisam de novo parse e vão para o pool como as demais
+    pending = []
+    for position, payload in enumerate(payloads):
+        if cache is not None and ingest_cache_contains(
+            cache, _job_cache_key(payload), with_samples=raw_store is not None
+        ):
+            results[position] = _run_ingest_job(payload, cache)
+        else:
+            pending.append(position)
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = min(max_workers, len(pending))
+
+    parsed = None
+    if max_workers > 1:
+        try:
+            # Lotes grandes: enviar várias tarefas por vez a cada worker
+            batch = max(1, len(pending) // (max_workers * 4))
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                parsed = list(executor.map(
+                    _run_ingest_job, [payloads[i] for i in pending], chunksize=batch
+                ))
+        except (OSError, BrokenProcessPool):
+            # Ambiente sem suporte a múltiplos processos: processar sequencialmente
+            parsed = None
+    if parsed is None:
+        parsed = [_run_ingest_job(payloads[i]) for i in pending]
+    for position, result in zip(pending, parsed):
+        results[position] = result
+
+    for result in results:
+        samples = result.pop('amostras')
+        times = result.pop('tempos')
+        if raw_store is not None and samples is not None:
+            store_raw_samples(raw_store, result['linha']['coleta_id'].iloc[0], samples, times)
+        sketches = result.pop('quantis')
+        if sketch_store is not None and sketches is not None:
+            store_quantile_sketches(sketch_store, result['linha']['coleta_id'].iloc[0], sketches)
+        cache_entry = result.pop('cache')
+        if cache is not None and cache_entry is not None:
+            ingest_cache_put(cache, *cache_entry)
+        counters = result.pop('contadores_cache')
+        if cache is not None and counters is not None:
+            cache['acertos'] += counters[0]
+            cache['falhas'] += counters[1]
+        for record in result.pop('etapas') or []:
+            _emit_stage(record)
+
+    return results
+
+
+def split_duplicate_collections(master_df, rows):
+    """
+    Separa as linhas resumo cujo arquivo de origem já está no DataFrame mestre
+
+    Duas coletas são consideradas a mesma quando o conteúdo do arquivo
+    (hash_arquivo) é idêntico, inclusive dentro do próprio lote. Linhas sem
+    hash (legadas ou importadas) nunca são tratadas como duplicadas.
+
+    Args:
+        master_df: DataFrame mestre atual
+        rows: Lista de DataFrames de uma linha de process_uploaded_file
+
+    Returns:
+        tuple: (linhas novas, linhas duplicadas)
+    """
+    seen = set(master_df['hash_arquivo'].dropna()) if 'hash_arquivo' in master_df.columns else set()
+    new_rows = []
+    duplicates = []
+    for row in rows:
+        content_hash = row['hash_arquivo'].iloc[0] if 'hash_arquivo' in row.columns else None
+        if pd.isna(content_hash):
+            new_rows.append(row)
+        elif content_hash in seen:
+            duplicates.append(row)
+        else:
+            seen.add(content_hash)
+            new_rows.append(row)
+    return new_rows, duplicates
+
+
+def format_dataframe_for_display(df):
+    """
+    Formata o DataFrame para exibição na UI
+    
+    Args:
+        df: DataFrame a ser formatado
+        
+    Returns:
+        pd.DataFrame: DataFrame formatado
+    """
+    display_df = df.copy()
+    
+    # Formatar data
+    if 'data' in display_df.columns:
+        display_df['data'] = pd.to_datetime(display_df['data']).dt.strftime('%d/%m/%Y')
+    
+    # Arredondar valores numéricos
+    numeric_cols = ['temperatura', 'umidade', 'co2']
+    for col in numeric_cols:
+        if col in display_df.columns:
+            display_df[col] = display_df[col].round(2)
+    
+    return display_df
+
+
+def create_master_df(measure_dtype=None):
+    """
+    Cria o DataFrame mestre vazio já com o esquema tipado
+
+    Args:
+        measure_dtype: Tipo das medições ('float64' ou 'float32'); None usa MEASURE_DTYPE
+
+    Returns:
+        pd.DataFrame: DataFrame vazio com as colunas de MASTER_COLUMNS
+    """
+    return enforce_master_schema(pd.DataFrame(columns=MASTER_COLUMNS), measure_dtype)
+
+
+def _resolve_measure_dtype(measure_dtype):
+    measure_dtype = measure_dtype or MEASURE_DTYPE
+    if measure_dtype not in MEASURE_DTYPES:
+        raise ValueError(
+            f"Tipo de medição inválido: {measure_dtype}. Use um de: {', '.join(MEASURE_DTYPES)}"
+        )
+    return measure_dtype
+
+
+def enforce_master_schema(df, measure_dtype=None):
+    """
+    Aplica o esquema tipado do DataFrame mestre
+
+    Medições em float64 (ou float32), 'data' em datetime64[ns] e
+    'local'/'periodo' como categorias (sem categorias sem uso), de modo que
+    agrupamentos usem os códigos inteiros. As colunas de estatísticas robustas
+    (ROBUST_STAT_COLUMNS) seguem o tipo das medições e as contagens
+    (COUNT_COLUMNS) são inteiras com valor ausente para coletas sem elas; os
+    momentos (MOMENT_COLUMNS) ficam sempre em float64, pois são somas.
+    Colunas extras são preservadas.
+
+    Args:
+        df: DataFrame com (ao menos parte das) colunas de MASTER_COLUMNS
+        measure_dtype: Tipo das medições ('float64' ou 'float32'); None usa MEASURE_DTYPE
+
+    Returns:
+        pd.DataFrame: DataFrame com os tipos ajustados
+    """
+    measure_dtype = _resolve_measure_dtype(measure_dtype)
+    df = df.copy()
+    for col in MASTER_COLUMNS:
+        if col not in df.columns:
+            df[col] = pd.Series(index=df.index, dtype='object')
+
+    for col in SUMMARY_STAT_COLUMNS:
+        if col not in df.columns:
+            df[col] = np.nan
+
+    for var in EXPECTED_COLUMNS:
+        df[var] = pd.to_numeric(df[var], errors='coerce').astype(measure_dtype)
+    for col in SUMMARY_STAT_COLUMNS:
+        if col in COUNT_COLUMNS:
+            dtype = 'Int64'
+        elif col in MOMENT_COLUMNS:
+            dtype = 'float64'
+        else:
+            dtype = measure_dtype
+        df[col] = pd.to_numeric(df[col], errors='coerce').astype(dtype)
+    df['data'] = pd.to_datetime(df['data']).astype('datetime64[ns]')
+    for col in ['local', 'periodo']:
+        df[col] = df[col].astype('category').cat.remove_unused_categories()
+    for col in ['coleta_id', 'hash_arquivo']:
+        df[col] = df[col].where(df[col].notna(), None).astype('object')
+
+    return df
+
+
+def append_collections(master_df, rows, measure_dtype=None):
+    """
+    Anexa várias linhas resumo ao DataFrame mestre em uma única concatenação
+
+    Args:
+        master_df: DataFrame mestre atual
+        rows: Lista (ou gerador) de DataFrames de uma linha de process_uploaded_file
+        measure_dtype: Tipo das medições; None mantém o tipo atual do DataFrame mestre
+
+    Returns:
+        pd.DataFrame: Novo DataFrame mestre com o esquema tipado
+    """
+    if measure_dtype is None and str(master_df['temperatura'].dtype) in MEASURE_DTYPES:
+        measure_dtype = str(master_df['temperatura'].dtype)
+    frames = [row for row in rows if row is not None and not row.empty]
+    if not frames:
+        return master_df
+    if not master_df.empty:
+        frames.insert(0, master_df)
+    return enforce_master_schema(pd.concat(frames, ignore_index=True), measure_dtype)
+
+
+def memory_usage_report(df):
+    """
+    Relatório de memória do DataFrame mestre por coluna
+
+    Compara o uso atual com o mesmo DataFrame guardado só em colunas
+    'object' (como era antes do esquema tipado).
+
+    Args:
+        df: DataFrame mestre
+
+    Returns:
+        dict: 'colunas' (coluna -> {'tipo', 'bytes'}), 'total_bytes',
+              'bytes_objeto' e 'fracao' (total_bytes / bytes_objeto)
+    """
+    usage = df.memory_usage(deep=True, index=False)
+    object_usage = df.astype('object').memory_usage(deep=True, index=False)
+    total = int(usage.sum())
+    object_total = int(object_usage.sum())
+    return {
+        'colunas': {
+            col: {'tipo': str(df[col].dtype), 'bytes': int(usage[col])}
+            for col in df.columns
+        },
+        'total_bytes': total,
+        'bytes_objeto': object_total,
+        'fracao': total / object_total if object_total else 1.0
+    }
+
+
+def rename_location(df, old_name, new_name):
+    """
+    Renomeia um local no DataFrame mestre
+
+    Args:
+        df: DataFrame mestre (coluna 'local' categórica)
+        old_name: Nome atual do local
+        new_name: Novo nome do local
+
+    Returns:
+        pd.DataFrame: Cópia do DataFrame com o local renomeado
+    """
+    return rename_locations(df, {old_name: new_name})
+
+
+def rename_locations(df, mapping):
+    """
+    Renomeia vários locais de uma vez, operando só sobre as categorias
+
+    Nomes de destino que já existem (ou que se repetem no mapeamento) fundem
+    os locais; nesse caso os códigos são remapeados em uma única operação
+    vetorizada, sem máscara por linha.
+
+    Args:
+        df: DataFrame mestre (coluna 'local' categórica)
+        mapping: Dicionário {nome atual: novo nome}
+
+    Returns:
+        pd.DataFrame: Cópia do DataFrame com os locais renomeados
+    """
+    df = df.copy()
+    local = df['local'].astype('category')
+    categories = list(local.cat.categories)
+    renamed = [mapping.get(name, name) for name in categories]
+
+    if len(set(renamed)) == len(renamed):
+        local = local.cat.rename_categories(renamed)
+    else:
+        # Fundir locais: remapear os códigos para as novas categorias
+        new_categories = list(dict.fromkeys(renamed))
+        position = {name: i for i, name in enumerate(new_categories)}
+        lookup = np.array([position[name] for name in renamed] + [-1], dtype=np.int64)
+        codes = lookup[local.cat.codes.to_numpy()]
+        local = pd.Series(
+            pd.Categorical.from_codes(codes, categories=new_categories),
+            index=df.index
+        ).cat.remove_unused_categories()
+    df['local'] = local
+    return df
+
+
+def selection_mask(df, positions=None, locations=None, periods=None,
+                   date_start=None, date_end=None):
+    """
+    Máscara booleana das linhas que atendem a todos os critérios informados
+
+    Cada critério é combinado com E; dentro de uma lista (locais, períodos,
+    posições) vale qualquer um dos valores. As datas são comparadas direto na
+    coluna datetime64, sem conversão para texto. Sem nenhum critério, nenhuma
+    linha é selecionada.
+
+    Args:
+        df: DataFrame mestre
+        positions: Posições (0..n-1) das linhas
+        locations: Lista de locais
+        periods: Lista de períodos
+        date_start: Primeira data do intervalo (inclusiva)
+        date_end: Última data do intervalo (inclusiva, o dia inteiro)
+
+    Returns:
+        np.ndarray: Máscara booleana com uma posição por linha
+    """
+    n = len(df)
+    criteria = [positions, locations, periods, date_start, date_end]
+    if all(criterion is None for criterion in criteria):
+        return np.zeros(n, dtype=bool)
+
+    mask = np.ones(n, dtype=bool)
+    if positions is not None:
+        selected = np.zeros(n, dtype=bool)
+        positions = np.asarray(list(positions), dtype=np.int64)
+        selected[positions[(positions >= 0) & (positions < n)]] = True
+        mask &= selected
+    if locations is not None:
+        mask &= df['local'].isin(list(locations)).to_numpy()
+    if periods is not None:
+        mask &= df['periodo'].isin(list(periods)).to_numpy()
+    if date_start is not None or date_end is not None:
+        dates = pd.to_datetime(df['data']).to_numpy()
+        if date_start is not None:
+            mask &= dates >= np.datetime64(pd.Timestamp(date_start).normalize())
+        if date_end is not None:
+            end = pd.Timestamp(date_end).normalize() + pd.Timedelta(days=1)
+            mask &= dates < np.datetime64(end)
+    return mask
+
+
+def delete_collections(df, mask=None, **criteria):
+    """
+    Exclui do DataFrame mestre as linhas selecionadas
+
+    Args:
+        df: DataFrame mestre
+        mask: Máscara booleana pronta (por exemplo, de selection_mask)
+        **criteria: Critérios de selection_mask, usados quando mask não é informada
+
+    Returns:
+        tuple: (DataFrame restante com índice refeito e esquema aplicado,
+                DataFrame com as linhas excluídas)
+    """
+    if mask is None:
+        mask = selection_mask(df, **criteria)
+    removed = df[mask]
+    if removed.empty:
+        return df, removed
+    remaining = enforce_master_schema(
+        df[~mask].reset_index(drop=True),
+        str(df['temperatura'].dtype) if str(df['temperatura'].dtype) in MEASURE_DTYPES else None
+    )
+    return remaining, removed
+
+
+def compute_location_stats(df):
+    """
+    Calcula mínimo e máximo de cada variável por local em uma única passada agrupada
+
+    Args:
+        df: DataFrame mestre
+
+    Returns:
+        pd.DataFrame: Uma linha por local (índice 'local') com as colunas de
+        LOCATION_RANGE_COLUMNS
+    """
+    grouped = df[EXPECTED_COLUMNS].astype('float64').groupby(df['local'], observed=True)
+    mins = grouped.min()
+    maxs = grouped.max()
+
+    location_stats = pd.DataFrame(index=mins.index)
+    for var, (col_min, col_max) in LOCATION_RANGE_COLUMNS.items():
+        location_stats[col_min] = mins[var]
+        location_stats[col_max] = maxs[var]
+    return location_stats
+
+
+def add_location_ranges(df, location_stats=None):
+    """
+    Adiciona a cada linha o mínimo e o máximo do seu local
+
+    Args:
+        df: DataFrame com a coluna 'local'
+        location_stats: Tabela de compute_location_stats já calculada; se None,
+            é calculada a partir de df
+
+    Returns:
+        pd.DataFrame: Cópia de df com as colunas de LOCATION_RANGE_COLUMNS
+    """
+    if location_stats is None:
+        location_stats = compute_location_stats(df)
+    return df.join(location_stats, on='local')
+
+
+def _new_location_entry():
+    """
+    Entrada vazia do índice de locais
+    """
+    return {
+        'posicoes': np.empty(0, dtype=np.int64),
+        'n': 0,
+        'periodos': Counter(),
+        'estatisticas': new_running_stats()
+    }
+
+
+def _index_rows(index, df, offset):
+    """
+    Incorpora ao índice as linhas de df, que ocupam as posições offset.. do DataFrame mestre
+
+    As linhas são agrupadas por local uma única vez (argsort estável dos códigos),
+    e as contagens por local e período saem de um único bincount, então o custo
+    não depende do número de locais.
+    """
+    if len(df) == 0:
+        return
+    index['n'] += len(df)
+    index['datas'].update(pd.to_datetime(df['data']).value_counts(dropna=False).to_dict())
+
+    # Fatorar a coluna categórica direto (sem converter cada linha em texto)
+    codes, locations = pd.factorize(df['local'], sort=False, use_na_sentinel=False)
+    period_codes, periods = pd.factorize(df['periodo'], sort=False, use_na_sentinel=False)
+    locations = list(locations)
+    periods = list(periods)
+    period_counts = np.bincount(
+        codes * len(periods) + period_codes, minlength=len(locations) * len(periods)
+    ).reshape(len(locations), len(periods))
+    index['periodos'].update(dict(zip(periods, period_counts.sum(axis=0).tolist())))
+
+    # Posições de cada local: fatias contíguas da ordenação estável dos códigos
+    order = np.argsort(codes, kind='stable')
+    bounds = np.flatnonzero(np.diff(codes[order])) + 1
+    location_positions = np.split(order.astype(np.int64) + offset, bounds)
+
+    # Momentos das leituras combinados por local em uma única agregação
+    groups, moments = _group_moments(df, codes)
+    group_positions = {code: position for position, code in enumerate(groups)}
+    for code, local in enumerate(locations):
+        entry = index['locais'].setdefault(local, _new_location_entry())
+        entry['posicoes'] = np.concatenate([entry['posicoes'], location_positions[code]])
+        entry['n'] += len(location_positions[code])
+        entry['periodos'].update({
+            period: count for period, count in zip(periods, period_counts[code].tolist()) if count
+        })
+        for var in EXPECTED_COLUMNS:
+            state = _moment_state(moments[var], group_positions[code], new_running_stats()[var])
+            entry['estatisticas'][var] = _merge_moments(entry['estatisticas'][var], state)
+
+
+def build_location_index(master_df):
+    """
+    Constrói o índice de locais do DataFrame mestre
+
+    O índice guarda, por local, as posições das linhas, a contagem de coletas,
+    a contagem por período e os momentos combinados de todas as leituras do
+    local (n, média, desvio padrão, mínimo e máximo de cada variável, a partir
+    das colunas de MOMENT_COLUMNS), além de contagens globais por período e
+    por data. Seletores, filtros e o painel de estatísticas passam a consultar o
+    índice em vez de varrer o DataFrame a cada execução.
+
+    Args:
+        master_df: DataFrame mestre
+
+    Returns:
+        dict: Índice com as chaves 'n', 'locais', 'periodos' e 'datas'
+    """
+    index = {'n': 0, 'locais': {}, 'periodos': Counter(), 'datas': Counter()}
+    _index_rows(index, master_df, 0)
+    return index
+
+
+def index_append(index, master_df, n_new):
+    """
+    Atualiza o índice após anexar linhas ao fim do DataFrame mestre
+
+    Apenas as n_new últimas linhas são processadas.
+
+    Args:
+        index: Índice de build_location_index (atualizado no lugar)
+        master_df: DataFrame mestre já com as novas linhas
+        n_new: Número de linhas anexadas
+
+    Returns:
+        dict: O próprio índice
+    """
+    if n_new > 0:
+        _index_rows(index, master_df.iloc[len(master_df) - n_new:], len(master_df) - n_new)
+    return index
+
+
+def index_rename(index, old_name, new_name):
+    """
+    Atualiza o índice após renomear um local, sem varrer o DataFrame
+
+    Args:
+        index: Índice de build_location_index (atualizado no lugar)
+        old_name: Nome atual do local
+        new_name: Novo nome do local
+
+    Returns:
+        dict: O próprio índice
+    """
+    entry = index['locais'].pop(old_name, None)
+    if entry is None:
+        return index
+
+    target = index['locais'].get(new_name)
+    if target is None:
+        index['locais'][new_name] = entry
+    else:
+        # Fundir com um local já existente
+        target['posicoes'] = np.union1d(target['posicoes'], entry['posicoes'])
+        target['n'] += entry['n']
+        target['periodos'].update(entry['periodos'])
+        target['estatisticas'] = merge_running_stats(target['estatisticas'], entry['estatisticas'])
+    return index
+
+
+def index_locations(index):
+    """
+    Locais presentes no índice, em ordem alfabética
+
+    Args:
+        index: Índice de build_location_index
+
+    Returns:
+        list: Nomes dos locais
+    """
+    return sorted(index['locais'])
+
+
+def index_location_counts(index):
+    """
+    Número de coletas por local, do maior para o menor
+
+    Args:
+        index: Índice de build_location_index
+
+    Returns:
+        dict: {local: número de coletas}
+    """
+    counts = {local: entry['n'] for local, entry in index['locais'].items()}
+    return dict(sorted(counts.items(), key=lambda item: item[1], reverse=True))
+
+
+def index_location_rows(index, master_df, local):
+    """
+    Linhas de um local obtidas pelas posições do índice (sem varrer o DataFrame)
+
+    Args:
+        index: Índice de build_location_index
+        master_df: DataFrame mestre indexado
+        local: Nome do local
+
+    Returns:
+        pd.DataFrame: Linhas do local
+    """
+    entry = index['locais'].get(local)
+    if entry is None:
+        return master_df.iloc[0:0]
+    return master_df.iloc[entry['posicoes']]
+
+
+def index_location_stats(index, local):
+    """
+    Estatísticas de um local mantidas pelo índice
+
+    Args:
+        index: Índice de build_location_index
+        local: Nome do local
+
+    Returns:
+        dict: Por variável, 'media', 'minimo', 'maximo', 'desvio_padrao' e 'n'
+        das leituras de todas as coletas do local
+    """
+    return finalize_running_stats(index['locais'][local]['estatisticas'])
+
+
+def get_statistics_summary(df):
+    """
+    Calcula estatísticas resumidas para um DataFrame
+    
+    As estatísticas são das leituras de todas as coletas, combinando os
+    momentos de cada linha (moment_summary): o desvio padrão é o combinado
+    das leituras, não o desvio padrão das médias.
+    
+    Args:
+        df: DataFrame com dados ambientais
+        
+    Returns:
+        dict: Dicionário com estatísticas por variável
+    """
+    summary = moment_summary(df).set_index('variavel')
+    stats = {}
+    
+    for var in ['temperatura', 'umidade', 'co2']:
+        if var in df.columns:
+            stats[var] = {
+                key: summary.at[var, key] if var in summary.index else np.nan
+                for key in ['media', 'minimo', 'maximo', 'desvio_padrao']
+            }
+    
+    return stats
+
+
+def open_dataset(path=None):
+    """
+    Abre (ou cria) o banco SQLite que persiste as coletas entre sessões
+
+    Args:
+        path: Caminho do arquivo .sqlite (None = DATASET_PATH)
+
+    Returns:
+        sqlite3.Connection: Conexão com as tabelas de coletas e de sketches criadas
+    """
+    path = path or DATASET_PATH
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {DATASET_TABLE} (
+            temperatura REAL,
+            umidade REAL,
+            co2 REAL,
+            data TEXT,
+            local TEXT,
+            periodo TEXT,
+            coleta_id TEXT PRIMARY KEY,
+            hash_arquivo TEXT
+        )
+    """)
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{DATASET_TABLE}_local ON {DATASET_TABLE} (local)")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{DATASET_TABLE}_data ON {DATASET_TABLE} (data)")
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {SKETCH_TABLE} (
+            coleta_id TEXT PRIMARY KEY,
+            sketch BLOB
+        )
+    """)
+    conn.commit()
+    return conn
+
+
+def _dataset_columns(conn):
+    """
+    Colunas existentes na tabela de coletas
+    """
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({DATASET_TABLE})")]
+
+
+def dataset_append(conn, rows, sketch_store=None):
+    """
+    Grava novas coletas no banco (apenas as linhas informadas)
+
+    Colunas ainda inexistentes na tabela são criadas automaticamente. Os
+    sketches de quantis vão em binário para a tabela SKETCH_TABLE.
+
+    Args:
+        conn: Conexão de open_dataset
+        rows: DataFrame com as linhas a gravar (esquema do DataFrame mestre)
+        sketch_store: Armazenamento de sketches das coletas (opcional)
+
+    Returns:
+        int: Número de linhas gravadas
+    """
+    if rows.empty:
+        return 0
+
+    existing = _dataset_columns(conn)
+    for col in rows.columns:
+        if col not in existing:
+            if pd.api.types.is_float_dtype(rows[col]):
+                sql_type = 'REAL'
+            elif pd.api.types.is_integer_dtype(rows[col]):
+                sql_type = 'INTEGER'
+            else:
+                sql_type = 'TEXT'
+            conn.execute(f'ALTER TABLE {DATASET_TABLE} ADD COLUMN "{col}" {sql_type}')
+
+    records = rows.copy()
+    records['data'] = pd.to_datetime(records['data']).dt.strftime('%Y-%m-%d %H:%M:%S')
+    records = records.astype(object).where(records.notna(), None)
+
+    columns = ', '.join(f'"{col}"' for col in records.columns)
+    placeholders = ', '.join('?' for _ in records.columns)
+    conn.executemany(
+        f'INSERT OR REPLACE INTO {DATASET_TABLE} ({columns}) VALUES ({placeholders})',
+        records.itertuples(index=False, name=None)
+    )
+    if sketch_store is not None:
+        sketches = sketch_store['sketches']
+        conn.executemany(
+            f'INSERT OR REPLACE INTO {SKETCH_TABLE} (coleta_id, sketch) VALUES (?, ?)',
+            [(coleta_id, sketches[coleta_id]) for coleta_id in rows['coleta_id'] if coleta_id in sketches]
+        )
+    conn.commit()
+    return len(records)
+
+
+def dataset_load(conn, locations=None, sketch_store=None):
+    """
+    Carrega coletas do banco, opcionalmente apenas de alguns locais
+
+    Args:
+        conn: Conexão de open_dataset
+        locations: Lista de locais a carregar (None = todos)
+        sketch_store: Armazenamento onde carregar os sketches das coletas (opcional);
+            bancos antigos, com os sketches em texto na tabela de coletas, também são lidos
+
+    Returns:
+        pd.DataFrame: Coletas com o esquema do DataFrame mestre
+    """
+    query = f'SELECT * FROM {DATASET_TABLE}'
+    params = []
+    if locations is not None:
+        locations = list(locations)
+        query += f" WHERE local IN ({', '.join('?' for _ in locations)})"
+        params = locations
+    query += ' ORDER BY rowid'
+
+    df = pd.read_sql_query(query, conn, params=params)
+    df = _take_sketch_column(df, sketch_store)
+    if sketch_store is not None:
+        sketch_query = f'SELECT coleta_id, sketch FROM {SKETCH_TABLE}'
+        if locations is not None:
+            sketch_query += (
+                f" WHERE coleta_id IN (SELECT coleta_id FROM {DATASET_TABLE}"
+                f" WHERE local IN ({', '.join('?' for _ in locations)}))"
+            )
+        for coleta_id, data in conn.execute(sketch_query, params):
+            store_quantile_sketches(sketch_store, coleta_id, data)
+    return enforce_master_schema(df)
+
+
+def dataset_locations(conn):
+    """
+    Lista os locais gravados e a quantidade de coletas de cada um (via índice)
+
+    Args:
+        conn: Conexão de open_dataset
+
+    Returns:
+        dict: {local: número de coletas}
+    """
+    rows = conn.execute(
+        f'SELECT local, COUNT(*) FROM {DATASET_TABLE} GROUP BY local ORDER BY local'
+    )
+    return dict(rows.fetchall())
+
+
+def dataset_delete(conn, coleta_ids):
+    """
+    Remove coletas do banco
+
+    Args:
+        conn: Conexão de open_dataset
+        coleta_ids: Identificadores das coletas a remover
+
+    Returns:
+        int: Número de linhas removidas
+    """
+    coleta_ids = [(coleta_id,) for coleta_id in coleta_ids]
+    cursor = conn.executemany(f'DELETE FROM {DATASET_TABLE} WHERE coleta_id = ?', coleta_ids)
+    removed = cursor.rowcount
+    conn.executemany(f'DELETE FROM {SKETCH_TABLE} WHERE coleta_id = ?', coleta_ids)
+    conn.commit()
+    return removed
+
+
+def dataset_rename_location(conn, old_name, new_name):
+    """
+    Renomeia um local no banco
+
+    Args:
+        conn: Conexão de open_dataset
+        old_name: Nome atual do local
+        new_name: Novo nome do local
+
+    Returns:
+        int: Número de linhas alteradas
+    """
+    cursor = conn.execute(
+        f'UPDATE {DATASET_TABLE} SET local = ? WHERE local = ?', (new_name, old_name)
+    )
+    conn.commit()
+    return cursor.rowcount
+
+
+def dataset_clear(conn):
+    """
+    Remove todas as coletas do banco
+
+    Args:
+        conn: Conexão de open_dataset
+    """
+    conn.execute(f'DELETE FROM {DATASET_TABLE}')
+    conn.execute(f'DELETE FROM {SKETCH_TABLE}')
+    conn.commit()
+
+
+def available_export_formats():
+    """
+    Lista os formatos de exportação cujas dependências estão instaladas
+
+    Returns:
+        list: Chaves de EXPORT_FORMATS, em ordem de preferência
+    """
+    return [
+        fmt for fmt, info in EXPORT_FORMATS.items()
+        if info['modulo'] is None or importlib.util.find_spec(info['modulo']) is not None
+    ]
+
+
+def export_format_for(filename):
+    """
+    Identifica o formato de exportação pelo nome do arquivo
+
+    Args:
+        filename: Nome ou caminho do arquivo
+
+    Returns:
+        str: Chave de EXPORT_FORMATS, ou None se a extensão não for reconhecida
+    """
+    name = str(filename).lower()
+    for fmt, info in sorted(EXPORT_FORMATS.items(), key=lambda item: -len(item[1]['extensao'])):
+        if name.endswith(info['extensao']):
+            return fmt
+    return None
+
+
+def _export_master_chunks(master_df, chunk_rows, sketch_store=None):
+    """
+    Gera o DataFrame mestre em blocos prontos para gravação
+
+    Com sketch_store, cada bloco ganha a coluna SKETCH_COLUMN com os sketches
+    em texto base64, montada apenas para as linhas do bloco.
+    """
+    columns = MASTER_COLUMNS + [col for col in master_df.columns if col not in MASTER_COLUMNS]
+    for start in range(0, max(len(master_df), 1), chunk_rows):
+        chunk = master_df.iloc[start:start + chunk_rows].reindex(columns=columns)
+        for col in ['local', 'periodo']:
+            chunk[col] = chunk[col].astype('object')
+        if sketch_store is not None:
+            sketches = sketch_store['sketches']
+            chunk[SKETCH_COLUMN] = [
+                base64.b64encode(sketches[coleta_id]).decode('ascii') if coleta_id in sketches else None
+                for coleta_id in chunk['coleta_id']
+            ]
+        yield chunk
+
+
+def _empty_sample_frame(freq=None):
+    """
+    Bloco vazio com as colunas da exportação de amostras (brutas ou reamostradas)
+    """
+    columns = {'coleta_id': pd.Series(dtype='object')}
+    if freq is None:
+        columns['amostra'] = pd.Series(dtype='int64')
+        columns['tempo'] = pd.Series(dtype='datetime64[ns]')
+        columns.update({var: pd.Series(dtype='float32') for var in EXPECTED_COLUMNS})
+    else:
+        columns['tempo'] = pd.Series(dtype='datetime64[ns]')
+        columns['n'] = pd.Series(dtype='int64')
+        columns.update({
+            f'{var}_{stat}': pd.Series(dtype='float64')
+            for var in EXPECTED_COLUMNS for stat in ['media', 'min', 'max']
+        })
+    return pd.DataFrame(columns)
+
+
+def _export_sample_chunks(raw_store, coleta_ids, chunk_rows, freq=None):
+    """
+    Gera as amostras das coletas em blocos (coleta_id, amostra, tempo, medições)
+
+    As coletas são lidas uma a uma do armazenamento e acumuladas até
+    chunk_rows linhas, de modo que a memória fica limitada a um bloco. Com
+    freq, cada coleta com data/hora é reamostrada (resample_samples) e as
+    coletas sem data/hora são omitidas.
+    """
+    pending = []
+    pending_rows = 0
+    for coleta_id in coleta_ids:
+        samples = load_raw_samples(raw_store, coleta_id)
+        if samples is None or samples.empty:
+            continue
+        if freq is not None:
+            if 'tempo' not in samples.columns:
+                continue
+            samples = resample_samples(samples, freq)
+        elif 'tempo' not in samples.columns:
+            # Coluna sempre presente para manter o mesmo esquema em todos os blocos
+            samples.insert(0, 'tempo', pd.Series(pd.NaT, index=samples.index, dtype='datetime64[ns]'))
+        if freq is None:
+            samples.insert(0, 'amostra', np.arange(len(samples), dtype=np.int64))
+        samples.insert(0, 'coleta_id', coleta_id)
+        pending.append(samples)
+        pending_rows += len(samples)
+        if pending_rows >= chunk_rows:
+            yield pd.concat(pending, ignore_index=True)
+            pending, pending_rows = [], 0
+    if pending:
+        yield pd.concat(pending, ignore_index=True)
+
+
+@contextlib.contextmanager
+def _open_export_target(target):
+    """
+    Abre o destino da exportação em modo binário (caminho ou objeto de arquivo)
+    """
+    if hasattr(target, 'write'):
+        yield target
+    else:
+        with open(target, 'wb') as handle:
+            yield handle
+
+
+@contextlib.contextmanager
+def _open_csv_writer(handle, fmt):
+    """
+    Envolve o destino binário em um fluxo de texto, comprimido conforme o formato
+    """
+    if fmt == 'csv.gz':
+        compressed = gzip.GzipFile(fileobj=handle, mode='wb')
+    elif fmt == 'csv.zst':
+        import zstandard
+        compressed = zstandard.ZstdCompressor().stream_writer(handle, closefd=False)
+    else:
+        compressed = None
+
+    text = io.TextIOWrapper(compressed if compressed is not None else handle,
+                            encoding='utf-8', newline='')
+    try:
+        yield text
+    finally:
+        text.flush()
+        text.detach()
+        if compressed is not None:
+            compressed.close()
+
+
+def _write_csv_chunks(chunks, handle, fmt):
+    with _open_csv_writer(handle, fmt) as text:
+        for i, chunk in enumerate(chunks):
+            chunk.to_csv(text, index=False, header=(i == 0))
+
+
+def _write_parquet_chunks(chunks, handle):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    schema = None
+    try:
+        for chunk in chunks:
+            if schema is None:
+                schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+                for col in PARQUET_TEXT_COLUMNS:
+                    if col in schema.names:
+                        position = schema.get_field_index(col)
+                        schema = schema.set(position, pa.field(col, pa.string()))
+                writer = pq.ParquetWriter(handle, schema, compression='zstd')
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def _append_excel_chunks(workbook, title, chunks):
+    """
+    Grava os blocos em planilhas no modo write_only, abrindo uma nova
+    planilha (título_2, título_3, ...) ao atingir o limite de linhas do Excel
+    """
+    sheet, sheet_rows, sheet_number, header = None, 0, 0, None
+    for chunk in chunks:
+        if header is None:
+            header = list(chunk.columns)
+        for row in chunk.astype(object).where(chunk.notna(), None).itertuples(index=False, name=None):
+            if sheet is None or sheet_rows >= EXCEL_MAX_ROWS:
+                sheet_number += 1
+                sheet = workbook.create_sheet(title if sheet_number == 1 else f'{title}_{sheet_number}')
+                sheet.append(header)
+                sheet_rows = 0
+            sheet.append(row)
+            sheet_rows += 1
+
+
+def export_dataset(master_df, target, fmt='parquet', raw_store=None, chunk_rows=EXPORT_CHUNK_ROWS,
+                   sketch_store=None):
+    """
+    Exporta o DataFrame mestre em blocos, sem montar o arquivo inteiro em memória
+
+    Em Parquet e CSV as amostras brutas ficam em um arquivo separado
+    (export_raw_samples); em Excel, se raw_store for informado, elas são
+    gravadas na planilha 'amostras' do mesmo arquivo.
+
+    Args:
+        master_df: DataFrame mestre
+        target: Caminho ou objeto de arquivo binário de destino
+        fmt: Chave de EXPORT_FORMATS ('parquet', 'csv.gz', 'csv.zst', 'csv' ou 'xlsx')
+        raw_store: Armazenamento de amostras brutas (apenas para 'xlsx')
+        chunk_rows: Linhas gravadas por bloco
+        sketch_store: Armazenamento de sketches; se informado, os sketches vão
+            na coluna SKETCH_COLUMN (texto base64)
+
+    Returns:
+        int: Número de coletas exportadas
+
+    Raises:
+        ValueError: Se o formato for desconhecido ou sua dependência não estiver instalada
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Formato de exportação desconhecido: {fmt}")
+    if fmt not in available_export_formats():
+        raise ValueError(
+            f"Formato {fmt} indisponível: instale o pacote '{EXPORT_FORMATS[fmt]['modulo']}'"
+        )
+
+    chunks = _export_master_chunks(master_df, chunk_rows, sketch_store)
+    with _open_export_target(target) as handle:
+        if fmt == 'parquet':
+            _write_parquet_chunks(chunks, handle)
+        elif fmt == 'xlsx':
+            from openpyxl import Workbook
+            workbook = Workbook(write_only=True)
+            _append_excel_chunks(workbook, 'coletas', chunks)
+            if raw_store is not None:
+                _append_excel_chunks(
+                    workbook, 'amostras',
+                    _export_sample_chunks(raw_store, master_df['coleta_id'], chunk_rows)
+                )
+            workbook.save(handle)
+        else:
+            _write_csv_chunks(chunks, handle, fmt)
+    return len(master_df)
+
+
+def export_raw_samples(raw_store, coleta_ids, target, fmt='parquet', chunk_rows=EXPORT_CHUNK_ROWS,
+                       freq=None):
+    """
+    Exporta as amostras brutas das coletas em formato longo
+    (coleta_id, amostra, tempo, temperatura, umidade, co2), uma coleta por vez
+
+    Args:
+        raw_store: Armazenamento de new_raw_sample_store
+        coleta_ids: Coletas a exportar (por exemplo, master_df['coleta_id'])
+        target: Caminho ou objeto de arquivo binário de destino
+        fmt: Chave de EXPORT_FORMATS
+        chunk_rows: Linhas gravadas por bloco
+        freq: Resolução (chave de RESAMPLE_FREQUENCIES) para exportar médias,
+            mínimos e máximos por intervalo em vez das leituras; apenas coletas
+            com data/hora são incluídas
+
+    Returns:
+        int: Número de linhas exportadas
+    """
+    if fmt not in available_export_formats():
+        raise ValueError(f"Formato de exportação indisponível: {fmt}")
+
+    total = 0
+
+    def counted(chunks):
+        nonlocal total
+        for chunk in chunks:
+            total += len(chunk)
+            yield chunk
+
+    empty = _empty_sample_frame(freq)
+    chunks = counted(_export_sample_chunks(raw_store, list(coleta_ids), chunk_rows, freq))
+
+    def with_header(chunks):
+        # Garante o cabeçalho/esquema mesmo sem nenhuma amostra
+        first = next(chunks, None)
+        yield empty if first is None else first
+        yield from chunks
+
+    with _open_export_target(target) as handle:
+        if fmt == 'parquet':
+            _write_parquet_chunks(with_header(chunks), handle)
+        elif fmt == 'xlsx':
+            from openpyxl import Workbook
+            workbook = Workbook(write_only=True)
+            _append_excel_chunks(workbook, 'amostras', with_header(chunks))
+            workbook.save(handle)
+        else:
+            _write_csv_chunks(with_header(chunks), handle, fmt)
+    return total
+
+
+def _read_export_frame(source, fmt, sheet_name):
+    """
+    Lê um arquivo exportado (caminho ou arquivo enviado) como DataFrame
+    """
+    if not isinstance(source, (str, os.PathLike)):
+        source = BytesIO(_read_upload_bytes(source))
+    if fmt == 'parquet':
+        return pd.read_parquet(source)
+    if fmt == 'xlsx':
+        # Planilhas longas são divididas em 'nome', 'nome_2', 'nome_3', ...
+        sheets = pd.read_excel(source, sheet_name=None, engine='openpyxl')
+        parts = [
+            frame for title, frame in sheets.items()
+            if title == sheet_name or title.startswith(f'{sheet_name}_')
+        ]
+        if not parts:
+            raise ValueError(f"Planilha '{sheet_name}' não encontrada no arquivo")
+        return pd.concat(parts, ignore_index=True)
+    compression = {'csv.gz': 'gzip', 'csv.zst': 'zstd', 'csv': None}[fmt]
+    return pd.read_csv(source, compression=compression)
+
+
+def import_dataset(source, name=None, sketch_store=None):
+    """
+    Lê de volta um arquivo gerado por export_dataset
+
+    Args:
+        source: Caminho ou arquivo enviado (UploadedFile do Streamlit)
+        name: Nome do arquivo, usado para identificar o formato (padrão: source.name)
+        sketch_store: Armazenamento onde guardar os sketches da coluna SKETCH_COLUMN
+            (opcional; a coluna nunca fica no DataFrame)
+
+    Returns:
+        pd.DataFrame: Coletas com o esquema do DataFrame mestre
+
+    Raises:
+        ValueError: Se o formato não for reconhecido ou faltarem colunas do DataFrame mestre
+    """
+    fmt = export_format_for(name or getattr(source, 'name', source))
+    if fmt is None:
+        raise ValueError("Formato de arquivo não reconhecido para importação")
+
+    df = _read_export_frame(source, fmt, 'coletas')
+    missing = [col for col in MASTER_COLUMNS if col not in df.columns]
+    if missing:
+        raise ValueError(f"O arquivo não é uma exportação de coletas (faltam: {', '.join(missing)})")
+    for col in ['coleta_id', 'hash_arquivo']:
+        df[col] = df[col].where(df[col].notna(), None).astype('object')
+    return enforce_master_schema(_take_sketch_column(df, sketch_store))
+
+
+def import_raw_samples(source, raw_store, name=None):
+    """
+    Restaura no armazenamento as amostras exportadas por export_raw_samples
+    (ou pela planilha 'amostras' de uma exportação Excel)
+
+    Args:
+        source: Caminho ou arquivo enviado
+        raw_store: Armazenamento de new_raw_sample_store
+        name: Nome do arquivo, usado para identificar o formato
+
+    Returns:
+        int: Número de coletas restauradas
+    """
+    fmt = export_format_for(name or getattr(source, 'name', source))
+    if fmt is None:
+        raise ValueError("Formato de arquivo não reconhecido para importação")
+
+    df = _read_export_frame(source, fmt, 'amostras')
+    if 'amostra' not in df.columns:
+        raise ValueError("Apenas exportações das leituras originais (sem reamostragem) podem ser restauradas")
+    if df.empty:
+        return 0
+    df = df.sort_values(['coleta_id', 'amostra'], kind='stable')
+    if 'tempo' in df.columns:
+        df['tempo'] = parse_timestamps(df['tempo'])
+    restored = 0
+    for coleta_id, samples in df.groupby('coleta_id', sort=False):
+        times = None
+        if 'tempo' in samples.columns and samples['tempo'].notna().all():
+            times = samples['tempo']
+        store_raw_samples(raw_store, coleta_id, samples[EXPECTED_COLUMNS], times)
+        restored += 1
+    return restored
@@ -6,49 +6,235 @@ Funções para criar gráficos Plotly para análise de dados ambientais
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import pandas as pd
+from collections import OrderedDict
+import functools
+import hashlib
 
 
+# Número máximo de figuras mantidas no cache
+FIGURE_CACHE_MAX_ENTRIES = 32
+
+# Variáveis plotadas
+MEASURE_COLUMNS = ['temperatura', 'umidade', 'co2']
+
+# Número máximo de datas no eixo X antes de agregar os dados
+CHART_POINT_BUDGET = 120
+
+# Granularidades de agregação testadas em ordem: (frequência do pandas, rótulo)
+CHART_BUCKETS = [('W', 'semana'), ('M', 'mês'), ('Q', 'trimestre'), ('Y', 'ano')]
+
+# Total de pontos a partir do qual o modo de alto volume usa WebGL e omite rótulos
+WEBGL_POINT_THRESHOLD = 2000
+
+# Formato das datas no eixo X e nas dicas
+DATE_FORMAT = '%d/%m/%Y'
+
+# Número de locais exibidos por padrão na comparação entre locais
+COMPARISON_TOP_N = 20
+
+# Aparência de cada variável nos gráficos de comparação: rótulo, unidade e cores (Manhã, Tarde, média)
+COMPARISON_STYLE = {
+    'temperatura': ('Temperatura', '°C', '#FF9999', '#FF6666', '#CC0000'),
+    'umidade': ('Umidade', '%', '#99CCFF', '#3399FF', '#0066CC'),
+    'co2': ('CO₂', ' ppm', '#99FF99', '#33CC33', '#009900')
+}
+
+# Cache LRU de figuras e contadores de acertos/falhas
+_figure_cache = OrderedDict()
+_figure_cache_stats = {'acertos': 0, 'falhas': 0}
+
+# Cache LRU dos pivôs de comparação entre locais (pela impressão digital dos dados)
+_comparison_cache = OrderedDict()
+
+
+def frame_fingerprint(df):
+    """
+    Calcula uma impressão digital do conteúdo de um DataFrame
+
+    Args:
+        df: DataFrame a identificar
+
+    Returns:
+        str: Hash hexadecimal dos valores e nomes das colunas
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update('\x1f'.join(map(str, df.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def cached_figure(builder):
+    """
+    Decorador que memoriza figuras pela impressão digital do DataFrame e pelos demais argumentos
+
+    A mesma instância de figura é devolvida nos acertos; ela não deve ser
+    modificada por quem a recebe.
+
+    Args:
+        builder: Função que recebe um DataFrame ou chart frame (primeiro argumento)
+            e retorna uma figura
+
+    Returns:
+        function: Função com o mesmo comportamento, com cache
+    """
+    @functools.wraps(builder)
+    def wrapper(df, *args, **kwargs):
+        fingerprint = df['impressao'] if isinstance(df, dict) else frame_fingerprint(df)
+        key = (builder.__name__, fingerprint, args, tuple(sorted(kwargs.items())))
+        fig = _figure_cache.get(key)
+        if fig is not None:
+            _figure_cache.move_to_end(key)
+            _figure_cache_stats['acertos'] += 1
+            return fig
+
+        _figure_cache_stats['falhas'] += 1
+        fig = builder(df, *args, **kwargs)
+        _figure_cache[key] = fig
+        while len(_figure_cache) > FIGURE_CACHE_MAX_ENTRIES:
+            _figure_cache.popitem(last=False)
+        return fig
+
+    return wrapper
+
+
+def _bucket_frequency(dates, point_budget):
+    """
+    Escolhe a granularidade de agregação que mantém o número de pontos no orçamento
+
+    Args:
+        dates: Série de datas (datetime64)
+        point_budget: Número máximo de posições no eixo X
+
+    Returns:
+        tuple: (frequência de período do pandas ou None para dados diários, rótulo)
+    """
+    if dates.dt.normalize().nunique() <= point_budget:
+        return None, 'dia'
+    for freq, label in CHART_BUCKETS:
+        if dates.dt.to_period(freq).nunique() <= point_budget:
+            return freq, label
+    return CHART_BUCKETS[-1]
+
+
+def prepare_chart_frame(df, point_budget=CHART_POINT_BUDGET):
+    """
+    Prepara uma única vez os dados comuns a todos os gráficos de um local
+
+    Ordena por data, separa Manhã/Tarde e calcula as médias diárias das três
+    variáveis, para que os gráficos não repitam esse trabalho. O eixo X usa datas
+    reais; se o histórico tiver mais datas que point_budget, os valores são
+    agregados (média) por semana, mês, trimestre ou ano, mantendo o tamanho da
+    figura limitado.
+
+    Args:
+        df: DataFrame filtrado com dados do local
+        point_budget: Número máximo de posições no eixo X antes de agregar
+
+    Returns:
+        dict: Chart frame com 'impressao', 'dados', 'manha', 'tarde',
+        'media_diaria' e 'granularidade'; nos três DataFrames a coluna 'x' é a
+        posição no eixo de datas
+    """
+    if isinstance(df, dict):
+        return df
+
+    fingerprint = frame_fingerprint(df)
+
+    # Preparar dados
+    df_sorted = df.sort_values('data')
+    freq, granularity = _bucket_frequency(df_sorted['data'], point_budget)
+    if freq is None:
+        df_sorted['x'] = df_sorted['data'].dt.normalize()
+    else:
+        df_sorted['x'] = df_sorted['data'].dt.to_period(freq).dt.start_time
+
+    # Separar dados por período
+    periodo = df_sorted['periodo']
+    df_manha = df_sorted[periodo == 'Manhã']
+    df_tarde = df_sorted[periodo == 'Tarde']
+    if freq is not None:
+        df_manha = df_manha.groupby('x')[MEASURE_COLUMNS].mean().reset_index()
+        df_tarde = df_tarde.groupby('x')[MEASURE_COLUMNS].mean().reset_index()
+
+    # Médias diárias (ou por intervalo) das três variáveis em um único groupby
+    df_media = df_sorted.groupby('x')[MEASURE_COLUMNS].mean().reset_index()
+
+    return {
+        'impressao': f'{fingerprint}:{point_budget}',
+        'dados': df_sorted,
+        'manha': df_manha,
+        'tarde': df_tarde,
+        'media_diaria': df_media,
+        'granularidade': granularity
+    }
+
+
+def _chart_title(title, chart):
+    """
+    Acrescenta ao título a granularidade quando os dados foram agregados
+    """
+    if chart['granularidade'] == 'dia':
+        return title
+    return f"{title} (médias por {chart['granularidade']})"
+
+
+def get_figure_cache_stats():
+    """
+    Retorna os contadores do cache de figuras
+
+    Returns:
+        dict: 'acertos', 'falhas' e 'entradas'
+    """
+    return dict(_figure_cache_stats, entradas=len(_figure_cache))
+
+
+def clear_figure_cache():
+    """
+    Esvazia o cache de figuras e zera os contadores
+    """
+    _figure_cache.clear()
+    _comparison_cache.clear()
+    _figure_cache_stats['acertos'] = 0
+    _figure_cache_stats['falhas'] = 0
+
+
+@cached_figure
 def create_temperature_chart(df, local_name):
     """
     Cria gráfico de barras para variação de temperatura por período
     
     Args:
-        df: DataFrame filtrado com dados do local
+        df: DataFrame filtrado com dados do local (ou chart frame de prepare_chart_frame)
         local_name: Nome do local para o título
         
     Returns:
         plotly.graph_objects.Figure: Gráfico de temperatura
     """
-    # Preparar dados
-    df_sorted = df.sort_values('data')
-    df_sorted['data_str'] = df_sorted['data'].dt.strftime('%d/%m/%Y')
-    
-    # Obter ordem cronológica das datas
-    datas_ordenadas = df_sorted['data_str'].unique().tolist()
-    
-    # Separar dados por período
-    df_manha = df_sorted[df_sorted['periodo'] == 'Manhã']
-    df_tarde = df_sorted[df_sorted['periodo'] == 'Tarde']
+    # Dados preparados uma única vez (ordenação, eixo de datas e períodos)
+    chart = prepare_chart_frame(df)
+    df_sorted = chart['dados']
+    df_manha = chart['manha']
+    df_tarde = chart['tarde']
     
     # Criar figura
     fig = go.Figure()
     
     # Adicionar linha de média diária PRIMEIRO (fica atrás das barras)
-    df_media_diaria = df_sorted.groupby('data_str', sort=False)['temperatura'].mean().reset_index()
+    df_media_diaria = chart['media_diaria']
     fig.add_trace(go.Scatter(
-        x=df_media_diaria['data_str'],
+        x=df_media_diaria['x'],
         y=df_media_diaria['temperatura'],
         name='Média Diária',
         mode='lines+markers',
         line=dict(color='#CC0000', width=2, dash='dash'),
         marker=dict(size=8, symbol='diamond'),
         opacity=0.4,
-        hovertemplate='<b>Média Diária</b><br>Data: %{x}<br>Temperatura: %{y:.2f}°C<extra></extra>'
+        hovertemplate='<b>Média Diária</b><br>Data: %{x|%d/%m/%Y}<br>Temperatura: %{y:.2f}°C<extra></extra>'
     ))
     
     # Adicionar barras para Manhã (por cima das linhas)
     fig.add_trace(go.Bar(
-        x=df_manha['data_str'],
+        x=df_manha['x'],
         y=df_manha['temperatura'],
         name='Manhã',
         marker_color='#FF9999',
@@ -56,12 +242,12 @@ def create_temperature_chart(df, local_name):
         textposition='outside',
         texttemplate='<b>%{text}°C</b>',
         textfont=dict(size=16, color='#000000', family='Arial Black'),
-        hovertemplate='<b>Manhã</b><br>Data: %{x}<br>Temperatura: %{y:.2f}°C<extra></extra>'
+        hovertemplate='<b>Manhã</b><br>Data: %{x|%d/%m/%Y}<br>Temperatura: %{y:.2f}°C<extra></extra>'
     ))
     
     # Adicionar barras para Tarde (por cima das linhas)
     fig.add_trace(go.Bar(
-        x=df_tarde['data_str'],
+        x=df_tarde['x'],
         y=df_tarde['temperatura'],
         name='Tarde',
         marker_color='#FF6666',
@@ -69,13 +255,13 @@ def create_temperature_chart(df, local_name):
         textposition='outside',
         texttemplate='<b>%{text}°C</b>',
         textfont=dict(size=16, color='#000000', family='Arial Black'),
-        hovertemplate='<b>Tarde</b><br>Data: %{x}<br>Temperatura: %{y:.2f}°C<extra></extra>'
+        hovertemplate='<b>Tarde</b><br>Data: %{x|%d/%m/%Y}<br>Temperatura: %{y:.2f}°C<extra></extra>'
     ))
     
     # Layout com margem superior e ordem cronológica forçada
     max_temp = df_sorted['temperatura'].max()
     fig.update_layout(
-        title=f'Variação de Temperatura - {local_name}',
+        title=_chart_title(f'Variação de Temperatura - {local_name}', chart),
         xaxis_title='Data',
         yaxis_title='Temperatura (°C)',
         barmode='group',
@@ -92,55 +278,52 @@ def create_temperature_chart(df, local_name):
         ),
         yaxis=dict(range=[0, max_temp * 1.15]),  # 15% de margem superior
         xaxis=dict(
-            categoryorder='array',
-            categoryarray=datas_ordenadas
+            type='date',
+            tickformat=DATE_FORMAT,
+            hoverformat=DATE_FORMAT
         )
     )
     
     return fig
 
 
+@cached_figure
 def create_humidity_chart(df, local_name):
     """
     Cria gráfico de barras para variação de umidade por período
     
     Args:
-        df: DataFrame filtrado com dados do local
+        df: DataFrame filtrado com dados do local (ou chart frame de prepare_chart_frame)
         local_name: Nome do local para o título
         
     Returns:
         plotly.graph_objects.Figure: Gráfico de umidade
     """
-    # Preparar dados
-    df_sorted = df.sort_values('data')
-    df_sorted['data_str'] = df_sorted['data'].dt.strftime('%d/%m/%Y')
-    
-    # Obter ordem cronológica das datas
-    datas_ordenadas = df_sorted['data_str'].unique().tolist()
-    
-    # Separar dados por período
-    df_manha = df_sorted[df_sorted['periodo'] == 'Manhã']
-    df_tarde = df_sorted[df_sorted['periodo'] == 'Tarde']
+    # Dados preparados uma única vez (ordenação, eixo de datas e períodos)
+    chart = prepare_chart_frame(df)
+    df_sorted = chart['dados']
+    df_manha = chart['manha']
+    df_tarde = chart['tarde']
     
     # Criar figura
     fig = go.Figure()
     
     # Adicionar linha de média diária PRIMEIRO (fica atrás das barras)
-    df_media_diaria = df_sorted.groupby('data_str', sort=False)['umidade'].mean().reset_index()
+    df_media_diaria = chart['media_diaria']
     fig.add_trace(go.Scatter(
-        x=df_media_diaria['data_str'],
+        x=df_media_diaria['x'],
         y=df_media_diaria['umidade'],
         name='Média Diária',
         mode='lines+markers',
         line=dict(color='#0066CC', width=2, dash='dash'),
         marker=dict(size=8, symbol='diamond'),
         opacity=0.4,
-        hovertemplate='<b>Média Diária</b><br>Data: %{x}<br>Umidade: %{y:.2f}%<extra></extra>'
+        hovertemplate='<b>Média Diária</b><br>Data: %{x|%d/%m/%Y}<br>Umidade: %{y:.2f}%<extra></extra>'
     ))
     
     # Adicionar barras para Manhã (por cima das linhas)
     fig.add_trace(go.Bar(
-        x=df_manha['data_str'],
+        x=df_manha['x'],
         y=df_manha['umidade'],
         name='Manhã',
         marker_color='#99CCFF',
@@ -148,12 +331,12 @@ def create_humidity_chart(df, local_name):
         textposition='outside',
         texttemplate='<b>%{text}%</b>',
         textfont=dict(size=16, color='#000000', family='Arial Black'),
-        hovertemplate='<b>Manhã</b><br>Data: %{x}<br>Umidade: %{y:.2f}%<extra></extra>'
+        hovertemplate='<b>Manhã</b><br>Data: %{x|%d/%m/%Y}<br>Umidade: %{y:.2f}%<extra></extra>'
     ))
     
     # Adicionar barras para Tarde (por cima das linhas)
     fig.add_trace(go.Bar(
-        x=df_tarde['data_str'],
+        x=df_tarde['x'],
         y=df_tarde['umidade'],
         name='Tarde',
         marker_color='#3399FF',
@@ -161,13 +344,13 @@ def create_humidity_chart(df, local_name):
         textposition='outside',
         texttemplate='<b>%{text}%</b>',
         textfont=dict(size=16, color='#000000', family='Arial Black'),
-        hovertemplate='<b>Tarde</b><br>Data: %{x}<br>Umidade: %{y:.2f}%<extra></extra>'
+        hovertemplate='<b>Tarde</b><br>Data: %{x|%d/%m/%Y}<br>Umidade: %{y:.2f}%<extra></extra>'
     ))
     
     # Layout com margem superior e ordem cronológica forçada
     max_umid = df_sorted['umidade'].max()
     fig.update_layout(
-        title=f'Variação de Umidade - {local_name}',
+        title=_chart_title(f'Variação de Umidade - {local_name}', chart),
         xaxis_title='Data',
         yaxis_title='Umidade (%)',
         barmode='group',
@@ -184,55 +367,52 @@ def create_humidity_chart(df, local_name):
         ),
         yaxis=dict(range=[0, max_umid * 1.15]),  # 15% de margem superior
         xaxis=dict(
-            categoryorder='array',
-            categoryarray=datas_ordenadas
+            type='date',
+            tickformat=DATE_FORMAT,
+            hoverformat=DATE_FORMAT
         )
     )
     
     return fig
 
 
+@cached_figure
 def create_co2_chart(df, local_name):
     """
     Cria gráfico de barras para variação de CO₂ por período
     
     Args:
-        df: DataFrame filtrado com dados do local
+        df: DataFrame filtrado com dados do local (ou chart frame de prepare_chart_frame)
         local_name: Nome do local para o título
         
     Returns:
         plotly.graph_objects.Figure: Gráfico de CO₂
     """
-    # Preparar dados
-    df_sorted = df.sort_values('data')
-    df_sorted['data_str'] = df_sorted['data'].dt.strftime('%d/%m/%Y')
-    
-    # Obter ordem cronológica das datas
-    datas_ordenadas = df_sorted['data_str'].unique().tolist()
-    
-    # Separar dados por período
-    df_manha = df_sorted[df_sorted['periodo'] == 'Manhã']
-    df_tarde = df_sorted[df_sorted['periodo'] == 'Tarde']
+    # Dados preparados uma única vez (ordenação, eixo de datas e períodos)
+    chart = prepare_chart_frame(df)
+    df_sorted = chart['dados']
+    df_manha = chart['manha']
+    df_tarde = chart['tarde']
     
     # Criar figura
     fig = go.Figure()
     
     # Adicionar linha de média diária PRIMEIRO (fica atrás das barras)
-    df_media_diaria = df_sorted.groupby('data_str', sort=False)['co2'].mean().reset_index()
+    df_media_diaria = chart['media_diaria']
     fig.add_trace(go.Scatter(
-        x=df_media_diaria['data_str'],
+        x=df_media_diaria['x'],
         y=df_media_diaria['co2'],
         name='Média Diária',
         mode='lines+markers',
         line=dict(color='#009900', width=2, dash='dash'),
         marker=dict(size=8, symbol='diamond'),
         opacity=0.4,
-        hovertemplate='<b>Média Diária</b><br>Data: %{x}<br>CO₂: %{y:.2f} ppm<extra></extra>'
+        hovertemplate='<b>Média Diária</b><br>Data: %{x|%d/%m/%Y}<br>CO₂: %{y:.2f} ppm<extra></extra>'
     ))
     
     # Adicionar barras para Manhã (por cima das linhas)
     fig.add_trace(go.Bar(
-        x=df_manha['data_str'],
+        x=df_manha['x'],
         y=df_manha['co2'],
         name='Manhã',
         marker_color='#99FF99',
@@ -240,12 +420,12 @@ def create_co2_chart(df, local_name):
         textposition='outside',
         texttemplate='<b>%{text} ppm</b>',
         textfont=dict(size=16, color='#000000', family='Arial Black'),
-        hovertemplate='<b>Manhã</b><br>Data: %{x}<br>CO₂: %{y:.2f} ppm<extra></extra>'
+        hovertemplate='<b>Manhã</b><br>Data: %{x|%d/%m/%Y}<br>CO₂: %{y:.2f} ppm<extra></extra>'
     ))
     
     # Adicionar barras para Tarde (por cima das linhas)
     fig.add_trace(go.Bar(
-        x=df_tarde['data_str'],
+        x=df_tarde['x'],
         y=df_tarde['co2'],
         name='Tarde',
         marker_color='#33CC33',
@@ -253,13 +433,13 @@ def create_co2_chart(df, local_name):
         textposition='outside',
         texttemplate='<b>%{text} ppm</b>',
         textfont=dict(size=16, color='#000000', family='Arial Black'),
-        hovertemplate='<b>Tarde</b><br>Data: %{x}<br>CO₂: %{y:.2f} ppm<extra></extra>'
+        hovertemplate='<b>Tarde</b><br>Data: %{x|%d/%m/%Y}<br>CO₂: %{y:.2f} ppm<extra></extra>'
     ))
     
     # Layout com margem superior e ordem cronológica forçada
     max_co2 = df_sorted['co2'].max()
     fig.update_layout(
-        title=f'Variação de CO₂ - {local_name}',
+        title=_chart_title(f'Variação de CO₂ - {local_name}', chart),
         xaxis_title='Data',
         yaxis_title='CO₂ (ppm)',
         barmode='group',
@@ -276,50 +456,64 @@ def create_co2_chart(df, local_name):
         ),
         yaxis=dict(range=[0, max_co2 * 1.15]),  # 15% de margem superior
         xaxis=dict(
-            categoryorder='array',
-            categoryarray=datas_ordenadas
+            type='date',
+            tickformat=DATE_FORMAT,
+            hoverformat=DATE_FORMAT
         )
     )
     
     return fig
 
 
-def create_consolidated_chart(df, local_name):
+@cached_figure
+def create_consolidated_chart(df, local_name, high_volume=False):
     """
     Cria gráfico consolidado com todas as variáveis, usando eixo Y secundário para CO₂
     
     Args:
-        df: DataFrame filtrado com dados do local
+        df: DataFrame filtrado com dados do local (ou chart frame de prepare_chart_frame)
         local_name: Nome do local para o título
+        high_volume: Se True e o histórico (antes da agregação por intervalo) somar
+            mais de WEBGL_POINT_THRESHOLD pontos, as linhas usam WebGL (Scattergl)
+            e os rótulos de valor são omitidos
         
     Returns:
-        plotly.graph_objects.Figure: Gráfico consolidado
+        plotly.graph_objects.Figure: Gráfico consolidado (layout.meta informa os
+        pontos renderizados e se WebGL foi usado)
     """
-    # Preparar dados
-    df_sorted = df.sort_values('data')
-    df_sorted['data_str'] = df_sorted['data'].dt.strftime('%d/%m/%Y')
+    # Dados preparados uma única vez (ordenação, eixo de datas e períodos)
+    chart = prepare_chart_frame(df)
+    df_sorted = chart['dados']
+    df_manha = chart['manha']
+    df_tarde = chart['tarde']
     
-    # Obter ordem cronológica das datas
-    datas_ordenadas = df_sorted['data_str'].unique().tolist()
+    # Linhas de média diária PRIMEIRO (ficam atrás) com opacidade reduzida
+    df_media = chart['media_diaria']
+    
+    # Modo de alto volume: WebGL e sem rótulos por ponto acima do limite. O limite
+    # vale para o histórico completo (cada coleta na linha do período e na média),
+    # já que depois da agregação por intervalo a figura nunca passaria dele
+    n_points = 3 * 2 * len(df_sorted)
+    use_webgl = high_volume and n_points > WEBGL_POINT_THRESHOLD
+    scatter = go.Scattergl if use_webgl else go.Scatter
+    
+    def labels(values, template, position):
+        if use_webgl:
+            return {}
+        return dict(
+            text=values.round(1),
+            texttemplate=template,
+            textposition=position,
+            textfont=dict(size=15, color='#000000', family='Arial Black')
+        )
     
     # Criar figura com eixo Y secundário
     fig = make_subplots(specs=[[{"secondary_y": True}]])
     
-    # Separar por período
-    df_manha = df_sorted[df_sorted['periodo'] == 'Manhã']
-    df_tarde = df_sorted[df_sorted['periodo'] == 'Tarde']
-    
-    # Linhas de média diária PRIMEIRO (ficam atrás) com opacidade reduzida
-    df_media = df_sorted.groupby('data_str', sort=False).agg({
-        'temperatura': 'mean',
-        'umidade': 'mean',
-        'co2': 'mean'
-    }).reset_index()
-    
     # Média Temperatura (atrás)
     fig.add_trace(
-        go.Scatter(
-            x=df_media['data_str'],
+        scatter(
+            x=df_media['x'],
             y=df_media['temperatura'],
             name='Média Temp',
             mode='lines',
@@ -332,8 +526,8 @@ def create_consolidated_chart(df, local_name):
     
     # Média Umidade (atrás)
     fig.add_trace(
-        go.Scatter(
-            x=df_media['data_str'],
+        scatter(
+            x=df_media['x'],
             y=df_media['umidade'],
             name='Média Umid',
             mode='lines',
@@ -346,8 +540,8 @@ def create_consolidated_chart(df, local_name):
     
     # Média CO₂ (atrás)
     fig.add_trace(
-        go.Scatter(
-            x=df_media['data_str'],
+        scatter(
+            x=df_media['x'],
             y=df_media['co2'],
             name='Média CO₂',
             mode='lines',
@@ -361,14 +555,11 @@ def create_consolidated_chart(df, local_name):
     # Temperatura - Barras Manhã (por cima das linhas)
     fig.add_trace(
         go.Bar(
-            x=df_manha['data_str'],
+            x=df_manha['x'],
             y=df_manha['temperatura'],
             name='Temp Manhã',
             marker_color='#FF9999',
-            text=df_manha['temperatura'].round(1),
-            texttemplate='<b>%{text}°C</b>',
-            textposition='outside',
-            textfont=dict(size=15, color='#000000', family='Arial Black'),
+            **labels(df_manha['temperatura'], '<b>%{text}°C</b>', 'outside'),
             hovertemplate='<b>Temperatura - Manhã</b><br>%{y:.1f}°C<extra></extra>'
         ),
         secondary_y=False
@@ -377,14 +568,11 @@ def create_consolidated_chart(df, local_name):
     # Temperatura - Barras Tarde (por cima das linhas)
     fig.add_trace(
         go.Bar(
-            x=df_tarde['data_str'],
+            x=df_tarde['x'],
             y=df_tarde['temperatura'],
             name='Temp Tarde',
             marker_color='#FF6666',
-            text=df_tarde['temperatura'].round(1),
-            texttemplate='<b>%{text}°C</b>',
-            textposition='outside',
-            textfont=dict(size=15, color='#000000', family='Arial Black'),
+            **labels(df_tarde['temperatura'], '<b>%{text}°C</b>', 'outside'),
             hovertemplate='<b>Temperatura - Tarde</b><br>%{y:.1f}°C<extra></extra>'
         ),
         secondary_y=False
@@ -393,14 +581,11 @@ def create_consolidated_chart(df, local_name):
     # Umidade - Barras Manhã (por cima das linhas)
     fig.add_trace(
         go.Bar(
-            x=df_manha['data_str'],
+            x=df_manha['x'],
             y=df_manha['umidade'],
             name='Umid Manhã',
             marker_color='#99CCFF',
-            text=df_manha['umidade'].round(1),
-            texttemplate='<b>%{text}%</b>',
-            textposition='outside',
-            textfont=dict(size=15, color='#000000', family='Arial Black'),
+            **labels(df_manha['umidade'], '<b>%{text}%</b>', 'outside'),
             hovertemplate='<b>Umidade - Manhã</b><br>%{y:.1f}%<extra></extra>'
         ),
         secondary_y=False
@@ -409,14 +594,11 @@ def create_consolidated_chart(df, local_name):
     # Umidade - Barras Tarde (por cima das linhas)
     fig.add_trace(
         go.Bar(
-            x=df_tarde['data_str'],
+            x=df_tarde['x'],
             y=df_tarde['umidade'],
             name='Umid Tarde',
             marker_color='#3399FF',
-            text=df_tarde['umidade'].round(1),
-            texttemplate='<b>%{text}%</b>',
-            textposition='outside',
-            textfont=dict(size=15, color='#000000', family='Arial Black'),
+            **labels(df_tarde['umidade'], '<b>%{text}%</b>', 'outside'),
             hovertemplate='<b>Umidade - Tarde</b><br>%{y:.1f}%<extra></extra>'
         ),
         secondary_y=False
@@ -424,17 +606,14 @@ def create_consolidated_chart(df, local_name):
     
     # CO₂ - Linha Manhã (eixo secundário, por cima de tudo)
     fig.add_trace(
-        go.Scatter(
-            x=df_manha['data_str'],
+        scatter(
+            x=df_manha['x'],
             y=df_manha['co2'],
             name='CO₂ Manhã',
-            mode='lines+markers+text',
+            mode='lines+markers' if use_webgl else 'lines+markers+text',
             line=dict(color='#33CC33', width=3),
             marker=dict(size=10, color='#33CC33'),
-            text=df_manha['co2'].round(1),
-            texttemplate='<b>%{text} ppm</b>',
-            textposition='top center',
-            textfont=dict(size=15, color='#000000', family='Arial Black'),
+            **labels(df_manha['co2'], '<b>%{text} ppm</b>', 'top center'),
             hovertemplate='<b>CO₂ - Manhã</b><br>%{y:.1f} ppm<extra></extra>'
         ),
         secondary_y=True
@@ -442,17 +621,14 @@ def create_consolidated_chart(df, local_name):
     
     # CO₂ - Linha Tarde (eixo secundário, por cima de tudo)
     fig.add_trace(
-        go.Scatter(
-            x=df_tarde['data_str'],
+        scatter(
+            x=df_tarde['x'],
             y=df_tarde['co2'],
             name='CO₂ Tarde',
-            mode='lines+markers+text',
+            mode='lines+markers' if use_webgl else 'lines+markers+text',
             line=dict(color='#228B22', width=3),
             marker=dict(size=10, color='#228B22'),
-            text=df_tarde['co2'].round(1),
-            texttemplate='<b>%{text} ppm</b>',
-            textposition='top center',
-            textfont=dict(size=15, color='#000000', family='Arial Black'),
+            **labels(df_tarde['co2'], '<b>%{text} ppm</b>', 'top center'),
             hovertemplate='<b>CO₂ - Tarde</b><br>%{y:.1f} ppm<extra></extra>'
         ),
         secondary_y=True
@@ -465,8 +641,9 @@ def create_consolidated_chart(df, local_name):
     # Configurar títulos dos eixos
     fig.update_xaxes(
         title_text="Data",
-        categoryorder='array',
-        categoryarray=datas_ordenadas
+        type='date',
+        tickformat=DATE_FORMAT,
+        hoverformat=DATE_FORMAT
     )
     fig.update_yaxes(
         title_text="Temperatura (°C) / Umidade (%)",
@@ -481,7 +658,7 @@ def create_consolidated_chart(df, local_name):
     
     # Layout
     fig.update_layout(
-        title=f'Análise Consolidada - {local_name}',
+        title=_chart_title(f'Análise Consolidada - {local_name}', chart),
         barmode='group',
         hovermode='x unified',
         template='plotly_white',
@@ -493,72 +670,335 @@ def create_consolidated_chart(df, local_name):
             y=0.99,
             xanchor="left",
             x=1.02
+        ),
+        meta={'pontos_renderizados': count_rendered_points(fig), 'webgl': use_webgl}
+    )
+    
+    return fig
+
+
+def count_rendered_points(fig):
+    """
+    Conta os pontos efetivamente enviados ao navegador por uma figura
+
+    Args:
+        fig: Figura Plotly
+
+    Returns:
+        int: Soma do número de pontos de todos os traços
+    """
+    return sum(len(trace.x) for trace in fig.data if trace.x is not None)
+
+
+def _hex_to_rgba(color, alpha):
+    """
+    Converte uma cor '#RRGGBB' em 'rgba(r, g, b, alpha)'
+    """
+    r, g, b = (int(color[i:i + 2], 16) for i in (1, 3, 5))
+    return f'rgba({r}, {g}, {b}, {alpha})'
+
+
+def create_raw_samples_chart(samples, title, webgl_threshold=WEBGL_POINT_THRESHOLD):
+    """
+    Cria gráfico das amostras brutas de uma coleta, com WebGL para grandes volumes
+
+    Com a coluna 'tempo' o eixo X passa a ser a data/hora das leituras. Um
+    quadro reamostrado (resample_samples) é desenhado com as médias de cada
+    intervalo e uma faixa entre o mínimo e o máximo.
+
+    Fica fora do cache de figuras: a figura pode ter milhões de pontos e a
+    impressão digital exigiria percorrer todas as amostras a cada execução.
+    Quem chama guarda a figura pelo coleta_id e pela resolução.
+
+    Args:
+        samples: DataFrame com temperatura, umidade e co2 (uma linha por leitura)
+            ou as colunas <variável>_media/_min/_max de resample_samples
+        title: Título do gráfico
+        webgl_threshold: Número de leituras a partir do qual Scattergl é usado
+
+    Returns:
+        plotly.graph_objects.Figure: Gráfico das amostras (layout.meta informa os
+        pontos renderizados e se WebGL foi usado)
+    """
+    use_webgl = len(samples) > webgl_threshold
+    scatter = go.Scattergl if use_webgl else go.Scatter
+    timed = 'tempo' in samples.columns
+    resampled = 'temperatura_media' in samples.columns
+    x = samples['tempo'] if timed else list(range(len(samples)))
+    x_label = "Data/hora" if timed else "Leitura"
+    x_hover = '%{x|%d/%m/%Y %H:%M:%S}' if timed else '%{x}'
+    
+    fig = make_subplots(specs=[[{"secondary_y": True}]])
+    
+    traces = [
+        ('temperatura', 'Temperatura', '#FF6666', '°C', False),
+        ('umidade', 'Umidade', '#3399FF', '%', False),
+        ('co2', 'CO₂', '#33CC33', ' ppm', True)
+    ]
+    for var, name, color, suffix, secondary in traces:
+        if resampled:
+            # Faixa mínimo–máximo do intervalo sob a linha das médias
+            fig.add_trace(
+                scatter(x=x, y=samples[f'{var}_max'], mode='lines', line=dict(width=0),
+                        showlegend=False, hoverinfo='skip', legendgroup=var),
+                secondary_y=secondary
+            )
+            fig.add_trace(
+                scatter(x=x, y=samples[f'{var}_min'], mode='lines', line=dict(width=0),
+                        fill='tonexty', fillcolor=_hex_to_rgba(color, 0.2),
+                        showlegend=False, hoverinfo='skip', legendgroup=var),
+                secondary_y=secondary
+            )
+        fig.add_trace(
+            scatter(
+                x=x,
+                y=samples[f'{var}_media' if resampled else var],
+                name=name,
+                mode='lines',
+                line=dict(color=color, width=1),
+                legendgroup=var,
+                hovertemplate=f'<b>{name}</b><br>{x_label}: {x_hover}<br>%{{y:.2f}}{suffix}<extra></extra>'
+            ),
+            secondary_y=secondary
         )
+    
+    fig.update_xaxes(title_text=x_label)
+    fig.update_yaxes(title_text="Temperatura (°C) / Umidade (%)", secondary_y=False)
+    fig.update_yaxes(title_text="CO₂ (ppm)", secondary_y=True)
+    fig.update_layout(
+        title=title,
+        hovermode='x unified',
+        template='plotly_white',
+        height=400,
+        showlegend=True,
+        legend=dict(
+            orientation="h",
+            yanchor="bottom",
+            y=1.02,
+            xanchor="right",
+            x=1
+        ),
+        meta={'pontos_renderizados': count_rendered_points(fig), 'webgl': use_webgl}
     )
     
     return fig
 
 
-def create_comparison_chart(df, variable='temperatura'):
+def prepare_comparison_frame(df):
+    """
+    Calcula uma única vez o pivô local × período × variável usado na comparação
+
+    Somas e contagens de cada (local, período) saem de um único groupby sobre
+    os códigos das categorias; a média geral de cada local é derivada delas,
+    sem nova passada. O resultado é guardado em cache pela impressão digital
+    das colunas usadas, então só é recalculado quando os dados mudam.
+
+    Args:
+        df: DataFrame mestre (ou um pivô já preparado, devolvido sem alteração)
+
+    Returns:
+        dict: Pivô com 'impressao', 'medias' (DataFrame indexado pelo local com
+        colunas (variável, período) e (variável, 'Geral')) e 'coletas' (Series
+        com o número de coletas de cada local)
+    """
+    if isinstance(df, dict):
+        return df
+
+    data = df[['local', 'periodo'] + MEASURE_COLUMNS]
+    fingerprint = frame_fingerprint(data)
+    pivot = _comparison_cache.get(fingerprint)
+    if pivot is not None:
+        _comparison_cache.move_to_end(fingerprint)
+        return pivot
+
+    values = data[MEASURE_COLUMNS].astype('float64')
+    grouped = values.groupby([data['local'], data['periodo']], observed=True)
+    sums = grouped.sum()
+    counts = grouped.count()
+    
+    # Média geral do local: soma e contagem de todos os períodos
+    overall = sums.groupby(level='local', observed=True).sum() / counts.groupby(level='local', observed=True).sum()
+    overall.columns = pd.MultiIndex.from_product([overall.columns, ['Geral']])
+    means = (sums / counts).unstack('periodo').join(overall).sort_index(axis=1)
+    means.index = means.index.astype(str)
+    
+    collections = grouped.size().groupby(level='local', observed=True).sum()
+    collections.index = collections.index.astype(str)
+    
+    pivot = {
+        'impressao': f'comparacao:{fingerprint}',
+        'medias': means,
+        'coletas': collections
+    }
+    _comparison_cache[fingerprint] = pivot
+    while len(_comparison_cache) > FIGURE_CACHE_MAX_ENTRIES:
+        _comparison_cache.popitem(last=False)
+    return pivot
+
+
+def rank_locations(pivot, sort_by='temperatura', top_n=None, ascending=False):
+    """
+    Ordena os locais pela média geral de uma variável e mantém os N primeiros
+
+    Args:
+        pivot: Pivô de prepare_comparison_frame
+        sort_by: Variável usada na ordenação
+        top_n: Número de locais mantidos (None = todos)
+        ascending: Se True, do menor para o maior
+
+    Returns:
+        pd.DataFrame: Linhas de pivot['medias'] na ordem escolhida
+    """
+    means = pivot['medias']
+    order = means[(sort_by, 'Geral')].sort_values(ascending=ascending, kind='stable')
+    if top_n is not None:
+        order = order.iloc[:top_n]
+    return means.loc[order.index]
+
+
+@cached_figure
+def create_comparison_chart(df, variable='temperatura', top_n=None, ascending=False):
     """
     Cria gráfico comparativo entre todos os locais para uma variável específica
     
     Args:
-        df: DataFrame completo com todos os locais
+        df: DataFrame completo com todos os locais (ou pivô de prepare_comparison_frame)
         variable: Nome da variável a ser comparada ('temperatura', 'umidade', 'co2')
+        top_n: Número máximo de locais exibidos (None = todos)
+        ascending: Se True, ordena do menor para o maior
         
     Returns:
         plotly.graph_objects.Figure: Gráfico comparativo
     """
-    # Configurações por variável
-    config = {
-        'temperatura': {
-            'title': 'Comparação de Temperatura entre Locais',
-            'yaxis': 'Temperatura (°C)',
-            'color': '#FF6666',
-            'suffix': '°C'
-        },
-        'umidade': {
-            'title': 'Comparação de Umidade entre Locais',
-            'yaxis': 'Umidade (%)',
-            'color': '#3399FF',
-            'suffix': '%'
-        },
-        'co2': {
-            'title': 'Comparação de CO₂ entre Locais',
-            'yaxis': 'CO₂ (ppm)',
-            'color': '#33CC33',
-            'suffix': ' ppm'
-        }
-    }
+    if variable not in COMPARISON_STYLE:
+        variable = 'temperatura'
+    name, suffix, _, color, _ = COMPARISON_STYLE[variable]
     
-    cfg = config.get(variable, config['temperatura'])
-    
-    # Agrupar por local e calcular média
-    df_grouped = df.groupby('local')[variable].mean().reset_index()
-    df_grouped = df_grouped.sort_values(variable, ascending=False)
+    # Médias por local vindas do pivô (calculado uma vez por mudança nos dados)
+    pivot = prepare_comparison_frame(df)
+    ranked = rank_locations(pivot, variable, top_n, ascending)[(variable, 'Geral')]
     
     # Criar figura
     fig = go.Figure()
     
     fig.add_trace(go.Bar(
-        x=df_grouped['local'],
-        y=df_grouped[variable],
-        marker_color=cfg['color'],
-        text=df_grouped[variable].round(2),
-        texttemplate='%{text}' + cfg['suffix'],
+        x=ranked.index,
+        y=ranked,
+        marker_color=color,
+        text=ranked.round(2),
+        texttemplate='%{text}' + suffix,
         textposition='outside',
-        hovertemplate='<b>%{x}</b><br>' + cfg['yaxis'] + ': %{y:.2f}' + cfg['suffix'] + '<extra></extra>'
+        hovertemplate='<b>%{x}</b><br>' + name + ': %{y:.2f}' + suffix + '<extra></extra>'
     ))
     
     # Layout
     fig.update_layout(
-        title=cfg['title'],
+        title=_comparison_title(f'Comparação de {name} entre Locais', len(ranked), len(pivot['medias'])),
         xaxis_title='Local',
-        yaxis_title=cfg['yaxis'],
+        yaxis_title=f'{name} ({suffix.strip()})',
         template='plotly_white',
         height=400,
         showlegend=False
     )
     
     return fig
+
+
+def _comparison_title(title, shown, total):
+    """
+    Acrescenta ao título quantos locais foram exibidos quando a lista foi truncada
+    """
+    if shown == total:
+        return title
+    return f"{title} ({shown} de {total} locais)"
+
+
+@cached_figure
+def create_locations_comparison_chart(df, sort_by='temperatura', top_n=COMPARISON_TOP_N, ascending=False):
+    """
+    Cria a comparação lado a lado de todos os locais para as três variáveis
+
+    Um painel por variável, com barras Manhã/Tarde e a média geral de cada
+    local, todos na mesma ordem de locais (pela média geral de sort_by).
+    Acima de top_n locais, apenas os primeiros são exibidos.
+
+    Args:
+        df: DataFrame mestre (ou pivô de prepare_comparison_frame)
+        sort_by: Variável que define a ordem dos locais
+        top_n: Número máximo de locais exibidos (None = todos)
+        ascending: Se True, ordena do menor para o maior
+
+    Returns:
+        plotly.graph_objects.Figure: Gráfico de comparação (layout.meta informa
+        os locais exibidos e o total)
+    """
+    pivot = prepare_comparison_frame(df)
+    ranked = rank_locations(pivot, sort_by, top_n, ascending)
+    locations = list(ranked.index)
+    periods = [period for period in ['Manhã', 'Tarde'] if (sort_by, period) in ranked.columns]
+    
+    fig = make_subplots(
+        rows=len(MEASURE_COLUMNS), cols=1, shared_xaxes=True, vertical_spacing=0.04,
+        subplot_titles=[COMPARISON_STYLE[var][0] for var in MEASURE_COLUMNS]
+    )
+    
+    # Rótulos de valor apenas quando couberem
+    show_text = len(locations) <= COMPARISON_TOP_N
+    for row, var in enumerate(MEASURE_COLUMNS, start=1):
+        name, suffix, color_manha, color_tarde, color_mean = COMPARISON_STYLE[var]
+        for period, color in zip(['Manhã', 'Tarde'], [color_manha, color_tarde]):
+            if period not in periods:
+                continue
+            values = ranked[(var, period)]
+            fig.add_trace(
+                go.Bar(
+                    x=locations,
+                    y=values,
+                    name=period,
+                    legendgroup=period,
+                    showlegend=row == 1,
+                    marker_color=color,
+                    text=values.round(1) if show_text else None,
+                    textposition='outside' if show_text else 'none',
+                    hovertemplate=f'<b>%{{x}}</b><br>{period}: %{{y:.2f}}{suffix}<extra></extra>'
+                ),
+                row=row, col=1
+            )
+        fig.add_trace(
+            go.Scatter(
+                x=locations,
+                y=ranked[(var, 'Geral')],
+                name='Média Geral',
+                legendgroup='geral',
+                showlegend=row == 1,
+                mode='markers',
+                marker=dict(size=9, symbol='diamond', color=color_mean),
+                hovertemplate=f'<b>%{{x}}</b><br>Média geral: %{{y:.2f}}{suffix}<extra></extra>'
+            ),
+            row=row, col=1
+        )
+        fig.update_yaxes(title_text=f'{name} ({suffix.strip()})', row=row, col=1)
+    
+    title = _comparison_title(
+        f'Comparação entre Locais - ordenado por {COMPARISON_STYLE[sort_by][0]}',
+        len(locations), len(pivot['medias'])
+    )
+    fig.update_layout(
+        title=title,
+        barmode='group',
+        hovermode='x unified',
+        template='plotly_white',
+        height=750,
+        showlegend=True,
+        legend=dict(
+            orientation="h",
+            yanchor="bottom",
+            y=1.04,
+            xanchor="right",
+            x=1
+        ),
+        meta={'locais_exibidos': len(locations), 'locais_total': len(pivot['medias'])}
+    )
+    fig.update_xaxes(tickangle=-45 if len(locations) > 10 else 0, row=len(MEASURE_COLUMNS), col=1)
+    
+    return fig